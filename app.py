@@ -1,69 +1,64 @@
 import argparse
 import asyncio
-import json
 import logging
+from typing import Optional
 
 from dotenv import load_dotenv
-from flask import Flask, jsonify
+from flask import Flask, Response, abort, jsonify, request
 
-from clients.binance import Binance
-from clients.bybit import Bybit
+from async_runtime import get_loop_thread, run_coroutine
 from clients.exchange import Exchange
-from clients.kraken import Kraken
-from clients.bitfinex import Bitfinex
+from clients.nonce import configure_nonce_store
+from clients.rate_limit import configure_rate_limit_backend
+from clients.sessions import close_shared_sessions, pool_stats
 from config import Config
+from database.pool import close_async_pools, close_pools
+from exchange_registry import ExchangeRegistry
 from loggers import setup_logging
 from order_services import create_order, update_order
 from parameters import add_common_args
 from flask_mail import Mail
+from streaming import STREAM_MIMETYPES, stream_exchange_results
 
 # Initialize logging
 setup_logging()
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
+
+class App(Flask):
+    def async_to_sync(self, func):
+        """
+        Run async views on the worker's long-lived event loop (see gunicorn.conf.py)
+        instead of a new event loop per request.
+        """
+
+        def wrapper(*args, **kwargs):
+            return run_coroutine(func(*args, **kwargs))
+
+        return wrapper
+
+
+app = App(__name__)
 load_dotenv()
 
 parser = argparse.ArgumentParser()
 parser = add_common_args(parser)
-args = parser.parse_args()
+# parse_known_args: the arguments of a WSGI server (e.g. gunicorn) are ignored
+args, _ = parser.parse_known_args()
 env_name = args.env_name
 config = Config(env_name=env_name)
 
-# Read ccxt config from JSON file
-file_path = "./exchanges_ccxt_config.json"
-with open(file_path, "r") as file:
-    exchanges_ccxt_config = json.load(file)
-
-binance_ccxt_config = exchanges_ccxt_config["binance"]["ccxt_config"]
-kraken_ccxt_config = exchanges_ccxt_config["kraken"]["ccxt_config"]
-bitfinex_ccxt_config = exchanges_ccxt_config["bitfinex"]["ccxt_config"]
-bybit_ccxt_config = exchanges_ccxt_config["bybit"]["ccxt_config"]
-
-binance = Binance(
-    config.binance_api_key,
-    config.binance_secret,
-    binance_ccxt_config,
-    exchanges_ccxt_config["config"],
-)
-kraken = Kraken(
-    config.kraken_api_key,
-    config.kraken_secret,
-    kraken_ccxt_config,
-    exchanges_ccxt_config["config"],
-)
-bitfinex = Bitfinex(
-    config.bitfinex_api_key,
-    config.bitfinex_secret,
-    bitfinex_ccxt_config,
-    exchanges_ccxt_config["config"],
-)
-bybit = Bybit(
-    config.bybit_api_key,
-    config.bybit_secret,
-    bybit_ccxt_config,
-    exchanges_ccxt_config["config"],
-)
+
+async def on_exchange_swap(name: str, old: Optional[Exchange], new: Optional[Exchange]):
+    """Start the streams of a client that replaced another after a config change"""
+    if new is not None:
+        await start_exchange(new)
+
+
+# Exchange clients from exchanges_ccxt_config.json, rebuilt when the file changes (see exchange_registry)
+registry = ExchangeRegistry(config, on_swap=on_exchange_swap)
+configure_rate_limit_backend(config.conn_info, registry.exchanges_ccxt_config["config"].get("rate_limit"))
+configure_nonce_store(config.conn_info)
 
 app.config["MAIL_SERVER"] = config.mail_server
 app.config["MAIL_PORT"] = config.mail_port
@@ -76,21 +71,54 @@ app.config["MAIL_DEFAULT_SENDER"] = config.mail_default_sender
 mail = Mail(app)
 
 
+def get_stream_format():
+    """
+    Return the requested streaming format ("ndjson" or "sse"), None for a single JSON response.
+    Streaming is requested with the "stream" query argument or the Accept header.
+    """
+    stream_format = request.args.get("stream")
+    if stream_format is None:
+        accept = request.headers.get("Accept", "")
+        stream_format = next((fmt for fmt, mimetype in STREAM_MIMETYPES.items() if mimetype in accept), None)
+    if stream_format is not None and stream_format not in STREAM_MIMETYPES:
+        abort(400, description=f"Unknown stream format: {stream_format}")
+    return stream_format
+
+
+def stream_response(runner, stream_format: str, success_message: str) -> Response:
+    async def leased_runner(exchange: Exchange, on_result):
+        async with registry.lease(exchange):
+            return await runner(exchange, on_result)
+
+    return Response(
+        stream_exchange_results(leased_runner, registry.exchanges(), stream_format, success_message),
+        mimetype=STREAM_MIMETYPES[stream_format],
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.route("/create_order", methods=["POST"])
 async def handle_create_order_request():
+    stream_format = get_stream_format()
+    if stream_format:
+        return stream_response(
+            lambda exchange, on_result: create_order(config=config, exchange=exchange, on_result=on_result),
+            stream_format,
+            "Orders created successfully",
+        )
+
     results = []
 
     async def create_order_for_exchange(exchange: Exchange):
         exchange_name = exchange.exchange_name
-        status = await create_order(config=config, exchange=exchange)
+        if exchange.is_degraded:
+            results.append({"exchange": exchange_name, "status": "degraded"})
+            return
+        async with registry.lease(exchange):
+            status = await create_order(config=config, exchange=exchange)
         results.append({"exchange": exchange_name, "status": "success" if status else "failed"})
 
-    await asyncio.gather(
-        create_order_for_exchange(binance),
-        create_order_for_exchange(kraken),
-        create_order_for_exchange(bitfinex),
-        create_order_for_exchange(bybit),
-    )
+    await asyncio.gather(*(create_order_for_exchange(exchange) for exchange in registry.exchanges()))
 
     success = all(result["status"] == "success" for result in results)
     if success:
@@ -101,19 +129,26 @@ async def handle_create_order_request():
 
 @app.route("/update_order", methods=["POST"])
 async def handle_update_order_request():
+    stream_format = get_stream_format()
+    if stream_format:
+        return stream_response(
+            lambda exchange, on_result: update_order(config=config, exchange=exchange, on_result=on_result),
+            stream_format,
+            "Orders updated successfully",
+        )
+
     results = []
 
     async def update_order_for_exchange(exchange: Exchange):
         exchange_name = exchange.exchange_name
-        status = await update_order(config=config, exchange=exchange)
+        if exchange.is_degraded:
+            results.append({"exchange": exchange_name, "status": "degraded"})
+            return
+        async with registry.lease(exchange):
+            status = await update_order(config=config, exchange=exchange)
         results.append({"exchange": exchange_name, "status": "success" if status else "failed"})
 
-    await asyncio.gather(
-        update_order_for_exchange(binance),
-        update_order_for_exchange(kraken),
-        update_order_for_exchange(bitfinex),
-        update_order_for_exchange(bybit),
-    )
+    await asyncio.gather(*(update_order_for_exchange(exchange) for exchange in registry.exchanges()))
     success = all(result["status"] == "success" for result in results)
     if success:
         return jsonify({"status": "success", "message": "Orders updated successfully", "results": results}), 200
@@ -121,6 +156,70 @@ async def handle_update_order_request():
         return jsonify({"status": "partial_success", "message": "Some orders failed", "results": results}), 207
 
 
+@app.route("/health", methods=["GET"])
+def handle_health_request():
+    health = [
+        {
+            **exchange.health.snapshot(),
+            "rate_limits": exchange.rate_limiter.stats(),
+            "throttle": exchange.rate_limiter.throttle.stats(),
+            "ip_throttle": exchange.rate_limiter.ip_throttle.stats(),
+            "order_transports": exchange.order_transport_stats(),
+            "request_cache": exchange.request_cache.stats(),
+            "endpoints": exchange.endpoints.stats(),
+            "accounts": exchange.accounts.stats(),
+            "warm_up": registry.warm_up_report.get(exchange.exchange_name),
+            "reload_failure": registry.reload_failures.get(exchange.exchange_name),
+            "clock": exchange.clock.stats(),
+        }
+        for exchange in registry.exchanges()
+    ]
+    degraded = any(exchange_health["degraded"] for exchange_health in health)
+    return jsonify({"status": "degraded" if degraded else "ok", "exchanges": health, "connection_pools": pool_stats()}), 200
+
+
+async def start_exchange(exchange: Exchange):
+    await exchange.start_balance_stream()
+    await exchange.start_ticker_stream()
+    await exchange.start_order_book_stream()
+    await exchange.start_endpoint_probe()
+    await exchange.start_clock_sync()
+
+
+async def start_exchange_streams():
+    # markets, server time and capabilities of all exchanges, concurrently, before the first order
+    await registry.warm_up()
+    for exchange in registry.exchanges():
+        await start_exchange(exchange)
+    registry.start()
+
+
+def start_streams():
+    """
+    Warm up the exchanges, then start their live streams (balances, tickers, order books) and the
+    config file watch on the worker's event loop. Runs before the worker accepts requests.
+    """
+    get_loop_thread().run(start_exchange_streams())
+
+
+async def close_exchanges():
+    await registry.close()
+    await close_shared_sessions()
+
+
+async def close_worker():
+    await close_exchanges()
+    await close_async_pools()
+
+
+def shutdown():
+    """Close exchange sessions and database connections of this worker"""
+    get_loop_thread().stop(close_worker())
+    close_pools()
+
+
 if __name__ == "__main__":
     logger.info(f"Running in {env_name} environment")
+    # async views and their database pool share one event loop, like a gunicorn worker
+    get_loop_thread().start()
     app.run(host="0.0.0.0", port=8000, debug=True)
@@ -0,0 +1,121 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import logging
+import threading
+from typing import Any, Coroutine, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LoopThread:
+    """
+    A long-lived asyncio event loop running in a daemon thread.
+    One instance per process keeps ccxt async sessions, connection pools and caches
+    usable across requests instead of binding them to a per-request loop.
+    """
+
+    def __init__(self, name: str = "async-runtime"):
+        self.name = name
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._started = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> asyncio.AbstractEventLoop:
+        if self.running:
+            return self.loop
+        self.loop = asyncio.new_event_loop()
+        self._started.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        self._started.wait()
+        logger.info(f"Started event loop thread {self.name}")
+        return self.loop
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(self._started.set)
+        self.loop.run_forever()
+
+    def submit(self, coro: Coroutine) -> concurrent.futures.Future:
+        """
+        Schedule the coroutine on the loop from any other thread.
+        The caller's contextvars (e.g. the Flask request context) are carried over to the task.
+        """
+        if not self.running:
+            raise RuntimeError(f"Event loop thread {self.name} is not running")
+        context = contextvars.copy_context()
+        future: concurrent.futures.Future = concurrent.futures.Future()
+
+        def schedule():
+            task = self.loop.create_task(coro, context=context)
+
+            def done(task: asyncio.Task):
+                if task.cancelled():
+                    future.cancel()
+                elif task.exception() is not None:
+                    future.set_exception(task.exception())
+                else:
+                    future.set_result(task.result())
+
+            task.add_done_callback(done)
+
+        self.loop.call_soon_threadsafe(schedule)
+        return future
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """Run the coroutine on the loop and block the calling thread until it finished"""
+        if self.in_loop_thread():
+            raise RuntimeError("LoopThread.run() must not be called from the loop thread itself")
+        return self.submit(coro).result(timeout)
+
+    def in_loop_thread(self) -> bool:
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def stop(self, shutdown_coro: Optional[Coroutine] = None, timeout: float = 10) -> None:
+        """
+        Stop the loop, optionally running a shutdown coroutine (e.g. closing exchange sessions) first.
+        """
+        if not self.running:
+            return
+        if shutdown_coro is not None:
+            try:
+                self.run(shutdown_coro, timeout)
+            except Exception as e:
+                logger.error(f"Failed to shut down event loop thread {self.name} cleanly: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+        self.loop.close()
+        self._thread = None
+        logger.info(f"Stopped event loop thread {self.name}")
+
+
+_loop_thread = LoopThread()
+
+
+def get_loop_thread() -> LoopThread:
+    """Return the process-wide event loop thread"""
+    return _loop_thread
+
+
+def run_coroutine(coro: Coroutine) -> Any:
+    """
+    Run the coroutine on the process-wide event loop when it has been started,
+    otherwise on a fresh loop (e.g. when running the Flask development server).
+    """
+    if _loop_thread.running:
+        return _loop_thread.run(coro)
+    return asyncio.run(coro)
+
+
+def in_event_loop_thread() -> bool:
+    """Whether the calling thread is running an event loop, which blocking calls would stall"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
@@ -0,0 +1,240 @@
+import argparse
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Optional
+
+from dotenv import load_dotenv
+
+from clients.exchange import Exchange
+from clients.exchange_utils import format_pair
+from clients.nonce import configure_nonce_store
+from clients.rate_limit import configure_rate_limit_backend
+from clients.sessions import close_shared_sessions
+from config import Config
+from database.models import AsyncOrder, AsyncTrade, AsyncTradeBackfill
+from database.pool import async_connection, close_async_pools
+from database.records import TradeRecord
+from exchange_registry import ExchangeRegistry
+from loggers import setup_logging
+from parameters import add_common_args
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKFILL_CONFIG = {
+    # (exchange, account, pair) histories fetched at the same time, each request still waits for the rate limiter
+    "concurrency": 4,
+    # trades per request, e.g. {"binance": 500} per exchange, at most clients.exchange.MAX_PAGE_LIMITS
+    "page_limit": 1000,
+    "page_limit_by_exchange": {},
+    # exchanges that only return trades of a bounded time range per request are paged one window at a time
+    "window_hours_by_exchange": {"binance": 24, "bybit": 168, "kraken": 168},
+}
+
+
+def page_limit(backfill_config: dict[str, Any], exchange: Exchange) -> int:
+    """Trades per request for the exchange: a shorter page than this is the last of its window"""
+    limit = backfill_config["page_limit_by_exchange"].get(exchange.exchange_name, backfill_config["page_limit"])
+    return exchange.page_limit("fetch_my_trades", limit)
+
+
+async def _store_page(config: Config, exchange: Exchange, account: str, pair: str, trades: list[dict], watermark: int) -> int:
+    """Insert the trades of known orders and move the pair's watermark, in one transaction"""
+    async with async_connection(config.conn_info) as conn:
+        async with conn.cursor() as cur:
+            inserted = 0
+            if trades:
+                order_ids = await AsyncOrder.get_order_ids_by_external_order_ids(
+                    cur, exchange.market_code, list({str(trade["order"]) for trade in trades})
+                )
+                records = [
+                    TradeRecord.from_ccxt(trade, order_ids[str(trade["order"])])
+                    for trade in trades
+                    if str(trade["order"]) in order_ids
+                ]
+                if records:
+                    inserted = await AsyncTrade.copy_trades(cur, records)
+            await AsyncTradeBackfill.save_watermark(cur, exchange.exchange_name, account, pair, watermark, inserted)
+    return inserted
+
+
+async def backfill_pair(
+    config: Config,
+    exchange: Exchange,
+    account: str,
+    pair: str,
+    since: datetime,
+    backfill_config: dict[str, Any],
+) -> int:
+    """
+    Page through the account's trades in the pair from its watermark (or since, on the first run) up to now,
+    checkpointing after every page. Pages overlap on their boundary timestamp, the database skips the repeats.
+    Returns the number of inserted trades.
+    """
+    async with async_connection(config.conn_info) as conn:
+        async with conn.cursor() as cur:
+            watermark = await AsyncTradeBackfill.get_watermark(cur, exchange.exchange_name, account, pair)
+    cursor = watermark if watermark is not None else exchange.clock.server_milliseconds(since)
+    window_hours = backfill_config["window_hours_by_exchange"].get(exchange.exchange_name)
+    limit = page_limit(backfill_config, exchange)
+    now = int(time.time() * 1000 + exchange.server_time_offset_ms)
+    previous_ids: set[str] = set()
+    inserted = 0
+    while cursor < now:
+        until = min(cursor + int(window_hours * 3_600_000), now) if window_hours else None
+        with exchange.accounts.use(account):
+            page = await asyncio.to_thread(
+                exchange.fetch_my_trades_page, pair, cursor, limit, {"until": until} if until else {}
+            )
+        new_trades = [trade for trade in page if trade["id"] not in previous_ids]
+        if len(page) >= limit:
+            # more in this window: continue from the last timestamp, or past it if the whole page was on it
+            last = max(trade["timestamp"] for trade in page)
+            next_cursor = last if new_trades and last > cursor else cursor + 1
+        elif until is not None:
+            next_cursor = until
+        else:
+            next_cursor = now
+        inserted += await _store_page(config, exchange, account, pair, new_trades, next_cursor)
+        previous_ids = {trade["id"] for trade in page}
+        cursor = next_cursor
+    logger.info(f"Backfilled {inserted} trades of {exchange.exchange_name} {account} {pair}")
+    return inserted
+
+
+async def backfill_account(
+    config: Config,
+    exchange: Exchange,
+    account: str,
+    since_by_pair: dict[str, datetime],
+    backfill_config: dict[str, Any],
+) -> int:
+    """
+    Backfill the pairs of an account on a venue that lists the trades of every pair newest first (kraken): each window
+    from the oldest watermark up to now is paged once and its trades are split over the pairs, whose watermarks move
+    once the window is complete. Returns the number of inserted trades.
+    """
+    watermarks = {}
+    async with async_connection(config.conn_info) as conn:
+        async with conn.cursor() as cur:
+            for pair, since in since_by_pair.items():
+                watermark = await AsyncTradeBackfill.get_watermark(cur, exchange.exchange_name, account, pair)
+                watermarks[pair] = watermark if watermark is not None else exchange.clock.server_milliseconds(since)
+    cursor = min(watermarks.values())
+    window_hours = backfill_config["window_hours_by_exchange"].get(exchange.exchange_name)
+    now = int(time.time() * 1000 + exchange.server_time_offset_ms)
+    inserted = dict.fromkeys(watermarks, 0)
+    while cursor < now:
+        end = min(cursor + int(window_hours * 3_600_000), now) if window_hours else now
+        with exchange.accounts.use(account):
+            trades = await asyncio.to_thread(exchange.fetch_my_trades_window, cursor, end)
+        for pair, watermark in watermarks.items():
+            if watermark >= end:
+                continue
+            pair_trades = [trade for trade in trades if trade["symbol"] == pair and trade["timestamp"] > watermark]
+            inserted[pair] += await _store_page(config, exchange, account, pair, pair_trades, end)
+            watermarks[pair] = end
+        cursor = end
+    for pair, count in inserted.items():
+        logger.info(f"Backfilled {count} trades of {exchange.exchange_name} {account} {pair}")
+    return sum(inserted.values())
+
+
+async def backfill(
+    config: Config,
+    exchanges: list[Exchange],
+    symbols: Optional[list[str]] = None,
+    since: Optional[datetime] = None,
+    backfill_config: Optional[dict[str, Any]] = None,
+) -> dict[str, int]:
+    """
+    Load the trade history of every account of the exchanges into moolah.trade, for the pairs of the coins
+    they have orders in (or the given symbols). Trades of orders the database doesn't know are skipped.
+
+    :param since: naive UTC start of pairs that haven't been backfilled yet, the pair's first order by default
+    :return: number of inserted trades by exchange
+    """
+    backfill_config = {**DEFAULT_BACKFILL_CONFIG, **(backfill_config or {})}
+    semaphore = asyncio.Semaphore(backfill_config["concurrency"])
+    async with async_connection(config.conn_info) as conn:
+        async with conn.cursor() as cur:
+            traded_coins = {exchange: await AsyncOrder.get_traded_coins(cur, exchange.market_code) for exchange in exchanges}
+
+    async def run(exchange: Exchange, account: str, pair: str, start: datetime) -> tuple[str, int]:
+        async with semaphore:
+            try:
+                return exchange.exchange_name, await backfill_pair(config, exchange, account, pair, start, backfill_config)
+            except Exception as e:
+                # the checkpoint keeps what was loaded, the next run continues from there
+                logger.error(f"Failed to backfill {exchange.exchange_name} {account} {pair}: {e}")
+                return exchange.exchange_name, 0
+
+    async def run_account(exchange: Exchange, account: str, since_by_pair: dict[str, datetime]) -> tuple[str, int]:
+        async with semaphore:
+            try:
+                return exchange.exchange_name, await backfill_account(
+                    config, exchange, account, since_by_pair, backfill_config
+                )
+            except Exception as e:
+                logger.error(f"Failed to backfill {exchange.exchange_name} {account}: {e}")
+                return exchange.exchange_name, 0
+
+    runs = []
+    for exchange, coins in traded_coins.items():
+        since_by_pair = {
+            format_pair(coin_code, exchange.quote_currency, exchange.divider): since or first_order_on
+            for coin_code, first_order_on in coins
+            if not symbols or coin_code in symbols
+        }
+        for account in exchange.accounts.accounts:
+            if exchange.pages_by_offset:
+                # the trades of every pair come in the same pages, each account's history is downloaded once
+                if since_by_pair:
+                    runs.append(run_account(exchange, account, since_by_pair))
+                continue
+            for pair, start in since_by_pair.items():
+                runs.append(run(exchange, account, pair, start))
+
+    inserted = {exchange.exchange_name: 0 for exchange in exchanges}
+    for name, count in await asyncio.gather(*runs):
+        inserted[name] += count
+    return inserted
+
+
+if __name__ == "__main__":
+    # Load environment variables from .env file
+    load_dotenv()
+    setup_logging()
+    logger = logging.getLogger(__name__)
+
+    parser = argparse.ArgumentParser(description="Load the trade history of the exchanges into moolah.trade")
+    parser = add_common_args(parser)
+    parser.add_argument("--exchanges", nargs="*", help="Exchanges to backfill, every configured exchange by default")
+    parser.add_argument("--symbols", nargs="*", help="Coin codes to backfill, e.g. BTC ETH, every traded coin by default")
+    parser.add_argument(
+        "--since",
+        type=datetime.fromisoformat,
+        help="UTC start for pairs without a checkpoint, e.g. 2024-01-01, the first order of the pair by default",
+    )
+    args = parser.parse_args()
+    env_name = args.env_name
+    config = Config(env_name=env_name)
+    logger.info(f"Running in {env_name} environment")
+
+    registry = ExchangeRegistry(config, names=args.exchanges)
+    exchanges_config = registry.exchanges_ccxt_config["config"]
+    configure_rate_limit_backend(config.conn_info, exchanges_config.get("rate_limit"))
+    configure_nonce_store(config.conn_info)
+
+    async def run():
+        try:
+            await registry.warm_up()
+            inserted = await backfill(config, registry.exchanges(), args.symbols, args.since, exchanges_config.get("backfill"))
+            logger.info(f"Backfilled trades: {inserted}")
+        finally:
+            await registry.close()
+            await close_shared_sessions()
+            await close_async_pools()
+
+    asyncio.run(run())
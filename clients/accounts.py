@@ -0,0 +1,123 @@
+import contextlib
+import contextvars
+import inspect
+import threading
+from typing import Any, Iterator, Optional
+
+import ccxt
+
+from clients.rate_limit import ExchangeRateLimiter
+
+MAIN_ACCOUNT = "main"
+
+# account the requests of the current thread or task are sent for, the main account if unset
+_current_account: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_account", default=None)
+
+
+class AccountKey:
+    """One API key of an account: its own ccxt client and rate limit budgets"""
+
+    def __init__(self, api: ccxt.Exchange, rate_limiter: ExchangeRateLimiter):
+        self.api = api
+        self.rate_limiter = rate_limiter
+        self.pending = 0
+        self._lock = threading.Lock()
+        self._count_pending()
+
+    def _count(self, delta: int) -> None:
+        with self._lock:
+            self.pending += delta
+
+    def _count_pending(self) -> None:
+        fetch2 = self.api.fetch2
+
+        if inspect.iscoroutinefunction(fetch2):
+
+            async def async_fetch2(*args, **kwargs):
+                self._count(1)
+                try:
+                    return await fetch2(*args, **kwargs)
+                finally:
+                    self._count(-1)
+
+            self.api.fetch2 = async_fetch2
+        else:
+
+            def sync_fetch2(*args, **kwargs):
+                self._count(1)
+                try:
+                    return fetch2(*args, **kwargs)
+                finally:
+                    self._count(-1)
+
+            self.api.fetch2 = sync_fetch2
+
+
+class Account:
+    """
+    The main account or a sub-account of an exchange, with its own funds.
+    Orders are placed with its first key, reads are spread over all of its keys.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.keys: list[AccountKey] = []
+
+    def trade_key(self) -> AccountKey:
+        return self.keys[0]
+
+    def read_key(self) -> AccountKey:
+        """The key with the fewest requests in flight"""
+        return min(self.keys, key=lambda key: key.pending)
+
+
+class AccountPool:
+    """
+    Accounts of one exchange. Requests go to the account selected with use() for the current
+    thread or task (the main account by default), so that listings can be collected per account
+    and orders be placed with the account that holds the funds.
+    """
+
+    def __init__(self, exchange_name: str, main: Account):
+        self.exchange_name = exchange_name
+        self.accounts: dict[str, Account] = {main.name: main}
+
+    def add(self, name: str, key: AccountKey) -> None:
+        self.accounts.setdefault(name, Account(name)).keys.append(key)
+
+    @property
+    def multiple(self) -> bool:
+        return len(self.accounts) > 1
+
+    @contextlib.contextmanager
+    def use(self, name: str) -> Iterator[Account]:
+        """Send the requests of the current thread or task for the named account"""
+        token = _current_account.set(name)
+        try:
+            yield self.accounts[name]
+        finally:
+            _current_account.reset(token)
+
+    def current(self) -> Account:
+        return self.accounts[_current_account.get() or MAIN_ACCOUNT]
+
+    def selected(self) -> list[Account]:
+        """The account in use, or every account (main first) if none was selected"""
+        name = _current_account.get()
+        return [self.accounts[name]] if name is not None else list(self.accounts.values())
+
+    def account_with_most(self, currency: str, free_balances: dict[str, Optional[dict]]) -> str:
+        """Name of the account with the largest free balance of the currency, the main account on a tie"""
+        return max(
+            self.accounts,
+            key=lambda name: ((free_balances.get(name) or {}).get(currency) or 0, name == MAIN_ACCOUNT),
+        )
+
+    def keys(self) -> list[AccountKey]:
+        return [key for account in self.accounts.values() for key in account.keys]
+
+    def stats(self) -> list[dict[str, Any]]:
+        return [
+            {"account": account.name, "keys": len(account.keys), "pending": [key.pending for key in account.keys]}
+            for account in self.accounts.values()
+        ]
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BALANCE_STREAM_CONFIG = {
+    # a REST snapshot is taken again after this many seconds, even while the stream is connected
+    "resync_seconds": 300,
+    "reconnect_delay_seconds": 1,
+    "max_reconnect_delay_seconds": 30,
+}
+
+
+class BalanceCache:
+    """
+    Versioned view of the free balance of one account, fed by ccxt.pro watch_balance.
+    Reads never await: the current balance is swapped in as a whole on every update.
+    """
+
+    def __init__(self, exchange_name: str, balance_stream_config: Optional[dict[str, Any]] = None):
+        self.exchange_name = exchange_name
+        self.config = {**DEFAULT_BALANCE_STREAM_CONFIG, **(balance_stream_config or {})}
+        self.free: dict[str, float] = {}
+        self.version = 0
+        self.synced_at: Optional[float] = None
+        self.updated_at: Optional[float] = None
+        self.connected = False
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def stale(self) -> bool:
+        if not self.connected or self.synced_at is None:
+            return True
+        return time.monotonic() - self.synced_at > self.config["resync_seconds"]
+
+    def get_free_balance(self) -> Optional[dict[str, float]]:
+        """Return the free balance, None while the stream is stale"""
+        if self.stale:
+            return None
+        return self.free
+
+    def apply_snapshot(self, free: dict[str, Any]) -> None:
+        """Replace the balance with a full REST snapshot"""
+        self.free = {currency: amount for currency, amount in free.items() if amount is not None}
+        self.version += 1
+        self.synced_at = self.updated_at = time.monotonic()
+
+    def apply_update(self, free: dict[str, Any]) -> None:
+        """Merge a (possibly partial) stream update into the balance"""
+        self.free = {**self.free, **{currency: amount for currency, amount in free.items() if amount is not None}}
+        self.version += 1
+        self.updated_at = time.monotonic()
+
+    def reserve(self, currency: str, amount: float) -> None:
+        """
+        Deduct the amount locally right after placing an order, so that the next order doesn't
+        see funds the exchange has already locked before the stream reports the new balance.
+        """
+        if currency in self.free and amount:
+            self.free = {**self.free, currency: self.free[currency] - float(amount)}
+            self.version += 1
+
+    async def run(
+        self,
+        watch_balance: Callable[[], Awaitable[dict]],
+        fetch_free_balance: Callable[[], Optional[dict]],
+    ) -> None:
+        """
+        Seed the cache with a REST snapshot, then apply stream updates until cancelled.
+        After a disconnect (or every resync_seconds) the cache is seeded again from REST.
+
+        :param watch_balance: coroutine function returning the next ccxt balance structure
+        :param fetch_free_balance: blocking function returning a REST free balance snapshot
+        """
+        delay = self.config["reconnect_delay_seconds"]
+        while True:
+            try:
+                snapshot = await asyncio.to_thread(fetch_free_balance)
+                if snapshot is None:
+                    raise Exception("REST balance snapshot failed")
+                self.apply_snapshot(snapshot)
+                self.connected = True
+                delay = self.config["reconnect_delay_seconds"]
+                while not self.stale:
+                    resync_in = self.synced_at + self.config["resync_seconds"] - time.monotonic()
+                    try:
+                        balance = await asyncio.wait_for(watch_balance(), max(resync_in, 0))
+                    except asyncio.TimeoutError:
+                        break
+                    self.apply_update(balance.get("free") or {})
+            except asyncio.CancelledError:
+                self.connected = False
+                raise
+            except Exception as e:
+                self.connected = False
+                logger.warning(f"Balance stream of {self.exchange_name} disconnected, resyncing in {delay}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.config["max_reconnect_delay_seconds"])
+
+    def start(
+        self,
+        watch_balance: Callable[[], Awaitable[dict]],
+        fetch_free_balance: Callable[[], Optional[dict]],
+    ) -> asyncio.Task:
+        """Start feeding the cache on the running event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run(watch_balance, fetch_free_balance))
+        return self._task
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.connected = False
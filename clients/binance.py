@@ -9,12 +9,13 @@ class Binance(Exchange):
         secret,
         ccxt_config: dict[str, any] = None,
         config: dict[str, any] = None,
+        extra_keys: list[tuple[str, str, str]] = None,
     ):
         self.exchange_name = "binance"
         self.market_code = "BIN-SPOT"
         self.quote_currency = "USDT"
         self.divider = "/"
-        super().__init__(self.exchange_name, api_key, secret, ccxt_config, config)
+        super().__init__(self.exchange_name, api_key, secret, ccxt_config, config, extra_keys=extra_keys)
 
     def create_order(
         self,
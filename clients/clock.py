@@ -0,0 +1,150 @@
+import asyncio
+import inspect
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+import ccxt
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CLOCK_CONFIG = {
+    "enabled": True,
+    # the server time is sampled this often
+    "sample_seconds": 60,
+    # the offset is taken from the sample with the shortest round trip of the last few
+    "samples": 5,
+    # timestamp rejections trigger an extra sample, at most this often
+    "resample_min_seconds": 5,
+    # subtracted from "since" timestamps for the difference between the database's clock and ours
+    "since_margin_ms": 1000,
+}
+
+
+class ClockOffsetTracker:
+    """
+    Offset of one exchange's clock from ours, sampled with fetch_time every sample_seconds.
+    Signed requests of the attached clients use it (through ccxt's timeDifference option, where the
+    exchange has one) and "since" timestamps are converted to the exchange's clock with it.
+    An exchange rejecting a request timestamp triggers a new sample, so that the retry goes through.
+    """
+
+    def __init__(self, exchange_name: str, api: Any, clock_config: Optional[dict[str, Any]] = None):
+        self.exchange_name = exchange_name
+        self.config = {**DEFAULT_CLOCK_CONFIG, **(clock_config or {})}
+        self._api = api
+        self.enabled = bool(self.config["enabled"] and api.has.get("fetchTime"))
+        # (offset ms, round trip ms, monotonic time)
+        self.samples: deque[tuple[float, float, float]] = deque(maxlen=self.config["samples"])
+        self.offset_ms: float = 0.0
+        self.rtt_ms: Optional[float] = None
+        self._first_sample: Optional[tuple[float, float]] = None
+        self._last_sample_at = 0.0
+        self._clients: list[Any] = []
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def attach(self, api: Any) -> None:
+        """Sign the client's requests with the offset and resample when it reports a rejected timestamp"""
+        with self._lock:
+            self._clients.append(api)
+        self._apply(api)
+        fetch2 = api.fetch2
+        if inspect.iscoroutinefunction(fetch2):
+            return
+
+        def sync_fetch2(*args, **kwargs):
+            try:
+                return fetch2(*args, **kwargs)
+            except ccxt.InvalidNonce:
+                self.resample()
+                raise
+
+        api.fetch2 = sync_fetch2
+
+    def _apply(self, api: Any) -> None:
+        # exchanges without the option (e.g. kraken, bitfinex) only need increasing nonces
+        if "timeDifference" in api.options:
+            api.options["timeDifference"] = round(-self.offset_ms)
+
+    def sample(self) -> Optional[float]:
+        """Measure the offset once, blocking. Returns the offset in use (ms), None if the exchange has no time"""
+        if not self.enabled:
+            return None
+        sent = time.time() * 1000
+        server_time = self._api.fetch_time()
+        received = time.time() * 1000
+        now = time.monotonic()
+        rtt = received - sent
+        # the server read its clock about halfway through the round trip
+        offset = server_time - (sent + received) / 2
+        with self._lock:
+            self.samples.append((offset, rtt, now))
+            self.offset_ms, self.rtt_ms, _ = min(self.samples, key=lambda sample: sample[1])
+            if self._first_sample is None:
+                self._first_sample = (self.offset_ms, now)
+            self._last_sample_at = now
+            clients = list(self._clients)
+        for api in clients:
+            self._apply(api)
+        return self.offset_ms
+
+    def resample(self) -> None:
+        """Sample again after a rejected timestamp, unless that was just done"""
+        if time.monotonic() - self._last_sample_at < self.config["resample_min_seconds"]:
+            return
+        try:
+            offset = self.sample()
+            logger.warning(f"Request timestamp rejected by {self.exchange_name}, clock offset is now {offset}ms")
+        except Exception as e:
+            logger.warning(f"Failed to sample the clock of {self.exchange_name}: {e}")
+
+    def drift_ms_per_hour(self) -> Optional[float]:
+        """How fast the offset changed since the first sample"""
+        if self._first_sample is None or not self.samples:
+            return None
+        first_offset, first_at = self._first_sample
+        hours = (self.samples[-1][2] - first_at) / 3600
+        return (self.offset_ms - first_offset) / hours if hours > 0 else None
+
+    def server_milliseconds(self, since: datetime) -> int:
+        """
+        Millisecond timestamp on the exchange's clock of a naive UTC datetime from the database,
+        since_margin_ms early for the difference between the database's clock and ours.
+        """
+        local = since.replace(tzinfo=timezone.utc).timestamp() * 1000
+        return int(local + self.offset_ms - self.config["since_margin_ms"])
+
+    async def run(self) -> None:
+        """Sample every sample_seconds until cancelled"""
+        while True:
+            try:
+                await asyncio.to_thread(self.sample)
+            except Exception as e:
+                logger.warning(f"Failed to sample the clock of {self.exchange_name}: {e}")
+            await asyncio.sleep(self.config["sample_seconds"])
+
+    def start(self) -> Optional[asyncio.Task]:
+        """Start sampling on the running event loop"""
+        if not self.enabled:
+            return None
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+        return self._task
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "offset_ms": self.offset_ms,
+            "rtt_ms": self.rtt_ms,
+            "drift_ms_per_hour": self.drift_ms_per_hour(),
+        }
@@ -4,3 +4,6 @@ from typing import Optional, TypedDict
 class Ticker(TypedDict):
     symbol: str
     average: Optional[float]
+    bid: Optional[float]
+    ask: Optional[float]
+    last: Optional[float]
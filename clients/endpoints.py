@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Optional
+
+from clients.health import LatencyTracker
+
+logger = logging.getLogger(__name__)
+
+# interchangeable REST hostnames, the first one is ccxt's default
+DEFAULT_ENDPOINT_HOSTS = {
+    "binance": ["api.binance.com", "api1.binance.com", "api2.binance.com", "api3.binance.com", "api4.binance.com"],
+}
+
+# cheapest unauthenticated request of each exchange, used to measure a host's latency
+PING_PATHS = {
+    "binance": "/api/v3/ping",
+}
+
+DEFAULT_ENDPOINT_CONFIG = {
+    "enabled": True,
+    # per exchange, e.g. {"binance": ["api.binance.com", "api3.binance.com"]}; defaults to DEFAULT_ENDPOINT_HOSTS
+    "hosts": {},
+    "probe_interval_seconds": 30,
+    "probe_timeout_ms": 2000,
+    # weight of the latest probe in a host's moving average latency
+    "smoothing": 0.3,
+    # send a second request to the next fastest host when the first hasn't answered after the p95 latency
+    "hedge": False,
+    "hedge_methods": ["fetch_order", "fetch_ticker"],
+    "min_hedge_delay_ms": 50,
+    # don't hedge until this many answers were timed
+    "hedge_min_samples": 20,
+}
+
+
+def replace_host(urls: Any, old_host: str, new_host: str) -> Any:
+    """Copy of a ccxt urls['api'] entry (a string or a nested dict of strings) with the host swapped"""
+    if isinstance(urls, str):
+        return urls.replace(f"//{old_host}/", f"//{new_host}/")
+    if isinstance(urls, dict):
+        return {key: replace_host(value, old_host, new_host) for key, value in urls.items()}
+    return urls
+
+
+class EndpointSelector:
+    """
+    Routes the REST calls of one exchange to the fastest of its interchangeable hostnames.
+    A background task pings every host, keeps a moving average of its latency and rewrites
+    urls['api'] of the attached ccxt clients: the client of rank 0 uses the fastest healthy
+    host, rank 1 (the hedge client) the second fastest.
+    Disabled for exchanges without alternative hosts and when the client doesn't use the
+    default host (e.g. in sandbox mode).
+    """
+
+    def __init__(self, exchange_name: str, api: Any, endpoint_config: Optional[dict[str, Any]] = None):
+        self.exchange_name = exchange_name
+        self.config = {**DEFAULT_ENDPOINT_CONFIG, **(endpoint_config or {})}
+        self.hosts: list[str] = self.config["hosts"].get(exchange_name, DEFAULT_ENDPOINT_HOSTS.get(exchange_name, []))
+        self.ping_path = PING_PATHS.get(exchange_name)
+        self._api = api
+        default_host = DEFAULT_ENDPOINT_HOSTS.get(exchange_name, [None])[0]
+        self.enabled = bool(
+            self.config["enabled"]
+            and self.ping_path
+            and len(self.hosts) > 1
+            and default_host is not None
+            and f"//{default_host}/" in str(api.urls.get("api"))
+        )
+        self._default_host = default_host
+        self.latency_ms: dict[str, Optional[float]] = {host: None for host in self.hosts}
+        self.healthy: dict[str, bool] = {host: True for host in self.hosts}
+        self.read_latency: dict[str, LatencyTracker] = {method: LatencyTracker(200) for method in self.config["hedge_methods"]}
+        self.hedges = 0
+        self.hedge_wins = 0
+        # attached client, its rank and its original urls['api']
+        self._clients: list[tuple[Any, int, Any]] = []
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def attach(self, api: Any, rank: int = 0) -> None:
+        """Route the client to the host of the given rank from now on"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._clients.append((api, rank, api.urls["api"]))
+        self.apply()
+
+    def ranked_hosts(self) -> list[str]:
+        """Healthy hosts fastest first (unprobed ones after probed ones), then unhealthy ones"""
+
+        def key(host: str) -> tuple[bool, bool, float]:
+            latency = self.latency_ms[host]
+            return (not self.healthy[host], latency is None, latency or 0.0)
+
+        return sorted(self.hosts, key=key)
+
+    def host_for(self, rank: int) -> str:
+        ranked = self.ranked_hosts()
+        return ranked[min(rank, len(ranked) - 1)]
+
+    def apply(self) -> None:
+        """Point every attached client at the host of its rank"""
+        with self._lock:
+            clients = list(self._clients)
+        for api, rank, template in clients:
+            api.urls["api"] = replace_host(template, self._default_host, self.host_for(rank))
+
+    def _ping(self, host: str) -> Optional[float]:
+        """Latency of one ping in ms, None if it failed"""
+        url = f"https://{host}{self.ping_path}"
+        start = time.monotonic()
+        try:
+            response = self._api.session.get(url, timeout=self.config["probe_timeout_ms"] / 1000)
+            response.raise_for_status()
+        except Exception as e:
+            logger.warning(f"Endpoint {host} of {self.exchange_name} failed its probe: {e}")
+            return None
+        return (time.monotonic() - start) * 1000
+
+    def record_probe(self, host: str, latency_ms: Optional[float]) -> None:
+        if latency_ms is None:
+            self.healthy[host] = False
+            return
+        previous = self.latency_ms[host]
+        smoothing = self.config["smoothing"]
+        self.latency_ms[host] = latency_ms if previous is None else previous + smoothing * (latency_ms - previous)
+        self.healthy[host] = True
+
+    def probe(self) -> None:
+        """Ping every host once and re-route the clients, blocking"""
+        for host in self.hosts:
+            self.record_probe(host, self._ping(host))
+        fastest = self.host_for(0)
+        self.apply()
+        logger.debug(f"Fastest endpoint of {self.exchange_name} is {fastest}")
+
+    def hedge_delay_ms(self, method: str) -> Optional[float]:
+        """How long to wait for the first answer before hedging, None while there are too few samples"""
+        latency = self.read_latency.get(method)
+        if latency is None or len(latency.samples) < self.config["hedge_min_samples"]:
+            return None
+        return max(self.config["min_hedge_delay_ms"], latency.percentile(95))
+
+    async def run(self) -> None:
+        """Probe the hosts every probe_interval_seconds until cancelled"""
+        while True:
+            try:
+                await asyncio.to_thread(self.probe)
+            except Exception as e:
+                logger.warning(f"Probing endpoints of {self.exchange_name} failed: {e}")
+            await asyncio.sleep(self.config["probe_interval_seconds"])
+
+    def start(self) -> Optional[asyncio.Task]:
+        """Start probing on the running event loop"""
+        if not self.enabled:
+            return None
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+        return self._task
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "hosts": [
+                {"host": host, "latency_ms": self.latency_ms[host], "healthy": self.healthy[host]}
+                for host in self.ranked_hosts()
+            ],
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+        }
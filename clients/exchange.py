@@ -1,15 +1,61 @@
+import asyncio
+import concurrent.futures
 import logging
-from datetime import datetime, timezone
+import time
+import uuid
+from datetime import datetime
 from typing import Any, Optional
 
 import ccxt
 import ccxt.pro as ccxt_pro
 
+from clients.accounts import MAIN_ACCOUNT, Account, AccountKey, AccountPool
+from clients.balance_cache import BalanceCache
+from clients.clock import ClockOffsetTracker
 from clients.exchange_utils import is_exchange_known_ccxt
 from clients.custom_types import Ticker
+from clients.endpoints import EndpointSelector
+from clients.health import READ, WRITE, ExchangeHealth, LatencyTracker
+from clients.order_book import FillEstimate, OrderBookCache, OrderBookMirror
+from clients.rate_limit import ExchangeRateLimiter, account_id, install_rate_limiter
+from clients.request_cache import RequestCoalescer
+from clients.sessions import attach_shared_session
+from clients.ticker_cache import TickerCache
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_RECONCILE_CONFIG = {
+    # entries per request, at most MAX_PAGE_LIMITS
+    "page_limit": 100,
+    "max_pages": 20,
+    # pairs reconciled at the same time
+    "concurrency": 4,
+}
+
+# most entries a request of the listing returns, venues silently cap larger limits
+MAX_PAGE_LIMITS = {
+    "binance": {"fetch_closed_orders": 1000, "fetch_my_trades": 1000},
+    "bybit": {"fetch_closed_orders": 50, "fetch_my_trades": 100},
+    "kraken": {"fetch_closed_orders": 50, "fetch_my_trades": 50},
+}
+
+# venues whose listings return the newest entries of every pair first, paged by offset back from an end time
+OFFSET_PAGED_EXCHANGES = {"kraken"}
+
+
+# capabilities the client relies on, resolved during warm-up
+CAPABILITY_FLAGS = (
+    "fetchClosedOrders",
+    "fetchMyTrades",
+    "fetchTime",
+    "createOrderWs",
+    "watchBalance",
+    "watchTicker",
+    "watchTickers",
+    "watchOrderBook",
+    "watchOrders",
+)
+
 
 class Exchange:
     def __init__(
@@ -20,7 +66,12 @@ class Exchange:
         ccxt_config: dict[str, Any] = None,
         config: dict[str, Any] = None,
         exchange_config: dict[str, Any] = None,
+        extra_keys: list[tuple[str, str, str]] = None,
     ):
+        """
+        :param extra_keys: (api key, secret, account) of further keys: read keys of the main account
+                           (account "main") or keys of sub-accounts with their own funds
+        """
         self._api: ccxt.Exchange
         self._ws_async: ccxt_pro.Exchange = None
         self._api = self._init_ccxt(exchange_name, api_key, secret, True, ccxt_config, exchange_config)
@@ -30,6 +81,48 @@ class Exchange:
         self.divider: str
         self.config = config if config else {}
         self.log_responses = self.config.get("log_responses", False)
+        self.health = ExchangeHealth(exchange_name, self._api, self.config.get("health"))
+        # budgets shared with other processes using the same account, see clients.rate_limit
+        self.rate_limiter = ExchangeRateLimiter(exchange_name, account_id(api_key), self._api, self.config.get("rate_limit"))
+        install_rate_limiter(self._api, self.rate_limiter)
+        install_rate_limiter(self._ws_async, self.rate_limiter)
+        self._install_client(self._api, api_key)
+        self._install_client(self._ws_async, api_key)
+        main_account = Account(MAIN_ACCOUNT)
+        main_account.keys.append(AccountKey(self._api, self.rate_limiter))
+        self.accounts = AccountPool(exchange_name, main_account)
+        for extra_key, extra_secret, account_name in extra_keys or []:
+            api = self._init_ccxt(exchange_name, extra_key, extra_secret, True, ccxt_config, exchange_config)
+            # every key has its own account budgets, the per-IP ones are shared with the main key
+            rate_limiter = ExchangeRateLimiter(
+                exchange_name, account_id(extra_key), api, self.config.get("rate_limit"), self.rate_limiter
+            )
+            install_rate_limiter(api, rate_limiter)
+            self._install_client(api, extra_key)
+            self.accounts.add(account_name, AccountKey(api, rate_limiter))
+        self.balance_cache = BalanceCache(exchange_name, self.config.get("balance_stream"))
+        self.ticker_cache = TickerCache(exchange_name, self.config.get("ticker_stream"))
+        self.order_books = OrderBookCache(exchange_name, self.config.get("order_book_stream"))
+        self.ws_orders_config = {"enabled": True, "timeout_ms": 2000, **self.config.get("websocket_orders", {})}
+        self.order_latency = {"rest": LatencyTracker(200), "websocket": LatencyTracker(200)}
+        self.reconcile_config = {**DEFAULT_RECONCILE_CONFIG, **self.config.get("reconcile", {})}
+        self.request_cache = RequestCoalescer(exchange_name, self.config.get("request_cache"))
+        self.capabilities: dict[str, bool] = {}
+        self.endpoints = EndpointSelector(exchange_name, self._api, self.config.get("endpoints"))
+        self.endpoints.attach(self._api, 0)
+        self.endpoints.attach(self._ws_async, 0)
+        # second sync client on the next fastest host, for hedged reads
+        self._hedge_api: Optional[ccxt.Exchange] = None
+        self._hedge_pool: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        if self.endpoints.enabled and self.endpoints.config["hedge"]:
+            self._hedge_api = self._init_ccxt(exchange_name, api_key, secret, True, ccxt_config, exchange_config)
+            install_rate_limiter(self._hedge_api, self.rate_limiter)
+            self.endpoints.attach(self._hedge_api, 1)
+            self._hedge_pool = concurrent.futures.ThreadPoolExecutor(thread_name_prefix=f"{exchange_name}-hedge")
+        self.clock = ClockOffsetTracker(exchange_name, self._api, self.config.get("clock"))
+        for api in [self._ws_async, self._hedge_api, *(key.api for key in self.accounts.keys())]:
+            if api is not None:
+                self.clock.attach(api)
 
     def _init_ccxt(
         self,
@@ -76,12 +169,83 @@ class Exchange:
 
         return api
 
+    def _install_client(self, api, api_key: str) -> None:
+        """Hook for exchange specific setup of every (sync or async) ccxt client, e.g. nonces"""
+
     def _log_exchange_response(self, endpoint: str, response, *, add_info=None) -> None:
         """Log exchange responses"""
         if self.log_responses:
             add_info_str = "" if add_info is None else f" {add_info}: "
             logger.info(f"API {endpoint}: {add_info_str}{response}")
 
+    @property
+    def is_degraded(self) -> bool:
+        """True while the circuit breaker is open and calls fail fast"""
+        return self.health.degraded
+
+    def load_markets(self) -> None:
+        """Load the markets of the sync client and share them with the async client, blocking"""
+        self.health.call("load_markets", READ, self._api.load_markets)
+        self._ws_async.set_markets(self._api.markets, self._api.currencies)
+
+    @property
+    def server_time_offset_ms(self) -> float:
+        """Server clock minus local clock, see ClockOffsetTracker"""
+        return self.clock.offset_ms
+
+    def warm_up(self) -> dict[str, Any]:
+        """
+        Load markets, measure the server time offset and resolve capability flags, blocking,
+        so that the first order doesn't pay for them. Returns the timing of every step in ms.
+        """
+        timings = {}
+        start = time.monotonic()
+        self.load_markets()
+        timings["markets_ms"] = (time.monotonic() - start) * 1000
+        start = time.monotonic()
+        self.health.call("fetch_time", READ, self.clock.sample)
+        timings["time_ms"] = (time.monotonic() - start) * 1000
+        self.capabilities = {flag: bool(self._api.has.get(flag) or self._ws_async.has.get(flag)) for flag in CAPABILITY_FLAGS}
+        return timings
+
+    def _ws_orders_loop(self) -> Optional[asyncio.AbstractEventLoop]:
+        """
+        Return the event loop of the async client if websocket order entry can be used from this thread:
+        it must be enabled, supported by the exchange, and the loop must run in another thread.
+        """
+        if not self.ws_orders_config["enabled"] or not self._ws_async.has.get("createOrderWs"):
+            return None
+        # the websocket connection is authenticated with the main account's key
+        if self.accounts.current().name != MAIN_ACCOUNT:
+            return None
+        loop = self._ws_async.asyncio_loop
+        if loop is None or not loop.is_running() or loop.is_closed():
+            return None
+        try:
+            if asyncio.get_running_loop() is loop:
+                return None
+        except RuntimeError:
+            pass
+        return loop
+
+    def _create_order_ws(self, loop: asyncio.AbstractEventLoop, pair, type, side, amount, price, params) -> dict:
+        """Place the order over the async client's websocket connection and wait for the response"""
+        timeout = self.ws_orders_config["timeout_ms"] / 1000
+
+        async def create_order_ws():
+            return await asyncio.wait_for(
+                self._async_api().create_order_ws(pair, type, side, amount, price, params),
+                timeout,
+            )
+
+        future = asyncio.run_coroutine_threadsafe(create_order_ws(), loop)
+        try:
+            # the coroutine times out itself, the extra second covers scheduling on a busy loop
+            return future.result(timeout + 1)
+        except (asyncio.TimeoutError, concurrent.futures.TimeoutError) as e:
+            future.cancel()
+            raise ccxt.RequestTimeout(f"{self._api.name} create_order_ws timed out after {timeout}s") from e
+
     def create_order(
         self,
         pair: str,
@@ -98,7 +262,40 @@ class Exchange:
             # limit needs price, market doesn't need price
             price = price if type == "limit" else None
 
-            order = self._api.create_order(pair, type, side, amount, price, params)
+            ws_loop = self._ws_orders_loop()
+            if ws_loop is not None:
+                # the client order id correlates the websocket request with a possible REST retry
+                params = {"clientOrderId": uuid.uuid4().hex, **params}
+            client_order_id = params.get("clientOrderId")
+            if ws_loop is not None:
+                start = time.monotonic()
+                try:
+                    order = self.health.call(
+                        "create_order_ws", WRITE, self._create_order_ws, ws_loop, pair, type, side, amount, price, params
+                    )
+                    self.order_latency["websocket"].add((time.monotonic() - start) * 1000)
+                    self._log_exchange_response("create_order_ws", order)
+                    return order
+                except ccxt.NetworkError as e:
+                    # a timed out order may have reached the exchange: only resubmit it if the exchange doesn't know it
+                    logger.warning(f"Websocket order entry failed on {self._api.name}, falling back to REST: {e}")
+                    order = self._fetch_order_by_client_id(pair, client_order_id)
+                    if order is not None:
+                        self._log_exchange_response("create_order_ws", order)
+                        return order
+
+            start = time.monotonic()
+            try:
+                order = self.health.call(
+                    "create_order", WRITE, self._private_api(write=True).create_order, pair, type, side, amount, price, params
+                )
+            except ccxt.InvalidOrder as e:
+                # a duplicate client order id: the order went through after all, e.g. a late websocket order
+                order = self._fetch_order_by_client_id(pair, client_order_id) if client_order_id else None
+                if order is None:
+                    raise
+                logger.warning(f"Order {client_order_id} was already placed on {self._api.name}: {e}")
+            self.order_latency["rest"].add((time.monotonic() - start) * 1000)
             self._log_exchange_response("create_order", order)
 
             return order
@@ -106,70 +303,375 @@ class Exchange:
             logger.error(f"Failed to create order on {self._api.name}: {e}")
             return None
 
+    def _fetch_order_by_client_id(self, pair: str, client_order_id: str) -> Optional[dict]:
+        """The order placed with the client order id by the trading key, None if the exchange doesn't know it"""
+        try:
+            return self.health.call(
+                "fetch_order",
+                READ,
+                self._private_api(write=True).fetch_order,
+                None,
+                pair,
+                {"clientOrderId": client_order_id},
+            )
+        except ccxt.OrderNotFound:
+            return None
+
+    def order_transport_stats(self) -> dict[str, Any]:
+        """Order placement latency percentiles (ms) per transport"""
+        return {
+            transport: {
+                "orders": len(latency.samples),
+                "p50_ms": latency.percentile(50),
+                "p95_ms": latency.percentile(95),
+            }
+            for transport, latency in self.order_latency.items()
+        }
+
     def fetch_balance(self, params: Optional[dict] = None):
         try:
             if params is None:
                 params = {}
-            return self._api.fetch_balance(params)
+            return self.health.call("fetch_balance", READ, self._private_api().fetch_balance, params)
         except ccxt.BaseError as e:
             logger.error(f"Failed to fetch balance from {self._api.name}: {e}")
             return None
 
     def fetch_free_balance(self, params: Optional[dict] = None):
         try:
-            if params is None:
-                params = {}
-            balance = self._api.fetch_free_balance(params)
-            return balance
+            if params:
+                return self.health.call("fetch_free_balance", READ, self._private_api().fetch_free_balance, params)
+            return self.request_cache.call(
+                "fetch_free_balance",
+                (self.accounts.current().name,),
+                lambda: self.health.call("fetch_free_balance", READ, self._private_api().fetch_free_balance, {}),
+            )
         except ccxt.BaseError as e:
             logger.error(f"Failed to fetch free balance from {self._api.name}: {e}")
             return None
 
+    def get_free_balance(self) -> Optional[dict]:
+        """
+        Return the free balance from the live balance stream,
+        falling back to a REST call when the stream is not running or stale.
+        The balance of a sub-account in use is always fetched over REST.
+        """
+        if self.accounts.current().name != MAIN_ACCOUNT:
+            return self.fetch_free_balance()
+        free_balance = self.balance_cache.get_free_balance()
+        if free_balance is not None:
+            return free_balance
+        return self.fetch_free_balance()
+
+    def get_free_balances(self) -> dict[str, Optional[dict]]:
+        """Free balance of every account by account name"""
+        free_balances = {}
+        for account in self.accounts.selected():
+            with self.accounts.use(account.name):
+                free_balances[account.name] = self.get_free_balance()
+        return free_balances
+
+    def reserve_balance(self, currency: str, amount: float) -> None:
+        """Take a placed order's amount off the streamed balance until the next balance update"""
+        if self.accounts.current().name == MAIN_ACCOUNT:
+            self.balance_cache.reserve(currency, amount)
+
+    async def start_balance_stream(self) -> None:
+        """Keep balance_cache up to date from watch_balance, on the running event loop"""
+        if not self._ws_async.has.get("watchBalance"):
+            logger.info(f"{self._api.name} doesn't support watch_balance, balances are fetched over REST")
+            return
+        self.balance_cache.start(lambda: self._async_api().watch_balance(), self.fetch_free_balance)
+
+    def _hedged_read(self, method: str, *args):
+        """
+        Call the read method of the ccxt client; if it hasn't answered after its p95 latency,
+        send the same request through the hedge client and return whichever answer comes first.
+        Only for idempotent reads: the slower request is not cancelled.
+        """
+        hedged = self._hedge_api is not None and self.accounts.current().name == MAIN_ACCOUNT
+        delay = self.endpoints.hedge_delay_ms(method) if hedged else None
+        start = time.monotonic()
+        if delay is None:
+            result = getattr(self._private_api(), method)(*args)
+            if method in self.endpoints.read_latency:
+                self.endpoints.read_latency[method].add((time.monotonic() - start) * 1000)
+            return result
+
+        primary = self._hedge_pool.submit(getattr(self._api, method), *args)
+        done, _ = concurrent.futures.wait([primary], timeout=delay / 1000)
+        if not done:
+            if self._hedge_api.markets is None and self._api.markets is not None:
+                self._hedge_api.set_markets(self._api.markets, self._api.currencies)
+            self._hedge_api.timeout = self._api.timeout
+            hedge = self._hedge_pool.submit(getattr(self._hedge_api, method), *args)
+            self.endpoints.hedges += 1
+            for future in concurrent.futures.as_completed([primary, hedge]):
+                if future.exception() is None:
+                    if future is hedge:
+                        self.endpoints.hedge_wins += 1
+                    primary = future
+                    break
+        result = primary.result()
+        self.endpoints.read_latency[method].add((time.monotonic() - start) * 1000)
+        return result
+
     def fetch_order(self, id: str, pair: str, params: Optional[dict] = None):
+        """Fetch an order, looking it up in every account unless an account is in use"""
+        accounts = self.accounts.selected()
+        for account in accounts:
+            with self.accounts.use(account.name):
+                try:
+                    if params:
+                        order = self.health.call("fetch_order", READ, self._private_api().fetch_order, id, pair, params)
+                    else:
+                        order = self.request_cache.call(
+                            "fetch_order",
+                            (account.name, id, pair),
+                            lambda: self.health.call("fetch_order", READ, self._hedged_read, "fetch_order", id, pair, {}),
+                        )
+                    self._log_exchange_response("fetch_order", order)
+                    return order
+                except ccxt.OrderNotFound as e:
+                    if account is accounts[-1]:
+                        logger.error(f"Failed to fetch order from {self._api.name}: {e}")
+                except ccxt.BaseError as e:
+                    logger.error(f"Failed to fetch order from {self._api.name}: {e}")
+                    return None
+        return None
+
+    def _for_each_account(self, read) -> list:
+        """Concatenate a listing of every account, or of the account in use"""
+        results = []
+        for account in self.accounts.selected():
+            with self.accounts.use(account.name):
+                results.extend(read())
+        return results
+
+    def page_limit(self, endpoint: str, limit: int) -> int:
+        """Entries per request of a listing: at most what the venue returns, a shorter page is the last one"""
+        return min(limit, MAX_PAGE_LIMITS.get(self.exchange_name, {}).get(endpoint, limit))
+
+    @property
+    def pages_by_offset(self) -> bool:
+        """True if listings return the newest entries of every pair first (see _fetch_pages_by_offset)"""
+        return self.exchange_name in OFFSET_PAGED_EXCHANGES
+
+    def _fetch_pages_by_offset(
+        self, endpoint: str, func, start_ms: int, end_ms: int, params: Optional[dict], max_pages: Optional[int] = None
+    ) -> tuple[list, bool]:
+        """
+        Page back through a listing of every pair that returns the newest entries first, by offset
+        (kraken: start exclusive and end inclusive, in seconds). The fixed end keeps the offsets stable
+        while new entries come in. Returns the entries and whether the listing was paged to its end.
+        """
+        limit = MAX_PAGE_LIMITS[self.exchange_name][endpoint]
+        request = {**(params or {}), "start": start_ms // 1000, "end": end_ms // 1000}
+        results: list[dict] = []
+        pages = 0
+        while max_pages is None or pages < max_pages:
+            page = self.health.call(endpoint, READ, func, None, None, None, {**request, "ofs": len(results)})
+            results.extend(page)
+            pages += 1
+            if len(page) < limit:
+                return results, True
+        logger.warning(f"Stopped paging {endpoint} of {self._api.name} after {len(results)} entries")
+        return results, False
+
+    def _fetch_pages(self, endpoint: str, func, pair: str, since: datetime, params: Optional[dict]) -> tuple[list, bool]:
+        """
+        Page forward through a listing ordered by timestamp, starting at since,
+        until a short page is returned. Entries are de-duplicated by id since pages overlap
+        on their boundary timestamp. Returns the entries and whether the listing was paged to its end.
+        """
+        cursor = self.clock.server_milliseconds(since)
+        if self.pages_by_offset:
+            end = int(time.time() * 1000 + self.server_time_offset_ms)
+            entries, complete = self._fetch_pages_by_offset(
+                endpoint, func, cursor, end, params, self.reconcile_config["max_pages"]
+            )
+            return [entry for entry in entries if entry["symbol"] == pair], complete
+        limit = self.page_limit(endpoint, self.reconcile_config["page_limit"])
+        results: dict[str, dict] = {}
+        for _ in range(self.reconcile_config["max_pages"]):
+            page = self.health.call(endpoint, READ, func, pair, cursor, limit, params or {})
+            new_entries = [entry for entry in page if entry["id"] not in results]
+            results.update((entry["id"], entry) for entry in new_entries)
+            if len(page) < limit or not new_entries:
+                return list(results.values()), True
+            cursor = max(entry["timestamp"] for entry in page)
+        logger.warning(f"Stopped paging {endpoint} of {self._api.name} {pair} after {len(results)} entries")
+        return list(results.values()), False
+
+    def _fetch_all_trades(self, pair: str, since: datetime, params: Optional[dict]) -> Optional[list]:
+        """Trades of every selected account in the pair since a naive UTC datetime, None if they couldn't all be paged"""
+        complete = True
+
+        def read() -> list:
+            nonlocal complete
+            trades, paged = self._fetch_pages("fetch_my_trades", self._private_api().fetch_my_trades, pair, since, params)
+            complete = complete and paged
+            return trades
+
+        trades = self._for_each_account(read)
+        return trades if complete else None
+
+    def fetch_open_orders(self, pair: Optional[str] = None, params: Optional[dict] = None) -> Optional[list]:
+        """Open orders of a pair, or of the whole account if pair is None"""
         try:
-            if params is None:
-                params = {}
-            order = self._api.fetch_order(id, pair, params)
-            self._log_exchange_response("fetch_order", order)
-            return order
+            orders = self._for_each_account(
+                lambda: self.health.call(
+                    "fetch_open_orders", READ, self._private_api().fetch_open_orders, pair, None, None, params or {}
+                )
+            )
+            self._log_exchange_response("fetch_open_orders", orders)
+            return orders
+        except ccxt.BaseError as e:
+            logger.error(f"Failed to fetch open orders from {self._api.name}: {e}")
+            return None
+
+    def fetch_closed_orders(self, pair: str, since: datetime, params: Optional[dict] = None) -> Optional[list]:
+        """
+        Closed and canceled orders of a pair created since the given naive UTC datetime, all pages.
+        Returns None if the exchange doesn't list closed orders or the request failed.
+        """
+        if not self._api.has.get("fetchClosedOrders"):
+            return None
+        try:
+            orders = self._for_each_account(
+                lambda: self._fetch_pages("fetch_closed_orders", self._private_api().fetch_closed_orders, pair, since, params)[
+                    0
+                ]
+            )
+            self._log_exchange_response("fetch_closed_orders", orders)
+            return orders
         except ccxt.BaseError as e:
-            logger.error(f"Failed to fetch order from {self._api.name}: {e}")
+            logger.error(f"Failed to fetch closed orders from {self._api.name}: {e}")
             return None
 
+    def fetch_my_trades(self, pair: str, since: datetime, params: Optional[dict] = None) -> Optional[list]:
+        """
+        Trades of the account in a pair since the given naive UTC datetime, all pages.
+        Returns None if the request failed or stopped at max_pages.
+        """
+        try:
+            trades = self._fetch_all_trades(pair, since, params)
+            self._log_exchange_response("fetch_my_trades", trades)
+            return trades
+        except ccxt.BaseError as e:
+            logger.error(f"Failed to fetch trades from {self._api.name}: {e}")
+            return None
+
+    def fetch_my_trades_page(
+        self, pair: Optional[str], since_ms: Optional[int], limit: Optional[int], params: Optional[dict] = None
+    ) -> list:
+        """
+        One page of the trades of the account in use, from a millisecond timestamp on the exchange's clock
+        (None: every pair, paged by params only). Raises on failure, for callers that keep track of their
+        progress (see backfill_trades.py).
+        """
+        return self.health.call(
+            "fetch_my_trades", READ, self._private_api().fetch_my_trades, pair, since_ms, limit, params or {}
+        )
+
+    def fetch_my_trades_window(self, start_ms: int, end_ms: int) -> list:
+        """
+        Trades of every pair of the account in use between two millisecond timestamps on the exchange's clock,
+        for venues that page by offset (see pages_by_offset). Raises on failure, like fetch_my_trades_page.
+        """
+        trades, _ = self._fetch_pages_by_offset("fetch_my_trades", self._private_api().fetch_my_trades, start_ms, end_ms, None)
+        return trades
+
     def fetch_ticker(self, pair: str) -> Ticker:
         try:
-            data = self._api.fetch_ticker(pair)
-            return data
+            return self.request_cache.call(
+                "fetch_ticker",
+                (pair,),
+                lambda: self.health.call("fetch_ticker", READ, self._hedged_read, "fetch_ticker", pair),
+            )
 
         except ccxt.BaseError as e:
             logger.error(f"Failed to fetch ticker from {self._api.name}: {e}")
             return None
 
+    def get_ticker(self, pair: str) -> Ticker:
+        """
+        Return the ticker from the live ticker stream, falling back to a REST call
+        when the pair isn't streamed yet or its price is stale. The pair is subscribed to.
+        """
+        self.ticker_cache.track([pair])
+        ticker = self.ticker_cache.get_ticker(pair)
+        if ticker is not None:
+            return ticker
+        return self.fetch_ticker(pair)
+
+    async def start_ticker_stream(self) -> None:
+        """Keep ticker_cache up to date for all tracked pairs, on the running event loop"""
+        has = self._ws_async.has
+        if not has.get("watchTicker"):
+            logger.info(f"{self._api.name} doesn't support watch_ticker, tickers are fetched over REST")
+            return
+        watch_tickers = (lambda symbols: self._async_api().watch_tickers(symbols)) if has.get("watchTickers") else None
+        self.ticker_cache.start(watch_tickers, lambda symbol: self._async_api().watch_ticker(symbol))
+
+    def fetch_order_book(self, pair: str, limit: Optional[int] = None):
+        try:
+            return self.health.call("fetch_order_book", READ, self._api.fetch_order_book, pair, limit)
+        except ccxt.BaseError as e:
+            logger.error(f"Failed to fetch order book from {self._api.name}: {e}")
+            return None
+
+    def _get_order_book(self, pair: str) -> Optional[OrderBookMirror]:
+        """Return the mirrored order book, resynced from REST when it's missing or stale"""
+        self.order_books.track([pair])
+        book = self.order_books.get(pair)
+        if book is None:
+            order_book = self.fetch_order_book(pair, self.order_books.config["depth"])
+            if order_book is None:
+                return None
+            self.order_books.update(pair, order_book)
+            book = self.order_books.books.get(pair)
+        return book
+
+    def estimate_fill(self, pair: str, side: str, amount: float) -> Optional[FillEstimate]:
+        """
+        Estimate average price and cost of a market order by walking the order book.
+        Returns None if no order book is available.
+        """
+        book = self._get_order_book(pair)
+        if book is None:
+            return None
+        return book.side_for(side).estimate_fill(float(amount))
+
+    def estimate_amount(self, pair: str, side: str, cost: float) -> Optional[float]:
+        """Estimate the base amount a market order for the given quote cost fills"""
+        book = self._get_order_book(pair)
+        if book is None:
+            return None
+        return book.side_for(side).amount_for_cost(float(cost))
+
+    async def start_order_book_stream(self) -> None:
+        """Keep the order books of all tracked pairs mirrored, on the running event loop"""
+        if not self._ws_async.has.get("watchOrderBook"):
+            logger.info(f"{self._api.name} doesn't support watch_order_book, order books are fetched over REST")
+            return
+        self.order_books.start(lambda symbol: self._async_api().watch_order_book(symbol))
+
     def get_trades_for_order(self, order_id: str, pair: str, since: datetime, params: Optional[dict] = None) -> list:
         """
         Fetch Orders using the "fetch_my_trades" endpoint and filter them by order-id.
-        The "since" argument passed in is coming from the database and is in UTC,
-        as timezone-native datetime object.
-        From the python documentation:
-            > Naive datetime instances are assumed to represent local time
-        Therefore, calling "since.timestamp()" will get the UTC timestamp, after applying the
-        transformation from local timezone to UTC.
-        This works for timezones UTC+ since then the result will contain trades from a few hours
-        instead of from the last 5 seconds, however fails for UTC- timezones,
-        since we're then asking for trades with a "since" argument in the future.
+        The "since" argument passed in is coming from the database and is a naive UTC datetime,
+        it is converted to the exchange's clock (see ClockOffsetTracker.server_milliseconds).
 
         :param order_id order_id: Order-id as given when creating the order
         :param pair: Pair the order is for
         :param since: datetime object of the order creation time. Assumes object is in UTC.
+        :return: the order's trades, None if the trades since couldn't all be fetched
         """
         try:
-            if params is None:
-                params = {}
-            my_trades = self._api.fetch_my_trades(
-                pair,
-                int((since.replace(tzinfo=timezone.utc).timestamp() - 5) * 1000),
-                params=params,
-            )
+            my_trades = self._fetch_all_trades(pair, since, params)
+            if my_trades is None:
+                return None
             matched_trades = [trade for trade in my_trades if trade["order"] == order_id]
             self._log_exchange_response("get_trades_for_order", matched_trades)
             return matched_trades
@@ -177,13 +679,54 @@ class Exchange:
             logger.error(f"Failed to retrieve matching trades on {self._api.name}: {e}")
             return None
 
+    async def start_clock_sync(self) -> None:
+        """Keep sampling the server clock offset, on the running event loop"""
+        self.clock.start()
+
+    async def start_endpoint_probe(self) -> None:
+        """Keep routing REST calls to the fastest host, on the running event loop"""
+        self.endpoints.start()
+
+    def _private_api(self, write: bool = False) -> ccxt.Exchange:
+        """
+        Sync ccxt client for the next authenticated request of the account in use:
+        its trading key for writes, the least busy of its keys for reads.
+        """
+        account = self.accounts.current()
+        api = account.trade_key().api if write else account.read_key().api
+        if api is not self._api:
+            if api.markets is None and self._api.markets is not None:
+                api.set_markets(self._api.markets, self._api.currencies)
+            # adapted by ExchangeHealth.call on the main client
+            api.timeout = self._api.timeout
+        return api
+
+    def _async_api(self) -> ccxt_pro.Exchange:
+        """
+        Return the async ccxt client, using the shared session of the running event loop.
+        Must be called from a coroutine.
+        """
+        return attach_shared_session(self._ws_async, self.config.get("connection_pool"))
+
+    async def close(self) -> None:
+        """Close websocket connections of the async ccxt client, must run on the loop that used it"""
+        await self.balance_cache.stop()
+        await self.ticker_cache.stop()
+        await self.order_books.stop()
+        await self.endpoints.stop()
+        await self.clock.stop()
+        if self._hedge_pool is not None:
+            self._hedge_pool.shutdown(wait=False)
+        if self._ws_async is not None:
+            await self._ws_async.close()
+
     async def watch_orders(self, symbol: str = None, since: datetime = None, limit: int = None, params=None) -> list:
         if params is None:
             params = {}
         if since:
-            since = (int((since.replace(tzinfo=timezone.utc).timestamp() - 5) * 1000),)
+            since = self.clock.server_milliseconds(since)
 
-        orders = await self._ws_async.watch_orders(
+        orders = await self._async_api().watch_orders(
             symbol,
             since,
             limit,
@@ -1,6 +1,7 @@
 import ccxt
 
-from typing import Any, Optional
+from decimal import Decimal
+from typing import Any, Optional, Union
 from ccxt import decimal_to_precision, TRUNCATE, TICK_SIZE, ROUND
 
 CcxtModuleType = Any
@@ -17,6 +18,18 @@ def ccxt_exchanges(ccxt_module: Optional[CcxtModuleType] = None) -> list[str]:
     return ccxt_module.exchanges if ccxt_module is not None else ccxt.exchanges
 
 
+def to_ccxt_number(number: Optional[Union[Decimal, float]]) -> Optional[float]:
+    """ccxt works with floats, numeric database columns are Decimal"""
+    return None if number is None else float(number)
+
+
+def to_decimal(number: Optional[Union[Decimal, float, str]]) -> Optional[Decimal]:
+    """Decimal of a number returned by ccxt, through its shortest repr: 0.1 is Decimal("0.1")"""
+    if number is None or isinstance(number, Decimal):
+        return number
+    return Decimal(str(number))
+
+
 def format_pair(symbol: str, quote_ccy: str, divider: str = "") -> str:
     return f"{symbol}{divider}{quote_ccy}"
 
@@ -0,0 +1,273 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Optional
+
+import ccxt
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+READ = "read"
+WRITE = "write"
+
+# Errors telling that the venue itself is unhealthy, as opposed to a rejected request
+VENUE_ERRORS = (ccxt.NetworkError,)
+# Errors where the exchange did not execute the request, so even a write is safe to repeat
+REJECTED_ERRORS = (ccxt.RateLimitExceeded, ccxt.DDoSProtection, ccxt.InvalidNonce)
+
+DEFAULT_HEALTH_CONFIG = {
+    "window_seconds": 60,
+    "min_calls": 10,
+    "error_rate_threshold": 0.5,
+    "slow_call_ms": 5000,
+    "slow_call_rate_threshold": 0.8,
+    "open_seconds": 30,
+    "read_max_attempts": 3,
+    "write_max_attempts": 2,
+    "read_retry_ratio": 0.2,
+    "write_retry_ratio": 0.05,
+    "retry_backoff_ms": 200,
+    "latency_samples": 200,
+    "timeout_min_samples": 20,
+    "timeout_percentile": 99,
+    "timeout_multiplier": 3.0,
+    "timeout_min_ms": 1000,
+    "timeout_max_ms": 10000,
+}
+
+
+class CircuitOpenError(ccxt.ExchangeNotAvailable):
+    """Raised without calling the exchange while its circuit breaker is open"""
+
+
+class LatencyTracker:
+    """Keep the latest call latencies (in ms) and compute percentiles over them"""
+
+    def __init__(self, max_samples: int):
+        self.samples: deque[float] = deque(maxlen=max_samples)
+
+    def add(self, latency_ms: float) -> None:
+        self.samples.append(latency_ms)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(percentile / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class RetryBudget:
+    """
+    Token bucket limiting retries to a ratio of the calls made,
+    so that a degraded venue does not receive a retry storm on top of the regular load.
+    """
+
+    def __init__(self, ratio: float, max_tokens: float = 10.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+
+    def deposit(self) -> None:
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class CircuitBreaker:
+    """
+    Error-rate and slow-call-rate based circuit breaker over a sliding time window.
+    After open_seconds in the open state a single probe call is let through (half open),
+    which closes the circuit on success and opens it again on failure.
+    """
+
+    def __init__(
+        self,
+        window_seconds: float,
+        min_calls: int,
+        error_rate_threshold: float,
+        slow_call_ms: float,
+        slow_call_rate_threshold: float,
+        open_seconds: float,
+    ):
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.error_rate_threshold = error_rate_threshold
+        self.slow_call_ms = slow_call_ms
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self.opened_at: Optional[float] = None
+        self._calls: deque[tuple[float, bool, bool]] = deque()
+        self._probing = False
+
+    def _trim(self, now: float) -> None:
+        while self._calls and self._calls[0][0] < now - self.window_seconds:
+            self._calls.popleft()
+
+    def allow(self, now: float) -> bool:
+        if self.state == OPEN:
+            if now - self.opened_at < self.open_seconds:
+                return False
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN:
+            if self._probing:
+                return False
+            self._probing = True
+        return True
+
+    def abandon(self) -> None:
+        """End a call that failed for a reason unrelated to the exchange: a probe is let through again"""
+        if self.state == HALF_OPEN:
+            self._probing = False
+
+    def record(self, now: float, failed: bool, latency_ms: float) -> None:
+        if self.state == HALF_OPEN:
+            self._probing = False
+            if failed:
+                self._open(now)
+            else:
+                self.state = CLOSED
+                self._calls.clear()
+            return
+
+        self._calls.append((now, failed, latency_ms >= self.slow_call_ms))
+        self._trim(now)
+        if self.state == CLOSED and len(self._calls) >= self.min_calls:
+            error_rate, slow_call_rate = self.rates()
+            if error_rate >= self.error_rate_threshold or slow_call_rate >= self.slow_call_rate_threshold:
+                self._open(now)
+
+    def _open(self, now: float) -> None:
+        self.state = OPEN
+        self.opened_at = now
+
+    def rates(self) -> tuple[float, float]:
+        if not self._calls:
+            return 0.0, 0.0
+        total = len(self._calls)
+        errors = sum(1 for _, failed, _ in self._calls if failed)
+        slow = sum(1 for _, _, is_slow in self._calls if is_slow)
+        return errors / total, slow / total
+
+
+class ExchangeHealth:
+    """
+    Health of a single exchange: wraps every ccxt call with a circuit breaker,
+    separate retry budgets for idempotent reads and non-idempotent writes,
+    and a request timeout adapted from the observed latency percentiles.
+    """
+
+    def __init__(self, name: str, api: Any, health_config: Optional[dict[str, Any]] = None):
+        self.name = name
+        self._api = api
+        self.config = {**DEFAULT_HEALTH_CONFIG, **(health_config or {})}
+        self.breaker = CircuitBreaker(
+            self.config["window_seconds"],
+            self.config["min_calls"],
+            self.config["error_rate_threshold"],
+            self.config["slow_call_ms"],
+            self.config["slow_call_rate_threshold"],
+            self.config["open_seconds"],
+        )
+        self.latency = LatencyTracker(self.config["latency_samples"])
+        self.retry_budgets = {
+            READ: RetryBudget(self.config["read_retry_ratio"]),
+            WRITE: RetryBudget(self.config["write_retry_ratio"]),
+        }
+        self.max_attempts = {READ: self.config["read_max_attempts"], WRITE: self.config["write_max_attempts"]}
+        self._lock = threading.Lock()
+
+    @property
+    def degraded(self) -> bool:
+        with self._lock:
+            return self._degraded()
+
+    def _degraded(self) -> bool:
+        return self.breaker.state == OPEN and time.monotonic() - self.breaker.opened_at < self.breaker.open_seconds
+
+    def timeout_ms(self) -> int:
+        """Request timeout derived from the latency percentile, within the configured bounds"""
+        config = self.config
+        if len(self.latency.samples) < config["timeout_min_samples"]:
+            return config["timeout_max_ms"]
+        latency = self.latency.percentile(config["timeout_percentile"])
+        return int(min(config["timeout_max_ms"], max(config["timeout_min_ms"], latency * config["timeout_multiplier"])))
+
+    def call(self, endpoint: str, kind: str, func: Callable, *args, **kwargs):
+        """
+        Call func through the circuit breaker and retry policy of the given kind (READ or WRITE).
+        Raises CircuitOpenError without calling func while the exchange is degraded.
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            with self._lock:
+                allowed = self.breaker.allow(time.monotonic())
+                self._api.timeout = self.timeout_ms()
+            if not allowed:
+                raise CircuitOpenError(f"{self.name} is degraded, skipping {endpoint}")
+
+            start = time.monotonic()
+            try:
+                result = func(*args, **kwargs)
+            except ccxt.BaseError as e:
+                failed = isinstance(e, VENUE_ERRORS)
+                self._record(start, failed)
+                retryable = isinstance(e, VENUE_ERRORS if kind == READ else REJECTED_ERRORS)
+                if not retryable or attempt >= self.max_attempts[kind] or not self._withdraw_retry(kind):
+                    raise
+                logger.warning(f"Retrying {endpoint} on {self.name} ({attempt}/{self.max_attempts[kind]}): {e}")
+                time.sleep(self.config["retry_backoff_ms"] * attempt / 1000)
+                continue
+            except BaseException:
+                # e.g. a database error of the rate limiter: the exchange wasn't called, a half-open probe is released
+                with self._lock:
+                    self.breaker.abandon()
+                raise
+
+            self._record(start, False)
+            with self._lock:
+                self.retry_budgets[kind].deposit()
+            return result
+
+    def _record(self, start: float, failed: bool) -> None:
+        now = time.monotonic()
+        latency_ms = (now - start) * 1000
+        with self._lock:
+            previous_state = self.breaker.state
+            self.breaker.record(now, failed, latency_ms)
+            if not failed:
+                self.latency.add(latency_ms)
+            state = self.breaker.state
+        if state != previous_state:
+            logger.warning(f"Circuit breaker of {self.name} changed from {previous_state} to {state}")
+
+    def _withdraw_retry(self, kind: str) -> bool:
+        with self._lock:
+            return self.retry_budgets[kind].withdraw()
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            error_rate, slow_call_rate = self.breaker.rates()
+            return {
+                "exchange": self.name,
+                "state": self.breaker.state,
+                "degraded": self._degraded(),
+                "error_rate": round(error_rate, 4),
+                "slow_call_rate": round(slow_call_rate, 4),
+                "latency_p50_ms": self.latency.percentile(50),
+                "latency_p95_ms": self.latency.percentile(95),
+                "latency_p99_ms": self.latency.percentile(99),
+                "timeout_ms": self.timeout_ms(),
+                "retry_tokens": {kind: round(budget.tokens, 2) for kind, budget in self.retry_budgets.items()},
+            }
@@ -1,4 +1,6 @@
 from clients.exchange import Exchange
+from clients.nonce import get_nonce_coordinator
+from clients.rate_limit import account_id
 
 
 class Kraken(Exchange):
@@ -8,12 +10,17 @@ class Kraken(Exchange):
         secret,
         ccxt_config: dict[str, any] = None,
         config: dict[str, any] = None,
+        extra_keys: list[tuple[str, str, str]] = None,
     ):
         self.exchange_name = "kraken"
         self.market_code = "KRA-SPOT"
         self.quote_currency = "USDT"
         self.divider = "/"
-        super().__init__(self.exchange_name, api_key, secret, ccxt_config, config)
+        super().__init__(self.exchange_name, api_key, secret, ccxt_config, config, extra_keys=extra_keys)
+
+    def _install_client(self, api, api_key: str) -> None:
+        """Take nonces from the key's NonceCoordinator, so that private requests can run concurrently"""
+        get_nonce_coordinator(account_id(api_key), self.config.get("nonce")).install(api)
 
     def create_order(
         self,
@@ -0,0 +1,187 @@
+import asyncio
+import contextlib
+import inspect
+import logging
+import threading
+import time
+from typing import Any, Optional
+
+import psycopg
+
+from database.models import ApiNonce, AsyncApiNonce
+from database.pool import async_connection, connection
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NONCE_CONFIG = {
+    # send the private requests of one key one at a time, in nonce order. Can be turned off
+    # for keys with a nonce window configured on the exchange, which accept slightly out of order nonces
+    "ordered_dispatch": True,
+    # order them across processes as well (web workers, watcher, executor) through the key's row in
+    # moolah.api_nonce, once a nonce store has been configured (see configure_nonce_store)
+    "shared": True,
+    # seconds to wait for a database connection before sending with the process-wide order only
+    "store_timeout_seconds": 2.0,
+}
+
+_conn_info: Optional[str] = None
+
+
+def configure_nonce_store(conn_info: Optional[str]) -> None:
+    """Order the private requests of every key across the processes using the database, None to stop"""
+    global _conn_info
+    _conn_info = conn_info
+
+
+class NonceCoordinator:
+    """
+    Nonces of one API key: strictly increasing microsecond timestamps, shared by every client
+    of the key in this process, and an optional dispatch lock so that requests reach the exchange
+    in the order their nonces were taken. One lock orders the requests of the key's sync and async
+    clients in this process; with a nonce store the key's row in moolah.api_nonce is also held from
+    signing to the response, which orders the requests of every process using the key and carries its
+    last nonce over to processes whose clock is behind. While the database can't be reached requests
+    are only ordered within the process, keys used by several processes then need a nonce window.
+    """
+
+    def __init__(self, account: str, nonce_config: dict[str, Any] = None):
+        self.account = account
+        self.config = {**DEFAULT_NONCE_CONFIG, **(nonce_config or {})}
+        self.pending = 0
+        self._last = 0
+        self._lock = threading.Lock()
+        self._dispatch_lock = threading.Lock()
+
+    def next(self) -> int:
+        with self._lock:
+            self._last = max(time.time_ns() // 1000, self._last + 1)
+            return self._last
+
+    def _advance(self, last_nonce: int) -> None:
+        with self._lock:
+            self._last = max(self._last, last_nonce)
+
+    def _count(self, delta: int) -> None:
+        with self._lock:
+            self.pending += delta
+
+    def _shared(self) -> bool:
+        return self.config["shared"] and _conn_info is not None
+
+    @contextlib.contextmanager
+    def _store_lock(self):
+        """Hold the key's row of the nonce store (if there is one) while the request is signed and sent"""
+        if not self._shared():
+            yield
+            return
+        with contextlib.ExitStack() as stack:
+            try:
+                conn = stack.enter_context(connection(_conn_info, timeout=self.config["store_timeout_seconds"]))
+                cur = stack.enter_context(conn.cursor())
+                self._advance(ApiNonce.lock(cur, self.account))
+            except (psycopg.Error, OSError) as e:
+                logger.warning(f"Nonce store unavailable, ordering the requests of {self.account} in this process only: {e}")
+                cur = None
+            try:
+                yield
+            finally:
+                if cur is not None:
+                    try:
+                        ApiNonce.save(cur, self.account, self._last)
+                        conn.commit()
+                    except (psycopg.Error, OSError) as e:
+                        logger.warning(f"Failed to save the last nonce of {self.account}: {e}")
+
+    @contextlib.asynccontextmanager
+    async def _async_store_lock(self):
+        """See _store_lock"""
+        if not self._shared():
+            yield
+            return
+        async with contextlib.AsyncExitStack() as stack:
+            try:
+                conn = await stack.enter_async_context(
+                    async_connection(_conn_info, timeout=self.config["store_timeout_seconds"])
+                )
+                cur = await stack.enter_async_context(conn.cursor())
+                self._advance(await AsyncApiNonce.lock(cur, self.account))
+            except (psycopg.Error, OSError) as e:
+                logger.warning(f"Nonce store unavailable, ordering the requests of {self.account} in this process only: {e}")
+                cur = None
+            try:
+                yield
+            finally:
+                if cur is not None:
+                    try:
+                        await AsyncApiNonce.save(cur, self.account, self._last)
+                        await conn.commit()
+                    except (psycopg.Error, OSError) as e:
+                        logger.warning(f"Failed to save the last nonce of {self.account}: {e}")
+
+    @contextlib.asynccontextmanager
+    async def _async_dispatch_lock(self):
+        """The dispatch lock of the sync clients, taken in a worker thread so that the event loop doesn't wait"""
+        acquired = asyncio.get_running_loop().run_in_executor(None, self._dispatch_lock.acquire)
+        try:
+            await asyncio.shield(acquired)
+        except asyncio.CancelledError:
+            # the worker thread still takes the lock, hand it back once it has
+            acquired.add_done_callback(lambda _: self._dispatch_lock.release())
+            raise
+        try:
+            yield
+        finally:
+            self._dispatch_lock.release()
+
+    def install(self, api) -> None:
+        """Take the nonces of a (sync or async) ccxt client from here and order its private requests"""
+        api.nonce = self.next
+        fetch2 = api.fetch2
+        ordered = self.config["ordered_dispatch"]
+
+        if inspect.iscoroutinefunction(fetch2):
+
+            async def async_fetch2(path, api_type="public", method="GET", params=None, headers=None, body=None, config=None):
+                if api_type != "private":
+                    return await fetch2(path, api_type, method, params, headers, body, config)
+                self._count(1)
+                try:
+                    if not ordered:
+                        return await fetch2(path, api_type, method, params, headers, body, config)
+                    async with self._async_dispatch_lock(), self._async_store_lock():
+                        return await fetch2(path, api_type, method, params, headers, body, config)
+                finally:
+                    self._count(-1)
+
+            api.fetch2 = async_fetch2
+        else:
+
+            def sync_fetch2(path, api_type="public", method="GET", params=None, headers=None, body=None, config=None):
+                if api_type != "private":
+                    return fetch2(path, api_type, method, params, headers, body, config)
+                self._count(1)
+                try:
+                    if not ordered:
+                        return fetch2(path, api_type, method, params, headers, body, config)
+                    with self._dispatch_lock, self._store_lock():
+                        return fetch2(path, api_type, method, params, headers, body, config)
+                finally:
+                    self._count(-1)
+
+            api.fetch2 = sync_fetch2
+
+    def stats(self) -> dict[str, Any]:
+        return {"pending": self.pending, "last_nonce": self._last, "shared": self._shared()}
+
+
+_coordinators: dict[str, NonceCoordinator] = {}
+_coordinators_lock = threading.Lock()
+
+
+def get_nonce_coordinator(account: str, nonce_config: dict[str, Any] = None) -> NonceCoordinator:
+    """The coordinator of an API key (see clients.rate_limit.account_id), one per process"""
+    with _coordinators_lock:
+        coordinator = _coordinators.get(account)
+        if coordinator is None:
+            coordinator = _coordinators[account] = NonceCoordinator(account, nonce_config)
+        return coordinator
@@ -10,12 +10,13 @@ class OKX(Exchange):
         ccxt_config: dict[str, any] = None,
         config: dict[str, any] = None,
         exchange_config: dict[str, any] = None,
+        extra_keys: list[tuple[str, str, str]] = None,
     ):
         self.exchange_name = "okx"
         self.market_code = "OKX-SPOT"
         self.quote_currency = "USDT"
         self.divider = "/"
-        super().__init__(self.exchange_name, api_key, secret, ccxt_config, config, exchange_config)
+        super().__init__(self.exchange_name, api_key, secret, ccxt_config, config, exchange_config, extra_keys)
 
     def create_order(
         self,
@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import time
+from array import array
+from bisect import bisect_left
+from itertools import accumulate
+from typing import Any, Awaitable, Callable, Iterable, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ORDER_BOOK_STREAM_CONFIG = {
+    "depth": 100,
+    "max_age_seconds": 5,
+    "reconnect_delay_seconds": 1,
+    "max_reconnect_delay_seconds": 30,
+}
+
+BUY = "buy"
+SELL = "sell"
+
+
+class FillEstimate(NamedTuple):
+    average_price: float
+    cost: float
+    filled: float
+    complete: bool
+
+
+class BookSide:
+    """
+    Price levels of one side of the book in flat arrays, best price first, with cumulative
+    amount and cost so that walking the book for an order size is a binary search.
+    """
+
+    __slots__ = ("prices", "amounts", "cum_amounts", "cum_costs")
+
+    def __init__(self, levels: Iterable[list[float]] = ()):
+        self.prices = array("d")
+        self.amounts = array("d")
+        for level in levels:
+            self.prices.append(level[0])
+            self.amounts.append(level[1])
+        self.cum_amounts = array("d", accumulate(self.amounts))
+        self.cum_costs = array("d", accumulate(p * a for p, a in zip(self.prices, self.amounts, strict=True)))
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    def estimate_fill(self, amount: float) -> Optional[FillEstimate]:
+        """Walk the levels for the given base amount"""
+        if not self.prices or amount <= 0:
+            return None
+        index = bisect_left(self.cum_amounts, amount)
+        if index >= len(self.prices):
+            filled, cost = self.cum_amounts[-1], self.cum_costs[-1]
+            return FillEstimate(cost / filled, cost, filled, False)
+        before_amount = self.cum_amounts[index - 1] if index else 0.0
+        before_cost = self.cum_costs[index - 1] if index else 0.0
+        cost = before_cost + (amount - before_amount) * self.prices[index]
+        return FillEstimate(cost / amount, cost, amount, True)
+
+    def amount_for_cost(self, cost: float) -> Optional[float]:
+        """Inverse walk: the base amount a given quote cost buys (or sells for)"""
+        if not self.prices or cost <= 0:
+            return None
+        index = bisect_left(self.cum_costs, cost)
+        if index >= len(self.prices):
+            return self.cum_amounts[-1]
+        before_amount = self.cum_amounts[index - 1] if index else 0.0
+        before_cost = self.cum_costs[index - 1] if index else 0.0
+        return before_amount + (cost - before_cost) / self.prices[index]
+
+
+class OrderBookMirror:
+    __slots__ = ("symbol", "bids", "asks", "nonce", "received_at")
+
+    def __init__(self, symbol: str, order_book: dict[str, Any], depth: int):
+        self.symbol = symbol
+        self.bids = BookSide(order_book["bids"][:depth])
+        self.asks = BookSide(order_book["asks"][:depth])
+        self.nonce = order_book.get("nonce")
+        self.received_at = time.monotonic()
+
+    def side_for(self, order_side: str) -> BookSide:
+        """A buy order fills against the asks, a sell order against the bids"""
+        return self.asks if order_side.lower() == BUY else self.bids
+
+
+class OrderBookCache:
+    """
+    Local order books of one exchange, fed by ccxt.pro watch_order_book for the tracked symbols.
+    A book is dropped on a sequence gap (nonce going backwards) and resynced from REST.
+    """
+
+    def __init__(self, exchange_name: str, order_book_stream_config: Optional[dict[str, Any]] = None):
+        self.exchange_name = exchange_name
+        self.config = {**DEFAULT_ORDER_BOOK_STREAM_CONFIG, **(order_book_stream_config or {})}
+        self.books: dict[str, OrderBookMirror] = {}
+        self.symbols: set[str] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._watch_order_book: Optional[Callable[[str], Awaitable[dict]]] = None
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    def update(self, symbol: str, order_book: dict[str, Any]) -> bool:
+        """Mirror the book, returns False when a sequence gap has been detected"""
+        previous = self.books.get(symbol)
+        nonce = order_book.get("nonce")
+        if previous is not None and previous.nonce is not None and nonce is not None and nonce < previous.nonce:
+            logger.warning(f"Order book gap on {self.exchange_name} {symbol}: nonce {nonce} after {previous.nonce}")
+            self.books.pop(symbol, None)
+            return False
+        self.books[symbol] = OrderBookMirror(symbol, order_book, self.config["depth"])
+        return True
+
+    def get(self, symbol: str) -> Optional[OrderBookMirror]:
+        """Return the book, None if the symbol isn't mirrored or the book is stale"""
+        book = self.books.get(symbol)
+        if book is None or time.monotonic() - book.received_at > self.config["max_age_seconds"]:
+            return None
+        return book
+
+    def track(self, symbols: Iterable[str]) -> None:
+        """Mirror the books of the symbols, thread-safe"""
+        new_symbols = set(symbols) - self.symbols
+        if not new_symbols:
+            return
+        self.symbols = self.symbols | new_symbols
+        if self._loop is not None and not self._loop.is_closed():
+            for symbol in new_symbols:
+                self._loop.call_soon_threadsafe(self._start_symbol, symbol)
+
+    async def run_symbol(self, symbol: str, watch_order_book: Callable[[str], Awaitable[dict]]) -> None:
+        delay = self.config["reconnect_delay_seconds"]
+        while True:
+            try:
+                order_book = await watch_order_book(symbol)
+                if not self.update(symbol, order_book):
+                    raise Exception("sequence gap")
+                delay = self.config["reconnect_delay_seconds"]
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.books.pop(symbol, None)
+                logger.warning(f"Order book stream of {self.exchange_name} {symbol} resyncing in {delay}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.config["max_reconnect_delay_seconds"])
+
+    def _start_symbol(self, symbol: str) -> None:
+        task = self._tasks.get(symbol)
+        if task is None or task.done():
+            self._tasks[symbol] = self._loop.create_task(self.run_symbol(symbol, self._watch_order_book))
+
+    def start(self, watch_order_book: Callable[[str], Awaitable[dict]]) -> None:
+        """Start mirroring the tracked symbols on the running event loop"""
+        self._loop = asyncio.get_running_loop()
+        self._watch_order_book = watch_order_book
+        for symbol in self.symbols:
+            self._start_symbol(symbol)
+
+    async def stop(self) -> None:
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._loop = None
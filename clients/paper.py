@@ -0,0 +1,565 @@
+import asyncio
+import itertools
+import json
+import logging
+import math
+import random
+import threading
+import time
+import uuid
+import weakref
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+import ccxt
+
+from clients.custom_types import Ticker
+from clients.exchange import CAPABILITY_FLAGS, Exchange
+from clients.exchange_utils import format_pair
+from clients.order_book import OrderBookMirror
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAPER_CONFIG = {
+    # ccxt exchange whose client classes are used (never for requests)
+    "exchange": "binance",
+    "market_code": "PAP-SPOT",
+    "quote_currency": "USDT",
+    "balances": {"USDT": 1_000_000},
+    # synthetic feed: starting mid price by base currency, random walk per tick
+    "prices": {"BTC": 60_000, "ETH": 3_000, "UNI": 10, "XRP": 0.5},
+    "volatility": 0.0005,
+    "spread_bps": 2,
+    "depth": 20,
+    # quote value resting on every level of a synthetic book
+    "level_value": 50_000,
+    # recorded feed: JSON lines {"symbol", "bid", "ask"} or {"symbol", "last"} (tickers)
+    # or {"symbol", "bids", "asks"} (order books), replayed one line per tick, in a loop
+    "recording": None,
+    # JSON dump of a real exchange's load_markets(), synthetic markets if None
+    "markets_file": None,
+    "tick_ms": 100,
+    "fee_rate": 0.001,
+    # simulated round trip of every order request
+    "latency_ms": 0,
+    # market orders per second the venue places on its own, emitted as watch_orders updates
+    # (for load testing watch_orders.py, which doesn't share the app's in-memory orders)
+    "synthetic_orders_per_second": 0,
+    "seed": None,
+}
+
+
+def _iso8601(timestamp: int) -> str:
+    return datetime.fromtimestamp(timestamp / 1000, timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def _to_milliseconds(since: Optional[datetime]) -> int:
+    """Millisecond timestamp of a naive UTC datetime from the database"""
+    return int(since.replace(tzinfo=timezone.utc).timestamp() * 1000) if since else 0
+
+
+class PaperFeed:
+    """
+    Prices of a paper venue: a random walk around the configured prices, or a recording replayed in a loop.
+    Every tick replaces the books as a whole, reads from other threads never see a half updated book.
+    """
+
+    def __init__(self, symbols: list[str], paper_config: dict[str, Any]):
+        self.config = paper_config
+        self.random = random.Random(paper_config["seed"])
+        self.mids: dict[str, float] = {}
+        self.books: dict[str, dict[str, Any]] = {}
+        self.ticks = 0
+        self._rows = None
+        if paper_config["recording"]:
+            with open(paper_config["recording"], "r") as file:
+                rows = [json.loads(line) for line in file if line.strip()]
+            self._rows = itertools.cycle(rows)
+            # start from the first line of every symbol
+            for row in rows:
+                if row["symbol"] not in self.books:
+                    self._apply(row)
+        else:
+            # markets without a configured price have no feed
+            prices = paper_config["prices"]
+            for symbol in symbols:
+                base = symbol.split("/")[0]
+                if base in prices:
+                    self._set_mid(symbol, float(prices[base]))
+
+    def _set_mid(self, symbol: str, mid: float, bid: Optional[float] = None, ask: Optional[float] = None) -> None:
+        half_spread = mid * self.config["spread_bps"] / 20_000
+        bid = bid if bid is not None else mid - half_spread
+        ask = ask if ask is not None else mid + half_spread
+        step = mid * self.config["spread_bps"] / 10_000
+        level_value = self.config["level_value"]
+        self.mids[symbol] = mid
+        self.books[symbol] = {
+            "symbol": symbol,
+            "bids": [[bid - i * step, level_value / mid] for i in range(self.config["depth"])],
+            "asks": [[ask + i * step, level_value / mid] for i in range(self.config["depth"])],
+            "timestamp": int(time.time() * 1000),
+            "nonce": self.ticks,
+        }
+
+    def _apply(self, row: dict[str, Any]) -> None:
+        symbol = row["symbol"]
+        if "bids" in row and "asks" in row:
+            self.mids[symbol] = (row["bids"][0][0] + row["asks"][0][0]) / 2
+            self.books[symbol] = {
+                "symbol": symbol,
+                "bids": row["bids"],
+                "asks": row["asks"],
+                "timestamp": int(time.time() * 1000),
+                "nonce": self.ticks,
+            }
+        elif row.get("bid") is not None and row.get("ask") is not None:
+            self._set_mid(symbol, (row["bid"] + row["ask"]) / 2, row["bid"], row["ask"])
+        else:
+            self._set_mid(symbol, float(row["last"]))
+
+    def tick(self) -> None:
+        self.ticks += 1
+        if self._rows is not None:
+            self._apply(next(self._rows))
+            return
+        volatility = self.config["volatility"]
+        for symbol, mid in list(self.mids.items()):
+            self._set_mid(symbol, mid * math.exp(self.random.gauss(0, volatility)))
+
+    def order_book(self, symbol: str) -> Optional[dict[str, Any]]:
+        return self.books.get(symbol)
+
+    def ticker(self, symbol: str) -> Optional[Ticker]:
+        book = self.books.get(symbol)
+        if book is None:
+            return None
+        bid, ask = book["bids"][0][0], book["asks"][0][0]
+        average = (bid + ask) / 2
+        return {"symbol": symbol, "average": average, "bid": bid, "ask": ask, "last": average}
+
+
+class PaperExchange(Exchange):
+    """
+    Paper trading venue configured from the "paper" section of exchanges_ccxt_config.json: balances,
+    orders and trades are kept in memory and orders fill against a synthetic or recorded feed,
+    so the services can run without network (e.g. for load tests). Market orders walk the current
+    book; limit orders fill at once if they cross it, otherwise at their price once the feed crosses them.
+    State is per process: watch_orders only reports the orders placed in this process
+    (and synthetic_orders_per_second).
+    """
+
+    def __init__(self, paper_config: dict[str, Any] = None, config: dict[str, Any] = None):
+        """
+        :param paper_config: the "paper" section of exchanges_ccxt_config.json, overriding DEFAULT_PAPER_CONFIG,
+                             with an optional "ccxt_config" like the other exchanges
+        """
+        paper_config = paper_config or {}
+        self.paper_config = {**DEFAULT_PAPER_CONFIG, **{k: v for k, v in paper_config.items() if k != "ccxt_config"}}
+        self.exchange_name = "paper"
+        self.market_code = self.paper_config["market_code"]
+        self.quote_currency = self.paper_config["quote_currency"]
+        self.divider = "/"
+        # the ccxt clients only provide market metadata and precision helpers
+        super().__init__(self.paper_config["exchange"], "paper", "paper", paper_config.get("ccxt_config"), config)
+        self._set_markets()
+        self.feed = PaperFeed(list(self._api.markets), self.paper_config)
+        self.balances: dict[str, dict[str, float]] = {
+            currency: {"free": float(amount), "used": 0.0} for currency, amount in self.paper_config["balances"].items()
+        }
+        self.orders: dict[str, dict[str, Any]] = {}
+        self.trades: list[dict[str, Any]] = []
+        self._lock = threading.RLock()
+        self._order_queues: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Queue] = weakref.WeakKeyDictionary()
+        self._synthetic_due = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def _set_markets(self) -> None:
+        markets_file = self.paper_config["markets_file"]
+        if markets_file:
+            with open(markets_file, "r") as file:
+                markets = list(json.load(file).values())
+        else:
+            quote = self.quote_currency
+            markets = [
+                {
+                    "id": f"{base}{quote}",
+                    "symbol": format_pair(base, quote, self.divider),
+                    "base": base,
+                    "quote": quote,
+                    "baseId": base,
+                    "quoteId": quote,
+                    "type": "spot",
+                    "spot": True,
+                    "active": True,
+                    "precision": {"amount": 1e-8, "price": 1e-8},
+                    "limits": {
+                        "amount": {"min": 1e-8, "max": None},
+                        "price": {"min": 1e-8, "max": 1e12},
+                        "cost": {"min": None, "max": None},
+                    },
+                }
+                for base in self.paper_config["prices"]
+            ]
+        self._api.set_markets(markets)
+        self._ws_async.set_markets(self._api.markets, self._api.currencies)
+
+    def load_markets(self) -> None:
+        """The markets are set up when the venue is created"""
+
+    def warm_up(self) -> dict[str, Any]:
+        self.capabilities = {flag: flag in ("fetchClosedOrders", "fetchMyTrades", "watchOrders") for flag in CAPABILITY_FLAGS}
+        return {"markets_ms": 0.0, "time_ms": 0.0}
+
+    # --- matching ---
+
+    def _balance(self, currency: str) -> dict[str, float]:
+        return self.balances.setdefault(currency, {"free": 0.0, "used": 0.0})
+
+    def _new_order(self, pair: str, type: str, side: str, amount: float, price: Optional[float], params: dict) -> dict:
+        timestamp = int(time.time() * 1000)
+        return {
+            "id": uuid.uuid4().hex,
+            "clientOrderId": params.get("clientOrderId"),
+            "timestamp": timestamp,
+            "datetime": _iso8601(timestamp),
+            "lastTradeTimestamp": None,
+            "symbol": pair,
+            "type": type,
+            "side": side,
+            "price": price,
+            "amount": amount,
+            "filled": 0.0,
+            "remaining": amount,
+            "cost": 0.0,
+            "average": None,
+            "status": "open",
+            "fee": {"currency": self.quote_currency, "cost": 0.0},
+            "trades": [],
+            "info": {},
+        }
+
+    def _fill(self, order: dict, amount: float, price: float, settle: bool = True) -> None:
+        """Fill part of an order at one price and settle the balances, with the lock held"""
+        timestamp = int(time.time() * 1000)
+        cost = amount * price
+        fee = cost * self.paper_config["fee_rate"]
+        base, quote = order["symbol"].split(self.divider)
+        trade = {
+            "id": uuid.uuid4().hex,
+            "order": order["id"],
+            "timestamp": timestamp,
+            "datetime": _iso8601(timestamp),
+            "symbol": order["symbol"],
+            "type": order["type"],
+            "side": order["side"],
+            "takerOrMaker": "taker" if order["type"] == "market" else "maker",
+            "price": price,
+            "amount": amount,
+            "cost": cost,
+            "fee": {"currency": quote, "cost": fee},
+            "info": {},
+        }
+        order["filled"] += amount
+        order["remaining"] = max(order["amount"] - order["filled"], 0.0)
+        order["cost"] += cost
+        order["average"] = order["cost"] / order["filled"]
+        order["fee"]["cost"] += fee
+        order["lastTradeTimestamp"] = timestamp
+        order["trades"].append(trade)
+        if order["remaining"] <= 1e-12:
+            order["remaining"] = 0.0
+            order["status"] = "closed"
+        if not settle:
+            return
+        self.trades.append(trade)
+        # resting orders have their funds reserved at the limit price
+        resting = order["type"] == "limit" and order["id"] in self.orders
+        if order["side"] == "buy":
+            spent = self._balance(quote)
+            if resting:
+                spent["used"] -= amount * order["price"]
+                spent["free"] += amount * order["price"] - cost
+            else:
+                spent["free"] -= cost
+            spent["free"] -= fee
+            self._balance(base)["free"] += amount
+        else:
+            spent = self._balance(base)
+            if resting:
+                spent["used"] -= amount
+            else:
+                spent["free"] -= amount
+            self._balance(quote)["free"] += cost - fee
+
+    def _fill_from_book(self, order: dict, limit: Optional[float] = None, settle: bool = True) -> None:
+        """Walk the book against the order, up to the limit price if given"""
+        book = self.feed.order_book(order["symbol"])
+        levels = (book["asks"] if order["side"] == "buy" else book["bids"]) if book else []
+        for price, size in levels:
+            if order["remaining"] <= 0:
+                break
+            if limit is not None and (price > limit if order["side"] == "buy" else price < limit):
+                break
+            self._fill(order, min(size, order["remaining"]), price, settle)
+
+    def _check_funds(self, pair: str, side: str, amount: float, price: Optional[float]) -> None:
+        base, quote = pair.split(self.divider)
+        if side == "buy":
+            if price is None:
+                estimate = self.estimate_fill(pair, side, amount)
+                cost = estimate.cost if estimate is not None else 0.0
+            else:
+                cost = amount * price
+            needed, currency = cost * (1 + self.paper_config["fee_rate"]), quote
+        else:
+            needed, currency = amount, base
+        free = self._balance(currency)["free"]
+        if free < needed:
+            raise ccxt.InsufficientFunds(f"paper {currency} balance {free} is below {needed}")
+
+    def _execute(self, pair: str, type: str, side: str, amount: float, price: Optional[float], params: dict) -> dict:
+        if pair not in self._api.markets:
+            raise ccxt.BadSymbol(f"paper does not have market symbol {pair}")
+        if type not in ("market", "limit") or (type == "limit" and not price):
+            raise ccxt.InvalidOrder(f"paper does not support {type} orders without a price")
+        amount = float(amount)
+        price = float(price) if price is not None else None
+        with self._lock:
+            self._check_funds(pair, side, amount, price)
+            order = self._new_order(pair, type, side, amount, price, params)
+            self._fill_from_book(order, price)
+            if order["status"] == "open" and type == "market":
+                # the book was too thin, the rest isn't filled
+                order["status"] = "canceled" if order["filled"] else "rejected"
+            if order["status"] == "open":
+                base, quote = pair.split(self.divider)
+                reserved, currency = (order["remaining"] * price, quote) if side == "buy" else (order["remaining"], base)
+                balance = self._balance(currency)
+                balance["free"] -= reserved
+                balance["used"] += reserved
+            self.orders[order["id"]] = order
+            snapshot = self._snapshot(order)
+        self._emit(snapshot)
+        return snapshot
+
+    def _match_resting(self) -> None:
+        """Fill the resting limit orders the feed has crossed, at their limit price"""
+        updates = []
+        with self._lock:
+            for order in self.orders.values():
+                if order["status"] != "open":
+                    continue
+                ticker = self.feed.ticker(order["symbol"])
+                if ticker is None:
+                    continue
+                if order["side"] == "buy" and ticker["ask"] <= order["price"]:
+                    self._fill(order, order["remaining"], order["price"])
+                elif order["side"] == "sell" and ticker["bid"] >= order["price"]:
+                    self._fill(order, order["remaining"], order["price"])
+                else:
+                    continue
+                updates.append(self._snapshot(order))
+        for order in updates:
+            self._emit(order)
+
+    def _synthetic_orders(self, seconds: float) -> None:
+        """Emit the market orders of other traders, without touching the balances"""
+        self._synthetic_due += self.paper_config["synthetic_orders_per_second"] * seconds
+        symbols = list(self.feed.books)
+        while self._synthetic_due >= 1 and symbols:
+            self._synthetic_due -= 1
+            pair = self.feed.random.choice(symbols)
+            order = self._new_order(pair, "market", self.feed.random.choice(("buy", "sell")), 1e-3, None, {})
+            self._fill_from_book(order, settle=False)
+            self._emit(self._snapshot(order))
+
+    @staticmethod
+    def _snapshot(order: dict) -> dict:
+        return {**order, "fee": dict(order["fee"]), "trades": list(order["trades"])}
+
+    # --- watch_orders ---
+
+    def _emit(self, order: dict) -> None:
+        """Hand an order update to the watch_orders calls of every event loop, thread-safe"""
+        for loop, queue in list(self._order_queues.items()):
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(queue.put_nowait, order)
+
+    async def watch_orders(self, symbol: str = None, since: datetime = None, limit: int = None, params=None) -> list:
+        self.start_feed()
+        loop = asyncio.get_running_loop()
+        queue = self._order_queues.get(loop)
+        if queue is None:
+            queue = self._order_queues[loop] = asyncio.Queue()
+        while True:
+            orders = [await queue.get()]
+            while not queue.empty() and (limit is None or len(orders) < limit):
+                orders.append(queue.get_nowait())
+            orders = [order for order in orders if symbol is None or order["symbol"] == symbol]
+            if orders:
+                return orders
+
+    # --- feed ---
+
+    def tick(self, seconds: float = 0.0) -> None:
+        """Advance the feed one step and fill whatever it crossed"""
+        self.feed.tick()
+        self._match_resting()
+        self._synthetic_orders(seconds)
+
+    async def run(self) -> None:
+        """Tick every tick_ms until cancelled"""
+        seconds = self.paper_config["tick_ms"] / 1000
+        while True:
+            await asyncio.sleep(seconds)
+            try:
+                self.tick(seconds)
+            except Exception as e:
+                logger.error(f"Paper feed tick failed: {e}")
+
+    def start_feed(self) -> Optional[asyncio.Task]:
+        """Start ticking on the running event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+        return self._task
+
+    async def start_balance_stream(self) -> None:
+        self.start_feed()
+
+    async def start_ticker_stream(self) -> None:
+        self.start_feed()
+
+    async def start_order_book_stream(self) -> None:
+        self.start_feed()
+
+    async def start_endpoint_probe(self) -> None:
+        """There are no endpoints to probe"""
+
+    async def start_clock_sync(self) -> None:
+        """The venue runs on the local clock"""
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await super().close()
+
+    # --- Exchange interface ---
+
+    def create_order(self, symbol: str, type: str, side: str, amount: float, price=None, params=None):
+        pair = format_pair(symbol, self.quote_currency, self.divider)
+        price = price if type == "limit" else None
+        if self.paper_config["latency_ms"]:
+            time.sleep(self.paper_config["latency_ms"] / 1000)
+        start = time.monotonic()
+        try:
+            order = self._execute(pair, type, side, amount, price, params or {})
+        except ccxt.BaseError as e:
+            logger.error(f"Failed to create order on paper: {e}")
+            return None
+        self.order_latency["rest"].add((time.monotonic() - start) * 1000)
+        self._log_exchange_response("create_order", order)
+        return order
+
+    def cancel_order(self, id: str, pair: str = None, params: Optional[dict] = None) -> Optional[dict]:
+        with self._lock:
+            order = self.orders.get(id)
+            if order is None or order["status"] != "open":
+                logger.error(f"Failed to cancel order on paper: {id} is not open")
+                return None
+            base, quote = order["symbol"].split(self.divider)
+            released, currency = (
+                (order["remaining"] * order["price"], quote) if order["side"] == "buy" else (order["remaining"], base)
+            )
+            balance = self._balance(currency)
+            balance["used"] -= released
+            balance["free"] += released
+            order["status"] = "canceled"
+            snapshot = self._snapshot(order)
+        self._emit(snapshot)
+        return snapshot
+
+    def fetch_balance(self, params: Optional[dict] = None):
+        with self._lock:
+            balance = {
+                currency: {**amounts, "total": amounts["free"] + amounts["used"]}
+                for currency, amounts in self.balances.items()
+            }
+        by_currency = dict(balance)
+        for key in ("free", "used", "total"):
+            balance[key] = {currency: amounts[key] for currency, amounts in by_currency.items()}
+        return balance
+
+    def fetch_free_balance(self, params: Optional[dict] = None):
+        with self._lock:
+            return {currency: amounts["free"] for currency, amounts in self.balances.items()}
+
+    def get_free_balance(self) -> Optional[dict]:
+        return self.fetch_free_balance()
+
+    def reserve_balance(self, currency: str, amount: float) -> None:
+        """The in-memory balance is always current"""
+
+    def fetch_order(self, id: str, pair: str, params: Optional[dict] = None):
+        with self._lock:
+            order = self.orders.get(id)
+            if order is None:
+                logger.error(f"Failed to fetch order from paper: order {id} not found")
+                return None
+            return self._snapshot(order)
+
+    def _orders(self, pair: Optional[str], open: bool, since: int = 0) -> list:
+        with self._lock:
+            return [
+                self._snapshot(order)
+                for order in self.orders.values()
+                if (order["status"] == "open") == open
+                and (pair is None or order["symbol"] == pair)
+                and order["timestamp"] >= since
+            ]
+
+    def fetch_open_orders(self, pair: Optional[str] = None, params: Optional[dict] = None) -> Optional[list]:
+        return self._orders(pair, True)
+
+    def fetch_closed_orders(self, pair: str, since: datetime, params: Optional[dict] = None) -> Optional[list]:
+        return self._orders(pair, False, _to_milliseconds(since))
+
+    def fetch_my_trades(self, pair: str, since: datetime, params: Optional[dict] = None) -> Optional[list]:
+        since = _to_milliseconds(since)
+        with self._lock:
+            return [trade for trade in self.trades if trade["symbol"] == pair and trade["timestamp"] >= since]
+
+    def fetch_my_trades_page(self, pair: str, since_ms: int, limit: int, params: Optional[dict] = None) -> list:
+        until = (params or {}).get("until")
+        with self._lock:
+            trades = [
+                trade
+                for trade in self.trades
+                if trade["symbol"] == pair and trade["timestamp"] >= since_ms and (until is None or trade["timestamp"] < until)
+            ]
+        return trades[:limit]
+
+    def get_trades_for_order(self, order_id: str, pair: str, since: datetime, params: Optional[dict] = None) -> list:
+        with self._lock:
+            order = self.orders.get(order_id)
+            return list(order["trades"]) if order is not None else []
+
+    def fetch_ticker(self, pair: str) -> Ticker:
+        return self.feed.ticker(pair)
+
+    def get_ticker(self, pair: str) -> Ticker:
+        return self.feed.ticker(pair)
+
+    def fetch_order_book(self, pair: str, limit: Optional[int] = None):
+        book = self.feed.order_book(pair)
+        if book is None:
+            return None
+        return {**book, "bids": book["bids"][:limit], "asks": book["asks"][:limit]}
+
+    def _get_order_book(self, pair: str) -> Optional[OrderBookMirror]:
+        book = self.feed.order_book(pair)
+        if book is None:
+            return None
+        return OrderBookMirror(pair, book, self.order_books.config["depth"])
@@ -0,0 +1,512 @@
+import abc
+import asyncio
+import hashlib
+import inspect
+import logging
+import threading
+import time
+from typing import Any, Optional
+
+import ccxt
+import psycopg
+
+from async_runtime import in_event_loop_thread
+from database.models import RateLimitUsage
+from database.pool import connection
+
+logger = logging.getLogger(__name__)
+
+# Budgets per exchange on top of the overall request budget, can be overridden with
+# "budgets": {"<exchange>": [...]} in the "rate_limit" config.
+# "path" / "method" restrict a budget to matching REST endpoints, their limit counts requests.
+# "header" names the response header in which the exchange reports its own count of the budget (see AdaptiveThrottle).
+# "scope" is "account" (the default, every API key of an account counts against it) or "ip" (shared by all keys).
+DEFAULT_EXTRA_BUDGETS = {
+    "binance": [
+        {
+            "name": "orders",
+            "limit": 100,
+            "window_seconds": 10,
+            "method": "POST",
+            "path": "order",
+            "header": "x-mbx-order-count-10s",
+        }
+    ],
+    "bybit": [{"name": "orders", "limit": 10, "window_seconds": 1, "method": "POST", "path": "v5/order/create"}],
+}
+
+ACCOUNT_SCOPE = "account"
+IP_SCOPE = "ip"
+# Scope of the overall request budget, can be overridden with "request_scope": {"<exchange>": "account" | "ip"}.
+# Binance counts request weight per IP: all keys of the exchange share one budget.
+DEFAULT_REQUEST_SCOPES = {"binance": IP_SCOPE}
+
+# Request weight the exchange reports on every response: header -> (limit, window seconds) of the server-side counter,
+# which has the scope of the request budget. Limits can be overridden with "usage_limits": {"<header>": <limit>} in the
+# "adaptive" config.
+USED_WEIGHT_HEADERS = {
+    "binance": {"x-mbx-used-weight-1m": (6000, 60)},
+}
+# Headers reporting the remaining requests, their limit and the window reset instead (bybit v5, generic)
+REMAINING_HEADERS = [
+    ("x-bapi-limit-status", "x-bapi-limit", "x-bapi-limit-reset-timestamp"),
+    ("x-ratelimit-remaining", "x-ratelimit-limit", "x-ratelimit-reset"),
+]
+
+DEFAULT_ADAPTIVE_CONFIG = {
+    "enabled": True,
+    # speed up below, slow down above this fraction of the server-side limit
+    "low_watermark": 0.5,
+    "high_watermark": 0.8,
+    # stop sending until the window resets above this fraction
+    "critical_watermark": 0.95,
+    # bounds of the multiplier applied to ccxt's rateLimit interval: below 1 requests go out faster than ccxt's
+    # fixed rate while the exchange reports headroom
+    "min_factor": 0.5,
+    "max_factor": 4.0,
+}
+
+
+class RateLimitBackend(abc.ABC):
+    """Storage of the used weight per bucket and window, shared by every process using it"""
+
+    @abc.abstractmethod
+    def try_consume(self, bucket: str, window_start: int, weight: float, limit: float) -> bool:
+        """Add weight to the bucket's usage of the window unless that would exceed the limit, True if added"""
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """In-process backend, e.g. for a single process or tests"""
+
+    def __init__(self):
+        self._used: dict[tuple[str, int], float] = {}
+        self._lock = threading.Lock()
+
+    def try_consume(self, bucket: str, window_start: int, weight: float, limit: float) -> bool:
+        with self._lock:
+            key = (bucket, window_start)
+            used = self._used.get(key, 0.0)
+            if used + weight > limit:
+                return False
+            self._used[key] = used + weight
+            for stale_key in [k for k in self._used if k[1] < window_start - 3600]:
+                del self._used[stale_key]
+            return True
+
+
+class PostgresRateLimitBackend(RateLimitBackend):
+    """
+    Counter table in the application database (database/migrations), shared by the web and watcher containers.
+    While the database can't be reached the budgets are counted in this process only for retry_seconds,
+    so that exchange calls keep working at the cost of not being coordinated with other processes.
+    """
+
+    def __init__(self, conn_info: str, timeout_seconds: float = 2.0, retry_seconds: float = 30.0):
+        self.conn_info = conn_info
+        self.timeout_seconds = timeout_seconds
+        self.retry_seconds = retry_seconds
+        self.fallback = MemoryRateLimitBackend()
+        self._last_cleanup = 0.0
+        self._unavailable_until = 0.0
+
+    def try_consume(self, bucket: str, window_start: int, weight: float, limit: float) -> bool:
+        if time.monotonic() < self._unavailable_until:
+            return self.fallback.try_consume(bucket, window_start, weight, limit)
+        try:
+            with connection(self.conn_info, timeout=self.timeout_seconds) as conn:
+                with conn.cursor() as cur:
+                    if time.time() - self._last_cleanup > 3600:
+                        RateLimitUsage.delete_windows_before(cur, window_start - 3600)
+                        self._last_cleanup = time.time()
+                    return RateLimitUsage.try_consume(cur, bucket, window_start, weight, limit)
+        except (psycopg.Error, OSError) as e:
+            self._unavailable_until = time.monotonic() + self.retry_seconds
+            logger.warning(f"Rate limit database unavailable, counting budgets in this process for {self.retry_seconds}s: {e}")
+            return self.fallback.try_consume(bucket, window_start, weight, limit)
+
+
+class SharedRateLimiter:
+    """
+    Fixed-window weight budget of one bucket (exchange, account and budget name) across processes.
+    Weight is leased from the backend in chunks of lease_fraction * limit, so most calls
+    are granted locally without a round trip to the backend.
+    """
+
+    def __init__(
+        self,
+        backend: RateLimitBackend,
+        bucket: str,
+        limit: float,
+        window_seconds: float,
+        lease_fraction: float = 0.02,
+    ):
+        self.backend = backend
+        self.bucket = bucket
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.lease_weight = limit * lease_fraction
+        self._lease_window: Optional[int] = None
+        self._lease_left = 0.0
+        self._lock = threading.Lock()
+        self.waited_seconds = 0.0
+
+    def _window_start(self, now: float) -> int:
+        return int(now // self.window_seconds * self.window_seconds)
+
+    def acquire(self, weight: float = 1.0, blocking: bool = True) -> None:
+        """
+        Block until the weight fits into the shared budget of the current window. Without blocking
+        the budget is only tried once and RateLimitPaused is raised if it is exhausted.
+        """
+        weight = min(weight, self.limit)
+        while True:
+            now = time.time()
+            window_start = self._window_start(now)
+            with self._lock:
+                if self._lease_window != window_start:
+                    self._lease_window = window_start
+                    self._lease_left = 0.0
+                if self._lease_left >= weight:
+                    self._lease_left -= weight
+                    return
+            # the round trip runs without the lock: callers covered by the local lease don't wait for it
+            for amount in dict.fromkeys((max(weight, self.lease_weight), weight)):
+                if self.backend.try_consume(self.bucket, window_start, amount, self.limit):
+                    with self._lock:
+                        if self._lease_window == window_start:
+                            self._lease_left += amount - weight
+                    return
+
+            delay = window_start + self.window_seconds - now
+            if not blocking:
+                raise RateLimitPaused(f"Rate limit budget of {self.bucket} exhausted for {delay:.2f}s")
+            logger.info(f"Rate limit budget of {self.bucket} exhausted, waiting {delay:.2f}s")
+            self.waited_seconds += delay
+            time.sleep(delay)
+
+
+class RateLimitPaused(ccxt.ExchangeError):
+    """A sync request made on an event loop thread that would have to wait, the loop must not sleep"""
+
+
+class AdaptiveThrottle:
+    """
+    Paces the requests of an exchange's clients in place of ccxt's throttle, from the usage the exchange
+    reports on every response: requests are spaced rateLimit * factor apart, the factor drops below 1
+    while usage is low and grows as usage approaches the limit. Close to the limit (or after a Retry-After)
+    requests wait for the server-side window to reset.
+    """
+
+    def __init__(
+        self,
+        exchange_name: str,
+        rate_limit: float,
+        adaptive_config: Optional[dict[str, Any]] = None,
+        usage_headers: Optional[dict[str, tuple[float, float]]] = None,
+        remaining_headers: bool = True,
+    ):
+        """
+        :param usage_headers: header -> (limit, window seconds) of the counters to follow,
+                              the exchange's USED_WEIGHT_HEADERS by default
+        :param remaining_headers: whether to follow the REMAINING_HEADERS
+        """
+        self.exchange_name = exchange_name
+        self.config = {**DEFAULT_ADAPTIVE_CONFIG, **(adaptive_config or {})}
+        self.min_factor = self.config["min_factor"]
+        self.base_rate_limit = rate_limit
+        self.factor = 1.0
+        self.usage: dict[str, float] = {}
+        self.paused_until = 0.0
+        if usage_headers is None:
+            usage_headers = USED_WEIGHT_HEADERS.get(exchange_name, {})
+        self.usage_headers = {
+            header: (self.config.get("usage_limits", {}).get(header, limit), window)
+            for header, (limit, window) in usage_headers.items()
+        }
+        self.remaining_headers = REMAINING_HEADERS if remaining_headers else []
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def parse_usage(self, headers: dict[str, str]) -> list[tuple[str, float, float]]:
+        """(header, used fraction of the limit, seconds until the window resets) per reported counter"""
+        usage = []
+        now = time.time()
+        for header, (limit, window) in self.usage_headers.items():
+            if header in headers:
+                usage.append((header, float(headers[header]) / limit, window - now % window))
+        for remaining_header, limit_header, reset_header in self.remaining_headers:
+            if remaining_header in headers and limit_header in headers:
+                limit = float(headers[limit_header])
+                reset = float(headers.get(reset_header) or 0)
+                # reset is either an epoch timestamp (ms or s) or a number of seconds
+                if reset > 1e12:
+                    reset = reset / 1000 - now
+                elif reset > 1e9:
+                    reset -= now
+                if limit > 0:
+                    usage.append((remaining_header, 1 - float(headers[remaining_header]) / limit, max(reset, 0)))
+        return usage
+
+    def observe(self, headers: Optional[dict[str, str]]) -> None:
+        """Adjust the pace from the headers of a response"""
+        if not headers or not self.config["enabled"]:
+            return
+        headers = {key.lower(): value for key, value in headers.items()}
+        try:
+            usage = self.parse_usage(headers)
+            retry_after = float(headers.get("retry-after") or 0)
+        except ValueError:
+            return
+        if not usage and not retry_after:
+            return
+        with self._lock:
+            for header, used, _ in usage:
+                self.usage[header] = round(used, 4)
+            ratio, reset = max(((used, reset) for _, used, reset in usage), default=(0.0, 0.0))
+            if ratio >= self.config["high_watermark"] or retry_after:
+                self.factor = min(self.factor * 1.5, self.config["max_factor"])
+            elif ratio <= self.config["low_watermark"]:
+                self.factor = max(self.factor * 0.9, self.min_factor)
+            pause = retry_after or (reset if ratio >= self.config["critical_watermark"] else 0)
+            if pause:
+                self.paused_until = max(self.paused_until, time.monotonic() + pause)
+                logger.warning(f"{self.exchange_name} at {ratio:.0%} of its rate limit, pausing for {pause:.1f}s")
+
+    def reserve(self, cost: float = 1.0) -> float:
+        """Take the next request slot, returns the seconds to wait for it"""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self.paused_until, self._next_slot)
+            self._next_slot = start + self.base_rate_limit * self.factor * cost / 1000
+            return start - now
+
+    def pause_seconds(self) -> float:
+        return max(self.paused_until - time.monotonic(), 0.0)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "rate_limit_ms": round(self.base_rate_limit * self.factor, 3),
+            "factor": round(self.factor, 3),
+            "usage": dict(self.usage),
+            "paused_seconds": round(self.pause_seconds(), 3),
+        }
+
+
+class ExchangeRateLimiter:
+    """
+    All shared budgets of one exchange API key, applied before every REST request. Budgets of the "ip" scope
+    belong to the limiter of the exchange's main key, the limiters of further keys wait on them as well.
+    """
+
+    def __init__(
+        self,
+        exchange_name: str,
+        account: str,
+        api,
+        rate_limit_config: Optional[dict[str, Any]] = None,
+        ip_limiter: Optional["ExchangeRateLimiter"] = None,
+    ):
+        """:param ip_limiter: limiter holding the "ip" scoped budgets, this one by default"""
+        self.exchange_name = exchange_name
+        self.account = account
+        self.config = rate_limit_config or {}
+        self.ip_limiter = ip_limiter or self
+        window_seconds = self.config.get("window_seconds", 60)
+        safety = self.config.get("safety_factor", 0.9)
+        # ccxt costs are in units of one rateLimit interval
+        request_limit = self.config.get("limit") or window_seconds * 1000 / api.rateLimit * safety
+        request_scope = self.config.get("request_scope", {}).get(
+            exchange_name, DEFAULT_REQUEST_SCOPES.get(exchange_name, ACCOUNT_SCOPE)
+        )
+        budgets = [
+            {"name": "requests", "limit": request_limit, "window_seconds": window_seconds, "scope": request_scope},
+            *self.config.get("budgets", {}).get(exchange_name, DEFAULT_EXTRA_BUDGETS.get(exchange_name, [])),
+        ]
+        usage_headers: dict[str, dict[str, tuple[float, float]]] = {ACCOUNT_SCOPE: {}, IP_SCOPE: {}}
+        usage_headers[request_scope].update(USED_WEIGHT_HEADERS.get(exchange_name, {}))
+        for budget in budgets:
+            if "header" in budget:
+                usage_headers[budget.get("scope", ACCOUNT_SCOPE)][budget["header"]] = (
+                    budget["limit"],
+                    budget["window_seconds"],
+                )
+        self.budgets: list[dict[str, Any]] = [
+            budget for budget in budgets if self.ip_limiter is self or budget.get("scope", ACCOUNT_SCOPE) != IP_SCOPE
+        ]
+        self.limiters: list[SharedRateLimiter] = []
+        self._backend: Optional[RateLimitBackend] = None
+        self._lock = threading.Lock()
+        adaptive_config = self.config.get("adaptive")
+        self.throttle = AdaptiveThrottle(exchange_name, api.rateLimit, adaptive_config, usage_headers[ACCOUNT_SCOPE])
+        if self.ip_limiter is self:
+            self.ip_throttle = AdaptiveThrottle(
+                exchange_name, api.rateLimit, adaptive_config, usage_headers[IP_SCOPE], remaining_headers=False
+            )
+        else:
+            self.ip_throttle = self.ip_limiter.ip_throttle
+        # the throttle of the request budget's scope paces at ccxt's rate, see reserve
+        self.pacer = self.ip_throttle if request_scope == IP_SCOPE else self.throttle
+
+    def _get_limiters(self, backend: RateLimitBackend) -> list[SharedRateLimiter]:
+        with self._lock:
+            if backend is not self._backend:
+                self.limiters = [
+                    SharedRateLimiter(
+                        backend,
+                        f"{self.exchange_name}:{IP_SCOPE if budget.get('scope') == IP_SCOPE else self.account}:{budget['name']}",
+                        budget["limit"],
+                        budget["window_seconds"],
+                        self.config.get("lease_fraction", 0.02),
+                    )
+                    for budget in self.budgets
+                ]
+                self._backend = backend
+            return self.limiters
+
+    def acquire(
+        self,
+        backend: RateLimitBackend,
+        path: str,
+        method: str,
+        cost: float,
+        scope: Optional[str] = None,
+        blocking: bool = True,
+    ) -> None:
+        """
+        Wait on the budgets of the request, only those of the given scope if one is given.
+        Without blocking RateLimitPaused is raised instead of waiting (see SharedRateLimiter.acquire).
+        """
+        if self.ip_limiter is not self:
+            self.ip_limiter.acquire(backend, path, method, cost, IP_SCOPE, blocking)
+        for budget, limiter in zip(self.budgets, self._get_limiters(backend), strict=True):
+            if scope is not None and budget.get("scope", ACCOUNT_SCOPE) != scope:
+                continue
+            if budget.get("path", path) != path or budget.get("method", method) != method:
+                continue
+            limiter.acquire(cost if budget["name"] == "requests" else 1, blocking)
+
+    def observe(self, headers: Optional[dict[str, str]]) -> None:
+        self.throttle.observe(headers)
+        self.ip_throttle.observe(headers)
+
+    def reserve(self, cost: float) -> float:
+        """
+        Seconds to wait for the request's slot: the pacer spaces requests at ccxt's rate times its factor,
+        the other throttle only adds to that once the exchange reports usage for it (or a Retry-After)
+        """
+        delay = self.pacer.reserve(cost)
+        for throttle in (self.throttle, self.ip_throttle):
+            if throttle is not self.pacer and (throttle.usage or throttle.pause_seconds()):
+                delay = max(delay, throttle.reserve(cost))
+        return delay
+
+    def pause_seconds(self) -> float:
+        return max(self.throttle.pause_seconds(), self.ip_throttle.pause_seconds())
+
+    def stats(self) -> list[dict[str, Any]]:
+        return [
+            {
+                "bucket": limiter.bucket,
+                "limit": limiter.limit,
+                "window_seconds": limiter.window_seconds,
+                "waited_seconds": round(limiter.waited_seconds, 3),
+            }
+            for limiter in self.limiters
+        ]
+
+
+_backend: Optional[RateLimitBackend] = None
+
+
+def configure_rate_limit_backend(conn_info: str, rate_limit_config: Optional[dict[str, Any]] = None) -> None:
+    """
+    Select the backend shared by all exchange clients of this process from the "rate_limit"
+    section of the config: "postgres" (shared across processes), "memory" or none.
+    """
+    global _backend
+    backend_name = (rate_limit_config or {}).get("backend")
+    if backend_name == "postgres":
+        _backend = PostgresRateLimitBackend(conn_info)
+    elif backend_name == "memory":
+        _backend = MemoryRateLimitBackend()
+    else:
+        _backend = None
+    logger.info(f"Shared rate limit backend: {backend_name}")
+
+
+def get_rate_limit_backend() -> Optional[RateLimitBackend]:
+    return _backend
+
+
+def account_id(api_key: Optional[str]) -> str:
+    """Identify an account in bucket names without storing its api key"""
+    if not api_key:
+        return "public"
+    return hashlib.sha256(api_key.encode()).hexdigest()[:12]
+
+
+def install_rate_limiter(api, limiter: ExchangeRateLimiter) -> None:
+    """
+    Make a (sync or async) ccxt client wait on the shared budgets before every REST request
+    and pace it from the usage reported in every response (see AdaptiveThrottle), which replaces
+    ccxt's own REST throttle. The budgets are only used with a configured backend.
+    """
+    fetch2 = api.fetch2
+    on_rest_response = api.on_rest_response
+
+    def cost_of(path, api_type, method, params, config) -> float:
+        return api.calculate_rate_limiter_cost(api_type, method, path, params, config)
+
+    def observe_response(code, reason, url, method, headers, body, request_headers, request_body):
+        # called by ccxt with the headers of this response, last_response_headers is shared by concurrent calls
+        limiter.observe(headers)
+        return on_rest_response(code, reason, url, method, headers, body, request_headers, request_body)
+
+    api.on_rest_response = observe_response
+
+    if inspect.iscoroutinefunction(fetch2):
+
+        async def no_throttle(cost=None):
+            return None
+
+        # enableRateLimit stays on for async clients, it also paces their websocket messages
+        api.throttle = no_throttle
+
+        async def async_fetch2(path, api_type="public", method="GET", params=None, headers=None, body=None, config=None):
+            params = {} if params is None else params
+            config = {} if config is None else config
+            cost = cost_of(path, api_type, method, params, config)
+            backend = get_rate_limit_backend()
+            if backend is not None:
+                # waiting on the budget (or the database) must not block the event loop
+                await asyncio.to_thread(limiter.acquire, backend, path, method, cost)
+            delay = limiter.reserve(cost)
+            if delay:
+                await asyncio.sleep(delay)
+            return await fetch2(path, api_type, method, params, headers, body, config)
+
+        api.fetch2 = async_fetch2
+    else:
+        api.enableRateLimit = False
+
+        def sync_fetch2(path, api_type="public", method="GET", params=None, headers=None, body=None, config=None):
+            params = {} if params is None else params
+            config = {} if config is None else config
+            cost = cost_of(path, api_type, method, params, config)
+            on_event_loop = in_event_loop_thread()
+            backend = get_rate_limit_backend()
+            if backend is not None:
+                # on an event loop thread the budgets are tried once, an exhausted one raises instead of sleeping
+                limiter.acquire(backend, path, method, cost, blocking=not on_event_loop)
+            pause = limiter.pause_seconds()
+            if on_event_loop and pause:
+                raise RateLimitPaused(
+                    f"{limiter.exchange_name} is rate limited for {pause:.2f}s, not sleeping on the event loop"
+                )
+            # the gap to the previous request is slept even on an event loop thread, as ccxt's throttle did
+            delay = limiter.reserve(cost)
+            if delay:
+                time.sleep(delay)
+            return fetch2(path, api_type, method, params, headers, body, config)
+
+        api.fetch2 = sync_fetch2
@@ -0,0 +1,92 @@
+import concurrent.futures
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, TypeVar
+
+from async_runtime import in_event_loop_thread
+
+T = TypeVar("T")
+
+DEFAULT_REQUEST_CACHE_CONFIG = {
+    "max_entries": 1024,
+    # per method, e.g. {"fetch_ticker": 250}; 0 (the default) only coalesces concurrent calls
+    "ttl_ms": {},
+}
+
+
+class RequestCoalescer:
+    """
+    Single-flight for idempotent reads of one exchange: concurrent calls with the same method and
+    arguments share one request instead of each spending rate limit weight on it.
+    Results of methods with a ttl_ms are also kept in a bounded LRU for that long.
+    Callers share the returned object and must not modify it.
+    Only worker threads wait for another caller's request: a caller on an event loop thread sends its own
+    (or serves the cache) instead of blocking the loop on a request it doesn't control.
+    """
+
+    def __init__(self, exchange_name: str, request_cache_config: Optional[dict[str, Any]] = None):
+        self.exchange_name = exchange_name
+        self.config = {**DEFAULT_REQUEST_CACHE_CONFIG, **(request_cache_config or {})}
+        self._in_flight: dict[Hashable, concurrent.futures.Future] = {}
+        self._cache: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._counters: dict[str, dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def _count(self, method: str, counter: str) -> None:
+        counters = self._counters.setdefault(method, {"hits": 0, "misses": 0, "coalesced": 0})
+        counters[counter] += 1
+
+    def call(self, method: str, args: tuple, func: Callable[[], T]) -> T:
+        """Return func(), or the result of an identical call that is in flight or cached"""
+        key = (method, args)
+        ttl = self.config["ttl_ms"].get(method, 0) / 1000
+        with self._lock:
+            if ttl:
+                entry = self._cache.get(key)
+                if entry is not None and entry[0] > time.monotonic():
+                    self._cache.move_to_end(key)
+                    self._count(method, "hits")
+                    return entry[1]
+            in_flight = self._in_flight.get(key)
+            future: Optional[concurrent.futures.Future] = None
+            if in_flight is None:
+                future = self._in_flight[key] = concurrent.futures.Future()
+                self._count(method, "misses")
+            elif in_event_loop_thread():
+                # a request of its own, waiting for the one in flight would block the loop
+                in_flight = None
+                self._count(method, "misses")
+            else:
+                self._count(method, "coalesced")
+        if in_flight is not None:
+            return in_flight.result()
+
+        try:
+            result = func()
+        except BaseException as e:
+            if future is not None:
+                with self._lock:
+                    self._in_flight.pop(key, None)
+                future.set_exception(e)
+            raise
+        with self._lock:
+            if future is not None:
+                self._in_flight.pop(key, None)
+            # failed reads return None, they are not cached
+            if ttl and result is not None:
+                self._cache[key] = (time.monotonic() + ttl, result)
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.config["max_entries"]:
+                    self._cache.popitem(last=False)
+        if future is not None:
+            future.set_result(result)
+        return result
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._cache),
+                "in_flight": len(self._in_flight),
+                "methods": {method: dict(counters) for method, counters in self._counters.items()},
+            }
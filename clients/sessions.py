@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import ssl
+import weakref
+from typing import Any, Optional
+
+import aiohttp
+import certifi
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_CONFIG = {
+    "limit": 100,
+    "limit_per_host": 20,
+    "keepalive_timeout": 60,
+    "ttl_dns_cache": 300,
+}
+
+
+class SessionManager:
+    """
+    One tuned aiohttp session shared by all async ccxt clients running on an event loop.
+    Pooled keep-alive connections mean a request to an exchange host only pays the
+    DNS lookup and TLS handshake when no idle connection to that host is left.
+    """
+
+    def __init__(self, pool_config: Optional[dict[str, Any]] = None):
+        self.pool_config = {**DEFAULT_POOL_CONFIG, **(pool_config or {})}
+        self.ssl_context = ssl.create_default_context(cafile=certifi.where())
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.stats = {
+            "requests": 0,
+            "in_flight": 0,
+            "connections_created": 0,
+            "connections_reused": 0,
+            "connections_queued": 0,
+            "dns_cache_hits": 0,
+            "dns_cache_misses": 0,
+        }
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+
+        def counter(name: str, delta: int = 1):
+            async def on_event(session, context, params):
+                self.stats[name] += delta
+
+            return on_event
+
+        trace_config.on_request_start.append(counter("requests"))
+        trace_config.on_request_start.append(counter("in_flight"))
+        trace_config.on_request_end.append(counter("in_flight", -1))
+        trace_config.on_request_exception.append(counter("in_flight", -1))
+        trace_config.on_connection_create_end.append(counter("connections_created"))
+        trace_config.on_connection_reuseconn.append(counter("connections_reused"))
+        trace_config.on_connection_queued_start.append(counter("connections_queued"))
+        trace_config.on_dns_cache_hit.append(counter("dns_cache_hits"))
+        trace_config.on_dns_cache_miss.append(counter("dns_cache_misses"))
+        return trace_config
+
+    def _resolver(self) -> Optional[aiohttp.abc.AbstractResolver]:
+        # aiodns (on top of pycares) resolves without blocking a thread per lookup
+        try:
+            return aiohttp.AsyncResolver()
+        except Exception:
+            return None
+
+    def get_session(self) -> aiohttp.ClientSession:
+        """Return the shared session, creating it on the running event loop"""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                ssl=self.ssl_context,
+                limit=self.pool_config["limit"],
+                limit_per_host=self.pool_config["limit_per_host"],
+                keepalive_timeout=self.pool_config["keepalive_timeout"],
+                ttl_dns_cache=self.pool_config["ttl_dns_cache"],
+                use_dns_cache=True,
+                resolver=self._resolver(),
+            )
+            self.session = aiohttp.ClientSession(connector=connector, trace_configs=[self._trace_config()])
+            logger.info(f"Created shared aiohttp session {self.pool_config}")
+        return self.session
+
+    def attach(self, api) -> None:
+        """
+        Make an async ccxt client use the shared session. ccxt does not close sessions it doesn't own.
+        The client's ssl context must be the connector's one, otherwise aiohttp pools connections separately.
+        """
+        if api.session is self.session and self.session is not None and not self.session.closed:
+            return
+        api.session = self.get_session()
+        api.own_session = False
+        api.ssl_context = self.ssl_context
+
+    def pool_stats(self) -> dict[str, Any]:
+        stats = dict(self.stats)
+        stats.update(
+            {
+                "limit": self.pool_config["limit"],
+                "limit_per_host": self.pool_config["limit_per_host"],
+                "closed": self.session is None or self.session.closed,
+            }
+        )
+        return stats
+
+    async def close(self) -> None:
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+
+_managers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, SessionManager]" = weakref.WeakKeyDictionary()
+
+
+def get_session_manager(pool_config: Optional[dict[str, Any]] = None) -> SessionManager:
+    """
+    Return the session manager of the running event loop.
+    The pool configuration of the first caller on a loop is used.
+    """
+    loop = asyncio.get_running_loop()
+    manager = _managers.get(loop)
+    if manager is None:
+        manager = SessionManager(pool_config)
+        _managers[loop] = manager
+    return manager
+
+
+def attach_shared_session(api, pool_config: Optional[dict[str, Any]] = None):
+    """Attach the running loop's shared session to an async ccxt client and return the client"""
+    get_session_manager(pool_config).attach(api)
+    return api
+
+
+def pool_stats() -> list[dict[str, Any]]:
+    return [manager.pool_stats() for manager in list(_managers.values())]
+
+
+async def close_shared_sessions() -> None:
+    """Close the shared session of the running loop, after all clients using it have been closed"""
+    manager = _managers.pop(asyncio.get_running_loop(), None)
+    if manager is not None:
+        await manager.close()
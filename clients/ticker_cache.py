@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Iterable, NamedTuple, Optional
+
+from clients.custom_types import Ticker
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TICKER_STREAM_CONFIG = {
+    "max_age_seconds": 5,
+    "reconnect_delay_seconds": 1,
+    "max_reconnect_delay_seconds": 30,
+}
+
+
+class TickerEntry(NamedTuple):
+    bid: Optional[float]
+    ask: Optional[float]
+    last: Optional[float]
+    average: Optional[float]
+    received_at: float
+
+
+class TickerCache:
+    """
+    Latest bid/ask/last/average per symbol of one exchange, fed by ccxt.pro watch_tickers
+    (or watch_ticker per symbol where watch_tickers isn't supported).
+    Lookups are a single dict access and never await.
+    """
+
+    def __init__(self, exchange_name: str, ticker_stream_config: Optional[dict[str, Any]] = None):
+        self.exchange_name = exchange_name
+        self.config = {**DEFAULT_TICKER_STREAM_CONFIG, **(ticker_stream_config or {})}
+        self.tickers: dict[str, TickerEntry] = {}
+        self.symbols: set[str] = set()
+        self._changed: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def update(self, ticker: dict[str, Any]) -> None:
+        bid, ask = ticker.get("bid"), ticker.get("ask")
+        average = ticker.get("average")
+        if average is None and bid is not None and ask is not None:
+            average = (bid + ask) / 2
+        self.tickers[ticker["symbol"]] = TickerEntry(bid, ask, ticker.get("last"), average, time.monotonic())
+
+    def is_stale(self, symbol: str) -> bool:
+        entry = self.tickers.get(symbol)
+        return entry is None or time.monotonic() - entry.received_at > self.config["max_age_seconds"]
+
+    def get_ticker(self, symbol: str) -> Optional[Ticker]:
+        """Return the cached ticker, None if the symbol isn't streamed or its price is stale"""
+        entry = self.tickers.get(symbol)
+        if entry is None or time.monotonic() - entry.received_at > self.config["max_age_seconds"]:
+            return None
+        return {"symbol": symbol, "bid": entry.bid, "ask": entry.ask, "last": entry.last, "average": entry.average}
+
+    def track(self, symbols: Iterable[str]) -> None:
+        """Subscribe to the symbols (e.g. of all open orders), thread-safe"""
+        new_symbols = set(symbols) - self.symbols
+        if not new_symbols:
+            return
+        self.symbols = self.symbols | new_symbols
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._changed.set)
+
+    async def run(
+        self,
+        watch_tickers: Optional[Callable[[list[str]], Awaitable[dict]]],
+        watch_ticker: Callable[[str], Awaitable[dict]],
+    ) -> None:
+        """
+        Stream tickers of all tracked symbols until cancelled, resubscribing when symbols are added.
+
+        :param watch_tickers: coroutine function for many symbols, None if the exchange only supports watch_ticker
+        :param watch_ticker: coroutine function for a single symbol
+        """
+        delay = self.config["reconnect_delay_seconds"]
+        while True:
+            if not self.symbols:
+                await self._changed.wait()
+            self._changed.clear()
+            symbols = sorted(self.symbols)
+            try:
+                if watch_tickers is not None:
+                    await self._stream(lambda symbols=symbols: watch_tickers(symbols))
+                else:
+                    await asyncio.gather(*(self._stream(lambda s=s: watch_ticker(s)) for s in symbols))
+                delay = self.config["reconnect_delay_seconds"]
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Ticker stream of {self.exchange_name} disconnected, reconnecting in {delay}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.config["max_reconnect_delay_seconds"])
+
+    async def _stream(self, watch: Callable[[], Awaitable[dict]]) -> None:
+        """Apply updates until the tracked symbols change"""
+        changed = asyncio.ensure_future(self._changed.wait())
+        update = None
+        try:
+            while not changed.done():
+                update = asyncio.ensure_future(watch())
+                await asyncio.wait([update, changed], return_when=asyncio.FIRST_COMPLETED)
+                if not update.done():
+                    break
+                result = update.result()
+                # watch_tickers returns a dict of tickers by symbol, watch_ticker a single ticker
+                for ticker in result.values() if "symbol" not in result else [result]:
+                    self.update(ticker)
+        finally:
+            changed.cancel()
+            if update is not None and not update.done():
+                update.cancel()
+
+    def start(
+        self,
+        watch_tickers: Optional[Callable[[list[str]], Awaitable[dict]]],
+        watch_ticker: Callable[[str], Awaitable[dict]],
+    ) -> asyncio.Task:
+        """Start streaming on the running event loop"""
+        if self._task is None or self._task.done():
+            self._loop = asyncio.get_running_loop()
+            self._changed = asyncio.Event()
+            self._task = self._loop.create_task(self.run(watch_tickers, watch_ticker))
+        return self._task
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._loop = None
@@ -1,4 +1,22 @@
 import os
+from typing import Optional
+
+
+def parse_api_keys(value: Optional[str], name: str = "api keys") -> list[tuple[str, str, str]]:
+    """
+    Parse "key:secret,key:secret:account" into [(key, secret, account), ...].
+    Keys without an account are further keys of the main account.
+    """
+    api_keys = []
+    for position, entry in enumerate((value or "").split(","), start=1):
+        if not entry.strip():
+            continue
+        parts = entry.strip().split(":")
+        if len(parts) not in (2, 3) or not all(parts):
+            # the entry holds a secret, only its position goes into the message
+            raise ValueError(f"Entry {position} of {name} is not key:secret or key:secret:account")
+        api_keys.append((parts[0], parts[1], parts[2] if len(parts) == 3 else "main"))
+    return api_keys
 
 
 class Config:
@@ -32,6 +50,12 @@ class Config:
         self.binance_secret = binance_secret
         self.kraken_api_key = kraken_api_key
         self.kraken_secret = kraken_secret
+        # optional further keys and sub-accounts per exchange, e.g. BINANCE_PROD_EXTRA_KEYS
+        key_env = "TEST" if self.env_name == "dev" else "PROD"
+        extra_keys_vars = {
+            exchange: f"{exchange.upper()}_{key_env}_EXTRA_KEYS" for exchange in ("binance", "kraken", "bitfinex", "bybit")
+        }
+        self.extra_keys = {exchange: parse_api_keys(os.getenv(var), var) for exchange, var in extra_keys_vars.items()}
         self.bitfinex_api_key = bitfinex_api_key
         self.bitfinex_secret = bitfinex_secret
         self.bybit_api_key = bybit_api_key
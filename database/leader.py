@@ -0,0 +1,128 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Optional
+
+import psycopg
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEADER_CONFIG = {
+    # a standby tries to take the lock this often
+    "retry_seconds": 2,
+    # the leader checks its session this often and steps down as soon as a check fails or takes longer than
+    # heartbeat_timeout_seconds, which must stay below the keepalive idle time after which the server drops a dead session
+    "heartbeat_seconds": 1,
+    "heartbeat_timeout_seconds": 2,
+    # TCP keepalives so that the server drops the session (and the lock) of a dead leader quickly
+    "keepalives_idle": 5,
+    "keepalives_interval": 2,
+    "keepalives_count": 2,
+}
+
+
+class LeaderLock:
+    """
+    Leadership of one named role (e.g. watching the orders of one exchange account), held as a
+    session-level pg_try_advisory_lock on a dedicated connection. When the leader's connection
+    drops the server releases the lock and a standby takes it on its next retry.
+    """
+
+    def __init__(
+        self,
+        conn_info: str,
+        name: str,
+        leader_config: Optional[dict[str, Any]] = None,
+        on_acquired: Optional[Callable[[], Awaitable[None]]] = None,
+    ):
+        self.conn_info = conn_info
+        self.name = name
+        self.config = {**DEFAULT_LEADER_CONFIG, **(leader_config or {})}
+        self.on_acquired = on_acquired
+        self.is_leader = False
+        self._backend_pid: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._takeover: Optional[asyncio.Task] = None
+
+    async def _connect(self) -> psycopg.AsyncConnection:
+        return await psycopg.AsyncConnection.connect(
+            self.conn_info,
+            autocommit=True,
+            keepalives=1,
+            keepalives_idle=self.config["keepalives_idle"],
+            keepalives_interval=self.config["keepalives_interval"],
+            keepalives_count=self.config["keepalives_count"],
+        )
+
+    async def _try_lock(self, conn: psycopg.AsyncConnection) -> bool:
+        cur = await conn.execute("SELECT pg_try_advisory_lock(hashtextextended(%s, 0))", (self.name,))
+        row = await cur.fetchone()
+        return bool(row and row[0])
+
+    async def _run_on_acquired(self) -> None:
+        try:
+            await self.on_acquired()
+        except Exception as e:
+            logger.error(f"Takeover of {self.name} failed: {e}")
+
+    def _step_down(self) -> None:
+        self.is_leader = False
+        self._backend_pid = None
+        if self._takeover is not None:
+            self._takeover.cancel()
+            self._takeover = None
+
+    async def holds_lock(self, conn: psycopg.AsyncConnection) -> bool:
+        """
+        Whether this process is the leader, confirmed by the server on the caller's connection (e.g. in the
+        transaction of the leader's writes): once a standby has taken the lock over, a cut off leader whose
+        heartbeat hasn't failed yet is refused here.
+        """
+        if not self.is_leader or self._backend_pid is None:
+            return False
+        cur = await conn.execute(
+            "SELECT 1 FROM pg_locks WHERE locktype = 'advisory' AND granted AND pid = %s", (self._backend_pid,)
+        )
+        return await cur.fetchone() is not None
+
+    async def run(self) -> None:
+        """Compete for the lock until cancelled"""
+        while True:
+            # not the leader while competing, whatever the outcome of the previous session
+            self._step_down()
+            try:
+                async with await self._connect() as conn:
+                    while not await self._try_lock(conn):
+                        await asyncio.sleep(self.config["retry_seconds"])
+                    self._backend_pid = conn.info.backend_pid
+                    self.is_leader = True
+                    logger.info(f"Became leader of {self.name}")
+                    if self.on_acquired is not None:
+                        self._takeover = asyncio.get_running_loop().create_task(self._run_on_acquired())
+                    while True:
+                        await asyncio.sleep(self.config["heartbeat_seconds"])
+                        # a session that hangs (e.g. a network partition) may already have lost the lock
+                        await asyncio.wait_for(conn.execute("SELECT 1"), self.config["heartbeat_timeout_seconds"])
+            except asyncio.CancelledError:
+                self._step_down()
+                raise
+            except Exception as e:
+                if self.is_leader:
+                    logger.warning(f"Lost leadership of {self.name}: {e!r}")
+                else:
+                    logger.warning(f"Leader election of {self.name} failed, retrying: {e!r}")
+                self._step_down()
+                await asyncio.sleep(self.config["retry_seconds"])
+
+    def start(self) -> asyncio.Task:
+        """Start competing on the running event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+        return self._task
+
+    async def stop(self) -> None:
+        """Step down, closing the connection releases the lock"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._step_down()
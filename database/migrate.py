@@ -0,0 +1,69 @@
+import argparse
+import logging
+from pathlib import Path
+
+import psycopg
+from dotenv import load_dotenv
+
+from config import Config
+from loggers import setup_logging
+from parameters import add_common_args
+
+MIGRATIONS_DIR = Path(__file__).parent / "migrations"
+
+logger = logging.getLogger(__name__)
+
+
+def split_statements(sql: str) -> list[str]:
+    """Statements of a migration file, separated by a semicolon at the end of a line outside $$ quoted bodies"""
+    statements = []
+    lines: list[str] = []
+    quoted = False
+    for line in sql.splitlines():
+        if not quoted and line.lstrip().startswith("--"):
+            continue
+        lines.append(line)
+        quoted ^= line.count("$$") % 2 == 1
+        if not quoted and line.rstrip().endswith(";"):
+            statements.append("\n".join(lines).strip().rstrip(";"))
+            lines = []
+    statements.append("\n".join(lines).strip().rstrip(";"))
+    return [statement for statement in statements if statement.strip()]
+
+
+def pending_migrations(applied: set[str]) -> list[Path]:
+    return sorted(path for path in MIGRATIONS_DIR.glob("*.sql") if path.name not in applied)
+
+
+def migrate(conn_info: str) -> list[str]:
+    """
+    Apply the files of database/migrations that haven't been applied yet, in order, and record them
+    in moolah.schema_migration. Statements run one at a time outside a transaction, so that indexes
+    can be built CONCURRENTLY; every statement must therefore be safe to run again after a failure.
+    Returns the names of the applied files.
+    """
+    applied_now = []
+    with psycopg.connect(conn_info, autocommit=True) as conn:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS moolah.schema_migration (name TEXT PRIMARY KEY, applied_on TIMESTAMPTZ NOT NULL DEFAULT now());"
+        )
+        applied = {row[0] for row in conn.execute("SELECT name FROM moolah.schema_migration;").fetchall()}
+        for path in pending_migrations(applied):
+            logger.info(f"Applying migration {path.name}")
+            for statement in split_statements(path.read_text()):
+                conn.execute(statement)
+            conn.execute("INSERT INTO moolah.schema_migration (name) VALUES (%s);", (path.name,))
+            applied_now.append(path.name)
+    return applied_now
+
+
+if __name__ == "__main__":
+    # python -m database.migrate --env_name prod, before deploying code that needs the changes
+    load_dotenv()
+    setup_logging()
+    logger = logging.getLogger(__name__)
+
+    parser = add_common_args(argparse.ArgumentParser(description="Apply the pending database migrations"))
+    args = parser.parse_args()
+    config = Config(env_name=args.env_name)
+    logger.info(f"Applied migrations: {migrate(config.conn_info) or 'none pending'}")
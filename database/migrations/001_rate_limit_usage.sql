@@ -0,0 +1,7 @@
+-- shared rate limit budgets, see clients.rate_limit.PostgresRateLimitBackend
+CREATE TABLE IF NOT EXISTS moolah.rate_limit_usage (
+    bucket TEXT NOT NULL,
+    window_start BIGINT NOT NULL,
+    used DOUBLE PRECISION NOT NULL,
+    PRIMARY KEY (bucket, window_start)
+);
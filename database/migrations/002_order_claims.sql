@@ -0,0 +1,8 @@
+-- claims of the order queue, see database.models.Order.claim_orders
+ALTER TABLE moolah."order"
+    ADD COLUMN IF NOT EXISTS claimed_by TEXT,
+    ADD COLUMN IF NOT EXISTS claim_expires_at TIMESTAMPTZ;
+-- built without blocking writes to moolah."order"; a failed build leaves an INVALID index behind,
+-- drop it (DROP INDEX CONCURRENTLY moolah.order_unsent_open_idx) before running the migration again
+CREATE INDEX CONCURRENTLY IF NOT EXISTS order_unsent_open_idx ON moolah."order" (market_code, created_on)
+    WHERE status = 'open' AND (external_order_id IS NULL OR external_order_id = '');
@@ -0,0 +1,5 @@
+-- last nonce of every API key whose private requests are ordered across processes, see clients.nonce.NonceCoordinator
+CREATE TABLE IF NOT EXISTS moolah.api_nonce (
+    account TEXT PRIMARY KEY,
+    last_nonce BIGINT NOT NULL
+);
@@ -0,0 +1,28 @@
+-- notifies moolah_new_order (database.models.OrderNotification.CHANNEL) with the market code whenever an order,
+-- or its link to a signal, is inserted, see order_executor.py. The payload is empty if the market code isn't known yet.
+CREATE OR REPLACE FUNCTION moolah.notify_new_order() RETURNS trigger AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'signal_order' THEN
+        PERFORM pg_notify(
+            'moolah_new_order',
+            COALESCE((SELECT market_code FROM moolah."order" WHERE id = NEW.order_id), '')
+        );
+    ELSE
+        PERFORM pg_notify('moolah_new_order', COALESCE(NEW.market_code, ''));
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+-- created only where missing (executors used to create them on start), never dropped: orders inserted meanwhile are notified
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'order_notify_new_order' AND tgrelid = 'moolah."order"'::regclass) THEN
+        CREATE TRIGGER order_notify_new_order AFTER INSERT ON moolah."order"
+            FOR EACH ROW EXECUTE FUNCTION moolah.notify_new_order();
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'signal_order_notify_new_order' AND tgrelid = 'moolah.signal_order'::regclass) THEN
+        CREATE TRIGGER signal_order_notify_new_order AFTER INSERT ON moolah.signal_order
+            FOR EACH ROW EXECUTE FUNCTION moolah.notify_new_order();
+    END IF;
+END;
+$$;
@@ -0,0 +1,10 @@
+-- resume point of the trade backfill per exchange, account and pair, see backfill_trades.py
+CREATE TABLE IF NOT EXISTS moolah.trade_backfill (
+    exchange TEXT NOT NULL,
+    account TEXT NOT NULL,
+    pair TEXT NOT NULL,
+    watermark BIGINT NOT NULL,
+    trades BIGINT NOT NULL DEFAULT 0,
+    updated_on TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (exchange, account, pair)
+);
@@ -1,15 +1,13 @@
-from psycopg import Cursor
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterator, Optional, Union
 
+from psycopg import AsyncCursor, Cursor
+from psycopg.rows import class_row
 
-class Order:
-    @staticmethod
-    def get_all_orders(
-        cur: Cursor,
-        has_external_id: bool = None,
-        status: str = None,
-        market_code: str = None,
-    ):
-        sql_query = """
+from database.records import OrderRecord, TradeRecord
+
+ORDER_COLUMNS = """
         SELECT o.id AS id,
             o.amount AS amount,
             o.price AS price,
@@ -26,58 +24,181 @@ class Order:
             c.code AS coin_code,
             s.value AS value
         FROM moolah."order" o
+"""
+
+SELECT_ORDERS = (
+    ORDER_COLUMNS
+    + """
         JOIN moolah.signal_order so ON so.order_id = o.id 
         JOIN moolah.signal s ON s.id = so.signal_id 
         JOIN moolah.coin c ON s.coin_id = c.id
         """
+)
 
-        conditions: list[str] = []
-        params: list[str] = []
-
-        if has_external_id is not None:
-            if has_external_id:
-                conditions.append("o.external_order_id IS NOT NULL AND o.external_order_id != ''")
-            else:
-                conditions.append("(o.external_order_id IS NULL OR o.external_order_id = '')")
+SELECT_ORDER_BY_EXTERNAL_ORDER_ID = (
+    ORDER_COLUMNS
+    + """
+        LEFT JOIN moolah.signal_order so ON so.order_id = o.id
+        LEFT JOIN moolah.signal s ON s.id = so.signal_id
+        LEFT JOIN moolah.coin c ON s.coin_id = c.id
+        WHERE o.external_order_id = %s
+        """
+)
 
-        if status is not None:
-            conditions.append("o.status = %s")
-            params.append(status)
+CLAIM_ORDERS = """
+            WITH claimable AS (
+                SELECT o.id
+                FROM moolah."order" o
+                JOIN moolah.signal_order so ON so.order_id = o.id
+                WHERE o.status = 'open'
+                    AND (o.external_order_id IS NULL OR o.external_order_id = '')
+                    AND o.market_code = %s
+                    AND (o.claim_expires_at IS NULL OR o.claim_expires_at < now())
+                    AND o.id <> ALL(%s)
+                ORDER BY o.created_on
+                LIMIT %s
+                FOR UPDATE OF o SKIP LOCKED
+            )
+            UPDATE moolah."order" o
+            SET claimed_by = %s, claim_expires_at = now() + make_interval(secs => %s)
+            FROM claimable
+            WHERE o.id = claimable.id
+            RETURNING o.id;
+            """
 
-        if market_code is not None:
-            conditions.append("o.market_code = %s")
-            params.append(market_code)
+EXTEND_CLAIM = """
+            UPDATE moolah."order"
+            SET claim_expires_at = now() + make_interval(secs => %s)
+            WHERE id = %s AND claimed_by = %s AND claim_expires_at > now()
+            RETURNING id;
+            """
 
-        if conditions:
-            sql_query += " WHERE " + " AND ".join(conditions)
-        sql_query += ";"
-        cur.execute(sql_query, params)
-        columns = [desc[0] for desc in cur.description]
-        rows = cur.fetchall()
-        results = [dict(zip(columns, row, strict=False)) for row in rows]
+RELEASE_CLAIMS = """
+            UPDATE moolah."order"
+            SET claimed_by = NULL, claim_expires_at = NULL
+            WHERE id = ANY(%s) AND claimed_by = %s
+            """
 
-        return results
+UPDATE_ORDER_BY_ID = """
+            UPDATE moolah."order"
+            SET filled_amount = %s, status = %s, external_order_id = %s
+            WHERE id = %s
+        """
 
-    def get_order_by_external_order_id(
-        cur: Cursor,
-        external_order_id: str,
-    ):
-        query = """
-        SELECT *
-        FROM moolah."order" o
-        WHERE external_order_id = %s
+UPDATE_ORDER_BY_EXTERNAL_ORDER_ID = """
+            UPDATE moolah."order" 
+            SET filled_amount = %s, status = %s 
+            WHERE external_order_id = %s
         """
 
-        cur.execute(
-            query,
-            (external_order_id,),
-        )
+INSERT_TRADE = """
+            INSERT INTO moolah.trade (trade_id, price, quantity, "timestamp", market_id, order_id)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON CONFLICT (trade_id) DO NOTHING
+            """
+
+INSERT_TRADE_IF_NOT_EXISTS = INSERT_TRADE + "RETURNING id;"
+
+SELECT_TRADED_COINS = """
+            SELECT c.code, MIN(o.created_on)
+            FROM moolah."order" o
+            JOIN moolah.signal_order so ON so.order_id = o.id
+            JOIN moolah.signal s ON s.id = so.signal_id
+            JOIN moolah.coin c ON s.coin_id = c.id
+            WHERE o.market_code = %s AND o.external_order_id IS NOT NULL AND o.external_order_id != ''
+            GROUP BY c.code;
+            """
+
+SELECT_ORDER_IDS_BY_EXTERNAL_ORDER_IDS = """
+            SELECT external_order_id, id
+            FROM moolah."order"
+            WHERE market_code = %s AND external_order_id = ANY(%s)
+            """
+
+# per session staging table for COPY, emptied by every commit
+CREATE_TRADE_STAGING = """
+            CREATE TEMP TABLE IF NOT EXISTS trade_staging (LIKE moolah.trade INCLUDING DEFAULTS) ON COMMIT DELETE ROWS;
+            """
 
-        row = cur.fetchone()
-        columns = [desc[0] for desc in cur.description]
-        result = dict(zip(columns, row, strict=False)) if row else None
+COPY_TRADE_STAGING = 'COPY trade_staging (trade_id, price, quantity, "timestamp", market_id, order_id) FROM STDIN'
 
-        return result
+INSERT_TRADES_FROM_STAGING = """
+            INSERT INTO moolah.trade (trade_id, price, quantity, "timestamp", market_id, order_id)
+            SELECT trade_id, price, quantity, "timestamp", market_id, order_id FROM trade_staging
+            ON CONFLICT (trade_id) DO NOTHING
+            """
+
+
+@contextmanager
+def _order_rows(cur: Union[Cursor, AsyncCursor]) -> Iterator[None]:
+    """Build OrderRecord objects directly from the rows fetched inside the block"""
+    row_factory = cur.row_factory
+    cur.row_factory = class_row(OrderRecord)
+    try:
+        yield
+    finally:
+        cur.row_factory = row_factory
+
+
+def _all_orders_query(
+    has_external_id: bool = None,
+    status: str = None,
+    market_code: str = None,
+    ids: list[int] = None,
+) -> tuple[str, list]:
+    sql_query = SELECT_ORDERS
+    conditions: list[str] = []
+    params: list = []
+
+    if has_external_id is not None:
+        if has_external_id:
+            conditions.append("o.external_order_id IS NOT NULL AND o.external_order_id != ''")
+        else:
+            conditions.append("(o.external_order_id IS NULL OR o.external_order_id = '')")
+
+    if status is not None:
+        conditions.append("o.status = %s")
+        params.append(status)
+
+    if market_code is not None:
+        conditions.append("o.market_code = %s")
+        params.append(market_code)
+
+    if ids is not None:
+        conditions.append("o.id = ANY(%s)")
+        params.append(ids)
+
+    if conditions:
+        sql_query += " WHERE " + " AND ".join(conditions)
+    sql_query += ";"
+    return sql_query, params
+
+
+class Order:
+    @staticmethod
+    def get_all_orders(
+        cur: Cursor,
+        has_external_id: bool = None,
+        status: str = None,
+        market_code: str = None,
+        ids: list[int] = None,
+    ) -> list[OrderRecord]:
+        sql_query, params = _all_orders_query(has_external_id, status, market_code, ids)
+        with _order_rows(cur):
+            cur.execute(sql_query, params)
+            return cur.fetchall()
+
+    @staticmethod
+    def get_order_by_external_order_id(
+        cur: Cursor,
+        external_order_id: str,
+    ) -> Optional[OrderRecord]:
+        with _order_rows(cur):
+            cur.execute(
+                SELECT_ORDER_BY_EXTERNAL_ORDER_ID,
+                (external_order_id,),
+            )
+            return cur.fetchone()
 
     @staticmethod
     def update_order_by_id(
@@ -87,14 +208,9 @@ class Order:
         external_order_id: int,
         id: int,
     ):
-        query = """
-            UPDATE moolah."order"
-            SET filled_amount = %s, status = %s, external_order_id = %s
-            WHERE id = %s
-        """
         params = [filled_amount, status, external_order_id, id]
 
-        cur.execute(query, params)
+        cur.execute(UPDATE_ORDER_BY_ID, params)
 
     @staticmethod
     def update_order_by_external_order_id(
@@ -103,24 +219,242 @@ class Order:
         status: str,
         external_order_id: int,
     ):
-        query = """
-            UPDATE moolah."order" 
-            SET filled_amount = %s, status = %s 
-            WHERE external_order_id = %s
-        """
         params = [filled_amount, status, external_order_id]
-        cur.execute(query, params)
+        cur.execute(UPDATE_ORDER_BY_EXTERNAL_ORDER_ID, params)
 
 
 class Trade:
     @staticmethod
     def insert_trade_if_not_exists(cur: Cursor, trade_id, price, quantity, timestamp, market_id, order_id):
+        cur.execute(
+            INSERT_TRADE_IF_NOT_EXISTS,
+            (trade_id, price, quantity, timestamp, market_id, order_id),
+        )
+
+    @staticmethod
+    def insert_trades(cur: Cursor, trades: list[TradeRecord]):
+        cur.executemany(
+            INSERT_TRADE,
+            [(t.trade_id, t.price, t.quantity, t.timestamp, t.market_id, t.order_id) for t in trades],
+        )
+
+
+class AsyncOrder:
+    """
+    Order queries on an AsyncCursor, for coroutines that mustn't block the event loop.
+    Fixed statements are prepared on the server on first use (prepare=True); run several writes
+    inside conn.pipeline() to send them in one round trip.
+    """
+
+    @staticmethod
+    async def get_all_orders(
+        cur: AsyncCursor,
+        has_external_id: bool = None,
+        status: str = None,
+        market_code: str = None,
+        ids: list[int] = None,
+    ) -> list[OrderRecord]:
+        sql_query, params = _all_orders_query(has_external_id, status, market_code, ids)
+        with _order_rows(cur):
+            await cur.execute(sql_query, params, prepare=True)
+            return await cur.fetchall()
+
+    @staticmethod
+    async def get_order_by_external_order_id(cur: AsyncCursor, external_order_id: str) -> Optional[OrderRecord]:
+        with _order_rows(cur):
+            await cur.execute(SELECT_ORDER_BY_EXTERNAL_ORDER_ID, (external_order_id,), prepare=True)
+            return await cur.fetchone()
+
+    @staticmethod
+    async def claim_orders(
+        cur: AsyncCursor,
+        market_code: str,
+        worker_id: str,
+        limit: int,
+        lease_seconds: float,
+        exclude_ids: list[int] = None,
+    ) -> list[OrderRecord]:
+        """
+        Claim up to limit open, not yet sent orders of the market that no other worker holds a
+        live lease on. Rows locked by a concurrent claim are skipped instead of waited for.
+        The claim is only visible to other workers once the transaction is committed.
+        """
+        await cur.execute(CLAIM_ORDERS, (market_code, exclude_ids or [], limit, worker_id, lease_seconds), prepare=True)
+        ids = [row[0] for row in await cur.fetchall()]
+        if not ids:
+            return []
+        return await AsyncOrder.get_all_orders(cur, ids=ids)
+
+    @staticmethod
+    async def extend_claim(cur: AsyncCursor, id: int, worker_id: str, lease_seconds: float) -> bool:
+        """
+        Renew the worker's lease on a claimed order. False if the lease has expired (or was taken over),
+        the order may then be placed by another worker and must be left alone.
+        """
+        await cur.execute(EXTEND_CLAIM, (lease_seconds, id, worker_id), prepare=True)
+        return await cur.fetchone() is not None
+
+    @staticmethod
+    async def release_claims(cur: AsyncCursor, ids: list[int], worker_id: str):
+        await cur.execute(RELEASE_CLAIMS, (ids, worker_id), prepare=True)
+
+    @staticmethod
+    async def update_order_by_id(
+        cur: AsyncCursor,
+        filled_amount: float,
+        status: str,
+        external_order_id: int,
+        id: int,
+    ):
+        await cur.execute(UPDATE_ORDER_BY_ID, (filled_amount, status, external_order_id, id), prepare=True)
+
+    @staticmethod
+    async def update_order_by_external_order_id(
+        cur: AsyncCursor,
+        filled_amount: float,
+        status: str,
+        external_order_id: int,
+    ):
+        await cur.execute(UPDATE_ORDER_BY_EXTERNAL_ORDER_ID, (filled_amount, status, external_order_id), prepare=True)
+
+    @staticmethod
+    async def get_traded_coins(cur: AsyncCursor, market_code: str) -> list[tuple[str, datetime]]:
+        """Coin codes of the market's sent orders, with the creation time of the first order of each"""
+        await cur.execute(SELECT_TRADED_COINS, (market_code,), prepare=True)
+        return await cur.fetchall()
+
+    @staticmethod
+    async def get_order_ids_by_external_order_ids(
+        cur: AsyncCursor, market_code: str, external_order_ids: list[str]
+    ) -> dict[str, int]:
+        await cur.execute(SELECT_ORDER_IDS_BY_EXTERNAL_ORDER_IDS, (market_code, external_order_ids), prepare=True)
+        return dict(await cur.fetchall())
+
+
+class AsyncTrade:
+    @staticmethod
+    async def insert_trade_if_not_exists(cur: AsyncCursor, trade_id, price, quantity, timestamp, market_id, order_id):
+        await cur.execute(
+            INSERT_TRADE_IF_NOT_EXISTS,
+            (trade_id, price, quantity, timestamp, market_id, order_id),
+            prepare=True,
+        )
+
+    @staticmethod
+    async def insert_trades(cur: AsyncCursor, trades: list[TradeRecord]):
+        await cur.executemany(
+            INSERT_TRADE,
+            [(t.trade_id, t.price, t.quantity, t.timestamp, t.market_id, t.order_id) for t in trades],
+        )
+
+    @staticmethod
+    async def copy_trades(cur: AsyncCursor, trades: list[TradeRecord]) -> int:
+        """
+        Bulk insert with COPY into a staging table, skipping trades that are already recorded.
+        Must run inside a transaction (not in a pipeline). Returns the number of inserted trades.
+        """
+        await cur.execute(CREATE_TRADE_STAGING)
+        async with cur.copy(COPY_TRADE_STAGING) as copy:
+            for t in trades:
+                await copy.write_row((t.trade_id, t.price, t.quantity, t.timestamp, t.market_id, t.order_id))
+        await cur.execute(INSERT_TRADES_FROM_STAGING)
+        inserted = cur.rowcount
+        # the rows are also deleted on commit, this keeps several batches in one transaction apart
+        await cur.execute("TRUNCATE trade_staging;")
+        return inserted
+
+
+class AsyncTradeBackfill:
+    """Resume points of the trade backfill (see backfill_trades.py), one per exchange, account and pair (migration 005)"""
+
+    @staticmethod
+    async def get_watermark(cur: AsyncCursor, exchange: str, account: str, pair: str) -> Optional[int]:
+        """Exchange timestamp (ms) to continue from, None if the pair hasn't been backfilled"""
+        await cur.execute(
+            "SELECT watermark FROM moolah.trade_backfill WHERE exchange = %s AND account = %s AND pair = %s;",
+            (exchange, account, pair),
+            prepare=True,
+        )
+        row = await cur.fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    async def save_watermark(cur: AsyncCursor, exchange: str, account: str, pair: str, watermark: int, trades: int):
+        await cur.execute(
+            """
+            INSERT INTO moolah.trade_backfill AS b (exchange, account, pair, watermark, trades)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (exchange, account, pair) DO UPDATE
+            SET watermark = GREATEST(b.watermark, EXCLUDED.watermark), trades = b.trades + EXCLUDED.trades, updated_on = now();
+            """,
+            (exchange, account, pair, watermark, trades),
+            prepare=True,
+        )
+
+
+class RateLimitUsage:
+    """Shared rate limit budgets, the table is created by database/migrations/001_rate_limit_usage.sql"""
+
+    @staticmethod
+    def try_consume(cur: Cursor, bucket: str, window_start: int, weight: float, limit: float) -> bool:
+        """
+        Atomically add weight to the bucket's usage of the window, unless that would exceed the limit.
+        Returns True if the weight has been consumed.
+        """
         cur.execute(
             """
-            INSERT INTO moolah.trade (trade_id, price, quantity, "timestamp", market_id, order_id)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            ON CONFLICT (trade_id) DO NOTHING
-            RETURNING id;
+            INSERT INTO moolah.rate_limit_usage AS u (bucket, window_start, used)
+            SELECT %s, %s, %s WHERE %s <= %s
+            ON CONFLICT (bucket, window_start) DO UPDATE
+            SET used = u.used + EXCLUDED.used
+            WHERE u.used + EXCLUDED.used <= %s
+            RETURNING used;
             """,
-            (trade_id, price, quantity, timestamp, market_id, order_id),
+            (bucket, window_start, weight, weight, limit, limit),
         )
+        return cur.fetchone() is not None
+
+    @staticmethod
+    def delete_windows_before(cur: Cursor, window_start: int):
+        cur.execute("DELETE FROM moolah.rate_limit_usage WHERE window_start < %s;", (window_start,))
+
+
+LOCK_API_NONCE = """
+            INSERT INTO moolah.api_nonce (account, last_nonce) VALUES (%s, 0)
+            ON CONFLICT (account) DO UPDATE SET last_nonce = moolah.api_nonce.last_nonce
+            RETURNING last_nonce;
+            """
+
+SAVE_API_NONCE = "UPDATE moolah.api_nonce SET last_nonce = GREATEST(last_nonce, %s) WHERE account = %s;"
+
+
+class ApiNonce:
+    """Last nonce of an API key, the table is created by database/migrations/003_api_nonce.sql"""
+
+    @staticmethod
+    def lock(cur: Cursor, account: str) -> int:
+        """Lock the key's row until the end of the transaction and return its last nonce"""
+        cur.execute(LOCK_API_NONCE, (account,))
+        return cur.fetchone()[0]
+
+    @staticmethod
+    def save(cur: Cursor, account: str, last_nonce: int):
+        cur.execute(SAVE_API_NONCE, (last_nonce, account))
+
+
+class AsyncApiNonce:
+    @staticmethod
+    async def lock(cur: AsyncCursor, account: str) -> int:
+        """See ApiNonce.lock"""
+        await cur.execute(LOCK_API_NONCE, (account,), prepare=True)
+        return (await cur.fetchone())[0]
+
+    @staticmethod
+    async def save(cur: AsyncCursor, account: str, last_nonce: int):
+        await cur.execute(SAVE_API_NONCE, (last_nonce, account), prepare=True)
+
+
+class OrderNotification:
+    """Channel the trigger of database/migrations/004_order_notify.sql notifies with the market code of new orders"""
+
+    CHANNEL = "moolah_new_order"
@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import os
+import threading
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator, Optional
+
+from psycopg import AsyncConnection, Connection
+from psycopg_pool import AsyncConnectionPool, ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+_pools: dict[str, ConnectionPool] = {}
+_lock = threading.Lock()
+# async pools are bound to the event loop they were opened on
+_async_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, AsyncConnectionPool]]" = (
+    weakref.WeakKeyDictionary()
+)
+_async_locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]" = weakref.WeakKeyDictionary()
+
+
+def get_pool(conn_info: str) -> ConnectionPool:
+    """
+    Return the process-wide connection pool for the given connection string.
+    The pool is created lazily so that forked server workers each open their own connections.
+    """
+    pool = _pools.get(conn_info)
+    if pool is not None:
+        return pool
+    with _lock:
+        pool = _pools.get(conn_info)
+        if pool is None:
+            pool = ConnectionPool(
+                conn_info,
+                min_size=int(os.getenv("DB_POOL_MIN_SIZE", "1")),
+                max_size=int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+                max_idle=float(os.getenv("DB_POOL_MAX_IDLE", "300")),
+                name="moolah",
+                open=True,
+            )
+            _pools[conn_info] = pool
+            logger.info(f"Opened database connection pool (min={pool.min_size}, max={pool.max_size})")
+    return pool
+
+
+@contextmanager
+def connection(conn_info: str, timeout: Optional[float] = None) -> Iterator[Connection]:
+    """
+    Borrow a connection from the pool. Like psycopg.connect() used as a context manager,
+    the transaction is committed on exit, or rolled back if an exception was raised.
+
+    :param timeout: seconds to wait for a connection, the pool's default (30) if None
+    """
+    with get_pool(conn_info).connection(timeout=timeout) as conn:
+        yield conn
+
+
+async def get_async_pool(conn_info: str) -> AsyncConnectionPool:
+    """Return the connection pool of the running event loop for the given connection string, see get_pool"""
+    loop = asyncio.get_running_loop()
+    pools = _async_pools.setdefault(loop, {})
+    pool = pools.get(conn_info)
+    if pool is not None:
+        return pool
+    async with _async_locks.setdefault(loop, asyncio.Lock()):
+        pool = pools.get(conn_info)
+        if pool is None:
+            pool = AsyncConnectionPool(
+                conn_info,
+                min_size=int(os.getenv("DB_POOL_MIN_SIZE", "1")),
+                max_size=int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+                max_idle=float(os.getenv("DB_POOL_MAX_IDLE", "300")),
+                name="moolah-async",
+                open=False,
+            )
+            await pool.open()
+            pools[conn_info] = pool
+            logger.info(f"Opened async database connection pool (min={pool.min_size}, max={pool.max_size})")
+    return pool
+
+
+@asynccontextmanager
+async def async_connection(conn_info: str, timeout: Optional[float] = None) -> AsyncIterator[AsyncConnection]:
+    """Borrow a connection from the event loop's async pool, committed on exit like connection()"""
+    pool = await get_async_pool(conn_info)
+    async with pool.connection(timeout=timeout) as conn:
+        yield conn
+
+
+async def close_async_pools() -> None:
+    """Close the async pools of the running event loop"""
+    pools = _async_pools.pop(asyncio.get_running_loop(), {})
+    for pool in pools.values():
+        await pool.close()
+
+
+def close_pools() -> None:
+    with _lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
@@ -0,0 +1,57 @@
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Optional
+
+
+@dataclass(slots=True)
+class OrderRecord:
+    """
+    One row of moolah."order" joined with its signal's coin and value, see database.models.Order.
+    Numeric columns stay Decimal, they are converted where they are handed to ccxt (see clients.exchange_utils).
+    """
+
+    id: int
+    side: str
+    type: str
+    amount: Optional[Decimal]
+    coin_code: Optional[str] = None
+    price: Optional[Decimal] = None
+    value: Optional[Decimal] = None
+    status: Optional[str] = None
+    filled_amount: Optional[Decimal] = None
+    market_code: Optional[str] = None
+    external_order_id: Optional[str] = None
+    note: Optional[str] = None
+    comment: Optional[str] = None
+    created_on: Optional[datetime] = None
+    updated_on: Optional[datetime] = None
+
+
+@dataclass(slots=True)
+class TradeRecord:
+    """One row to insert into moolah.trade"""
+
+    trade_id: str
+    price: float
+    quantity: float
+    timestamp: Optional[str]
+    market_id: int
+    order_id: int
+
+    @classmethod
+    def from_ccxt(
+        cls, trade: dict[str, Any], order_id: int, timestamp: Optional[str] = None, market_id: int = 1
+    ) -> "TradeRecord":
+        """
+        :param timestamp: time to record instead of the trade's own datetime
+        :param market_id: market id, hardcoded to 1 for now
+        """
+        return cls(
+            trade_id=trade["id"],
+            price=trade["price"],
+            quantity=trade["amount"],
+            timestamp=timestamp or trade["datetime"],
+            market_id=market_id,
+            order_id=order_id,
+        )
@@ -29,11 +29,11 @@ def send_insufficient_funds_email(order, exchange_name, balance, total_order_val
     body = (
         f"Order Details:\n"
         f"- Exchange: {exchange_name}\n"
-        f"- Order ID: {order['id']}\n"
-        f"- Order Type: {order['type']}\n"
-        f"- Side: {order['side']}\n"
-        f"- Amount: {order['amount']}\n"
-        f"- Symbol: {order['coin_code']}\n"
+        f"- Order ID: {order.id}\n"
+        f"- Order Type: {order.type}\n"
+        f"- Side: {order.side}\n"
+        f"- Amount: {order.amount}\n"
+        f"- Symbol: {order.coin_code}\n"
         f"- Available Balance: {balance} {balance_coin}\n"
         f"- Required Balance: {total_order_value} {balance_coin}\n\n"
         "Please ensure sufficient funds are available to execute the order."
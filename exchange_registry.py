@@ -0,0 +1,297 @@
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, Optional
+
+from clients.binance import Binance
+from clients.bitfinex import Bitfinex
+from clients.bybit import Bybit
+from clients.exchange import Exchange
+from clients.kraken import Kraken
+from clients.paper import PaperExchange
+from clients.rate_limit import configure_rate_limit_backend
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+CONFIG_PATH = "./exchanges_ccxt_config.json"
+
+EXCHANGE_CLASSES: dict[str, type[Exchange]] = {
+    "binance": Binance,
+    "kraken": Kraken,
+    "bitfinex": Bitfinex,
+    "bybit": Bybit,
+    "paper": PaperExchange,
+}
+
+DEFAULT_RELOAD_CONFIG = {
+    "enabled": True,
+    # the config file is checked for changes this often
+    "poll_seconds": 2,
+    # replaced clients are closed once their calls are done, or after this long
+    "drain_timeout_seconds": 30,
+    # exchanges whose rebuild failed are tried again this often, until it succeeds or the file changes
+    "retry_seconds": 30,
+}
+
+DEFAULT_WARM_UP_CONFIG = {
+    "timeout_seconds": 15,
+    # e.g. {"kraken": 30}
+    "timeout_seconds_by_exchange": {},
+}
+
+
+def load_exchanges_config(path: str = CONFIG_PATH) -> dict[str, Any]:
+    with open(path, "r") as file:
+        return json.load(file)
+
+
+def build_exchange(config: Config, exchanges_ccxt_config: dict[str, Any], name: str) -> Exchange:
+    """Create the client of one exchange from its section of exchanges_ccxt_config.json"""
+    if name == "paper":
+        # in-memory venue without keys, see clients.paper
+        return PaperExchange(exchanges_ccxt_config[name], exchanges_ccxt_config["config"])
+    return EXCHANGE_CLASSES[name](
+        getattr(config, f"{name}_api_key"),
+        getattr(config, f"{name}_secret"),
+        exchanges_ccxt_config[name]["ccxt_config"],
+        exchanges_ccxt_config["config"],
+        config.extra_keys.get(name),
+    )
+
+
+class ExchangeRegistry:
+    """
+    The exchange clients of a process by name, rebuilt when exchanges_ccxt_config.json changes.
+    Replacement clients are created and warmed up in the background (see warm_up), then swapped
+    in with a single assignment; the replaced clients are closed once the calls that leased them are done.
+    Changing the "config" section replaces every client, changing an exchange's section only that one.
+    An exchange whose rebuild failed keeps its current client and is rebuilt again every retry_seconds,
+    the failure is reported in reload_failures.
+    """
+
+    def __init__(
+        self,
+        config: Config,
+        names: Optional[Iterable[str]] = None,
+        path: str = CONFIG_PATH,
+        on_swap: Optional[Callable[[str, Optional[Exchange], Optional[Exchange]], Awaitable[None]]] = None,
+    ):
+        """
+        :param names: exchanges this process uses, every supported exchange in the config file if None
+        :param on_swap: coroutine function called as on_swap(name, old, new) after a client was added,
+                        replaced or removed (old or new is None), e.g. to start the new client's streams
+        """
+        self.config = config
+        self.names = set(names) if names is not None else set(EXCHANGE_CLASSES)
+        self.path = path
+        self.on_swap = on_swap
+        self.exchanges_ccxt_config = load_exchanges_config(path)
+        self.reload_config = {**DEFAULT_RELOAD_CONFIG, **self.exchanges_ccxt_config["config"].get("reload", {})}
+        self._exchanges: dict[str, Exchange] = {
+            name: build_exchange(config, self.exchanges_ccxt_config, name)
+            for name in self._configured(self.exchanges_ccxt_config)
+        }
+        self._leases: dict[Exchange, int] = {}
+        self._lock = threading.Lock()
+        self._mtime = self._file_mtime()
+        self._task: Optional[asyncio.Task] = None
+        self._retiring: set[asyncio.Task] = set()
+        # warm-up threads still running, by client: a client is only closed once its thread is done
+        self._warming: dict[Exchange, asyncio.Future] = {}
+        self.warm_up_report: dict[str, dict[str, Any]] = {}
+        self.reload_failures: dict[str, dict[str, Any]] = {}
+        self._retry_at = 0.0
+
+    def _configured(self, exchanges_ccxt_config: dict[str, Any]) -> list[str]:
+        return [name for name in EXCHANGE_CLASSES if name in self.names and name in exchanges_ccxt_config]
+
+    def _file_mtime(self) -> Optional[float]:
+        try:
+            return os.stat(self.path).st_mtime
+        except OSError:
+            return None
+
+    def exchanges(self) -> list[Exchange]:
+        """The current clients"""
+        return list(self._exchanges.values())
+
+    def get(self, name: str) -> Optional[Exchange]:
+        return self._exchanges.get(name)
+
+    @contextlib.asynccontextmanager
+    async def lease(self, exchange: Exchange) -> AsyncIterator[Exchange]:
+        """Keep the client open while it is used, even if it is replaced in the meantime"""
+        with self._lock:
+            self._leases[exchange] = self._leases.get(exchange, 0) + 1
+        try:
+            yield exchange
+        finally:
+            with self._lock:
+                self._leases[exchange] -= 1
+                if not self._leases[exchange]:
+                    del self._leases[exchange]
+
+    def _changed(self, exchanges_ccxt_config: dict[str, Any]) -> set[str]:
+        """Exchanges to build (new or changed) or remove after a config change"""
+        old, new = self.exchanges_ccxt_config, exchanges_ccxt_config
+        names = set(self._configured(old)) | set(self._configured(new))
+        if old.get("config") != new.get("config"):
+            return names
+        # the clients of failed rebuilds still run with their previous section
+        return {name for name in names if old.get(name) != new.get(name) or name in self.reload_failures}
+
+    async def _warm_up(self, name: str, exchange: Exchange, exchanges_ccxt_config: dict[str, Any]) -> dict[str, Any]:
+        """
+        Warm up a client within the timeout of the given config. A thread can't be stopped: after a
+        timeout it keeps running in the background until its requests time out (see _close_after_warm_up).
+        """
+        warm_up_config = {**DEFAULT_WARM_UP_CONFIG, **exchanges_ccxt_config["config"].get("warm_up", {})}
+        timeout = warm_up_config["timeout_seconds_by_exchange"].get(name, warm_up_config["timeout_seconds"])
+        start = time.monotonic()
+        thread = asyncio.ensure_future(asyncio.to_thread(exchange.warm_up))
+        self._warming[exchange] = thread
+        thread.add_done_callback(lambda _: self._warming.pop(exchange, None))
+        try:
+            timings = await asyncio.wait_for(asyncio.shield(thread), timeout)
+            report = {"status": "ok", **timings}
+        except asyncio.TimeoutError:
+            # the exchange is still usable, whatever is missing is loaded on first use
+            logger.warning(f"Warm-up of {name} timed out after {timeout}s")
+            report = {"status": "timeout"}
+        except Exception as e:
+            logger.warning(f"Warm-up of {name} failed: {e}")
+            report = {"status": "failed", "error": str(e)}
+        report["total_ms"] = (time.monotonic() - start) * 1000
+        return report
+
+    async def warm_up(self) -> dict[str, dict[str, Any]]:
+        """Warm up every client concurrently, each within its timeout, and report the timings"""
+        exchanges = dict(self._exchanges)
+        reports = await asyncio.gather(
+            *(self._warm_up(name, exchange, self.exchanges_ccxt_config) for name, exchange in exchanges.items())
+        )
+        self.warm_up_report.update(zip(exchanges, reports, strict=True))
+        logger.info(f"Warmed up exchanges: {self.warm_up_report}")
+        return self.warm_up_report
+
+    async def _prepare(self, exchanges_ccxt_config: dict[str, Any], name: str) -> Exchange:
+        """Create a replacement client and warm it up"""
+        exchange = await asyncio.to_thread(build_exchange, self.config, exchanges_ccxt_config, name)
+        report = await self._warm_up(name, exchange, exchanges_ccxt_config)
+        if report["status"] != "ok":
+            self._spawn(self._close_after_warm_up(exchange))
+            raise Exception(f"warm-up {report['status']}")
+        self.warm_up_report[name] = report
+        return exchange
+
+    async def reload(self) -> None:
+        """Apply the config file if it changed since it was last loaded"""
+        exchanges_ccxt_config = await asyncio.to_thread(load_exchanges_config, self.path)
+        changed = self._changed(exchanges_ccxt_config)
+        if not changed:
+            self.exchanges_ccxt_config = exchanges_ccxt_config
+            return
+        logger.info(f"Exchange config changed, rebuilding {sorted(changed)}")
+        rate_limit_config = exchanges_ccxt_config["config"].get("rate_limit")
+        if rate_limit_config != self.exchanges_ccxt_config["config"].get("rate_limit"):
+            configure_rate_limit_backend(self.config.conn_info, rate_limit_config)
+
+        configured = set(self._configured(exchanges_ccxt_config))
+        to_build = sorted(changed & configured)
+        built = await asyncio.gather(
+            *(self._prepare(exchanges_ccxt_config, name) for name in to_build),
+            return_exceptions=True,
+        )
+        exchanges = dict(self._exchanges)
+        for name, exchange in zip(to_build, built, strict=True):
+            if isinstance(exchange, BaseException):
+                # keep serving with the old client, the rebuild is retried
+                logger.error(f"Failed to rebuild {name}, keeping the current client: {exchange}")
+                failure = self.reload_failures.get(name, {"attempts": 0})
+                self.reload_failures[name] = {"error": str(exchange), "attempts": failure["attempts"] + 1}
+                continue
+            exchanges[name] = exchange
+            self.reload_failures.pop(name, None)
+        for name in changed - configured:
+            exchanges.pop(name, None)
+            self.reload_failures.pop(name, None)
+
+        swaps = [(name, self._exchanges.get(name), exchanges.get(name)) for name in sorted(changed)]
+        swaps = [(name, old, new) for name, old, new in swaps if old is not new]
+        # readers see either the old or the new set of clients, never a mix
+        self._exchanges = exchanges
+        self.exchanges_ccxt_config = exchanges_ccxt_config
+        self.reload_config = {**DEFAULT_RELOAD_CONFIG, **exchanges_ccxt_config["config"].get("reload", {})}
+        self._retry_at = time.monotonic() + self.reload_config["retry_seconds"]
+        for name, old, new in swaps:
+            self._spawn(self._retire(name, old, new))
+
+    def _spawn(self, coro: Awaitable[None]) -> None:
+        """Run a cleanup in the background, close() waits for it"""
+        task = asyncio.get_running_loop().create_task(coro)
+        self._retiring.add(task)
+        task.add_done_callback(self._retiring.discard)
+
+    async def _close_after_warm_up(self, exchange: Exchange) -> None:
+        """Close a client that was never swapped in, once its warm-up thread is done with it"""
+        thread = self._warming.get(exchange)
+        if thread is not None:
+            await asyncio.gather(thread, return_exceptions=True)
+        await exchange.close()
+
+    async def _retire(self, name: str, old: Optional[Exchange], new: Optional[Exchange]) -> None:
+        if self.on_swap is not None:
+            try:
+                await self.on_swap(name, old, new)
+            except Exception as e:
+                logger.error(f"Failed to start the new {name} client: {e}")
+        if old is None:
+            return
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.reload_config["drain_timeout_seconds"]
+        while self._leases.get(old) and loop.time() < deadline:
+            await asyncio.sleep(0.05)
+        if self._leases.get(old):
+            logger.warning(f"Closing the replaced {name} client with calls still in flight")
+        await old.close()
+        logger.info(f"Replaced the {name} client")
+
+    async def watch(self) -> None:
+        """Reload whenever the config file changes (or a failed rebuild is due again), until cancelled"""
+        while True:
+            await asyncio.sleep(self.reload_config["poll_seconds"])
+            mtime = self._file_mtime()
+            file_changed = mtime is not None and mtime != self._mtime
+            retry_due = bool(self.reload_failures) and time.monotonic() >= self._retry_at
+            if not file_changed and not retry_due:
+                continue
+            if file_changed:
+                self._mtime = mtime
+            try:
+                await self.reload()
+            except Exception as e:
+                logger.error(f"Failed to reload {self.path}: {e}")
+
+    def start(self) -> Optional[asyncio.Task]:
+        """Start watching the config file on the running event loop"""
+        if not self.reload_config["enabled"]:
+            return None
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.watch())
+        return self._task
+
+    async def close(self) -> None:
+        """Stop watching and close every client, must run on the loop that used them"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await asyncio.gather(*self._retiring, return_exceptions=True)
+        # warm-up threads that timed out still use their clients
+        await asyncio.gather(*self._warming.values(), return_exceptions=True)
+        await asyncio.gather(*(exchange.close() for exchange in self.exchanges()), return_exceptions=True)
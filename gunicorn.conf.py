@@ -0,0 +1,32 @@
+# Production serving for app.py:
+#   gunicorn -c gunicorn.conf.py app:app
+#
+# Every worker process imports app.py itself (no preload), so it owns its exchange clients,
+# database pool and one long-lived event loop that all async views of that worker run on.
+# Exchange REST calls are blocking, so throughput scales with the number of workers.
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "gthread"
+threads = int(os.getenv("WEB_THREADS", "1"))
+timeout = int(os.getenv("WEB_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+preload_app = False
+accesslog = "-"
+
+
+def post_worker_init(worker):
+    from app import start_streams
+    from async_runtime import get_loop_thread
+
+    get_loop_thread().start()
+    start_streams()
+
+
+def worker_exit(server, worker):
+    from app import shutdown
+
+    shutdown()
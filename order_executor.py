@@ -0,0 +1,167 @@
+import argparse
+import asyncio
+import json
+import logging
+from typing import Any, Optional
+
+import psycopg
+from dotenv import load_dotenv
+
+import order_services
+from clients.binance import Binance
+from clients.bitfinex import Bitfinex
+from clients.bybit import Bybit
+from clients.exchange import Exchange
+from clients.kraken import Kraken
+from clients.nonce import configure_nonce_store
+from clients.rate_limit import configure_rate_limit_backend
+from clients.sessions import close_shared_sessions
+from config import Config
+from database.models import OrderNotification
+from database.pool import close_async_pools, close_pools
+from loggers import setup_logging
+from parameters import add_common_args
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ORDER_EXECUTOR_CONFIG = {
+    # wait this long after a notification for the rest of a burst of inserts
+    "debounce_ms": 50,
+    # submit open orders of every exchange at least this often, even without notifications
+    "sweep_seconds": 30,
+    "reconnect_delay_seconds": 1,
+    "max_reconnect_delay_seconds": 30,
+}
+
+
+class OrderExecutor:
+    """
+    Submits new orders as soon as they are inserted instead of waiting for a POST to /create_order.
+    A trigger (see database/migrations) notifies OrderNotification.CHANNEL with the market code of every
+    new order, which wakes the matching exchange; after debounce_ms all its open orders are submitted
+    in one batch with order_services.create_order. Every exchange is swept every sweep_seconds regardless, in case
+    a notification got lost while the listening connection was down.
+    """
+
+    def __init__(self, config: Config, exchanges: list[Exchange], executor_config: Optional[dict[str, Any]] = None):
+        self.config = config
+        self.exchanges = exchanges
+        self.executor_config = {**DEFAULT_ORDER_EXECUTOR_CONFIG, **(executor_config or {})}
+        self._wakeups = {exchange.market_code: asyncio.Event() for exchange in exchanges}
+
+    def notify(self, market_code: str) -> None:
+        """Wake the exchange of the market code, every exchange for an empty payload"""
+        if not market_code:
+            for wakeup in self._wakeups.values():
+                wakeup.set()
+        elif market_code in self._wakeups:
+            self._wakeups[market_code].set()
+
+    async def listen(self) -> None:
+        """Forward notifications to the exchanges until cancelled, reconnecting with backoff"""
+        delay = self.executor_config["reconnect_delay_seconds"]
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(self.config.conn_info, autocommit=True) as conn:
+                    await conn.execute(f"LISTEN {OrderNotification.CHANNEL}")
+                    logger.info(f"Listening on {OrderNotification.CHANNEL}")
+                    delay = self.executor_config["reconnect_delay_seconds"]
+                    # orders inserted while no connection was listening
+                    self.notify("")
+                    while True:
+                        async for notify in conn.notifies(timeout=self.executor_config["sweep_seconds"]):
+                            self.notify(notify.payload)
+                        # no notification for a while: make sure the connection is still alive
+                        await conn.execute("SELECT 1")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Order notifications disconnected, reconnecting in {delay}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.executor_config["max_reconnect_delay_seconds"])
+
+    async def run_exchange(self, exchange: Exchange) -> None:
+        """Submit the exchange's open orders on every notification (debounced) and every sweep"""
+        wakeup = self._wakeups[exchange.market_code]
+        while True:
+            try:
+                await asyncio.wait_for(wakeup.wait(), self.executor_config["sweep_seconds"])
+                await asyncio.sleep(self.executor_config["debounce_ms"] / 1000)
+            except asyncio.TimeoutError:
+                logger.debug(f"Sweeping open orders of {exchange.market_code}")
+            wakeup.clear()
+            await order_services.create_order(self.config, exchange)
+
+    async def run(self) -> None:
+        for exchange in self.exchanges:
+            await exchange.start_balance_stream()
+            await exchange.start_ticker_stream()
+            await exchange.start_order_book_stream()
+            await exchange.start_endpoint_probe()
+            await exchange.start_clock_sync()
+        await asyncio.gather(self.listen(), *(self.run_exchange(exchange) for exchange in self.exchanges))
+
+
+if __name__ == "__main__":
+    # Load environment variables from .env file
+    load_dotenv()
+    setup_logging()
+    logger = logging.getLogger(__name__)
+
+    parser = argparse.ArgumentParser()
+    parser = add_common_args(parser)
+    args = parser.parse_args()
+    env_name = args.env_name
+    config = Config(env_name=env_name)
+    logger.info(f"Running in {env_name} environment")
+
+    # Read ccxt config from JSON file
+    file_path = "./exchanges_ccxt_config.json"
+    with open(file_path, "r") as file:
+        exchanges_ccxt_config = json.load(file)
+
+    configure_rate_limit_backend(config.conn_info, exchanges_ccxt_config["config"].get("rate_limit"))
+    configure_nonce_store(config.conn_info)
+
+    binance = Binance(
+        config.binance_api_key,
+        config.binance_secret,
+        exchanges_ccxt_config["binance"]["ccxt_config"],
+        exchanges_ccxt_config["config"],
+        config.extra_keys["binance"],
+    )
+    kraken = Kraken(
+        config.kraken_api_key,
+        config.kraken_secret,
+        exchanges_ccxt_config["kraken"]["ccxt_config"],
+        exchanges_ccxt_config["config"],
+        config.extra_keys["kraken"],
+    )
+    bitfinex = Bitfinex(
+        config.bitfinex_api_key,
+        config.bitfinex_secret,
+        exchanges_ccxt_config["bitfinex"]["ccxt_config"],
+        exchanges_ccxt_config["config"],
+        config.extra_keys["bitfinex"],
+    )
+    bybit = Bybit(
+        config.bybit_api_key,
+        config.bybit_secret,
+        exchanges_ccxt_config["bybit"]["ccxt_config"],
+        exchanges_ccxt_config["config"],
+        config.extra_keys["bybit"],
+    )
+    exchanges = [binance, kraken, bitfinex, bybit]
+    executor = OrderExecutor(config, exchanges, exchanges_ccxt_config["config"].get("order_executor"))
+
+    async def close_exchanges():
+        await asyncio.gather(*(exchange.close() for exchange in exchanges), return_exceptions=True)
+        await close_shared_sessions()
+        await close_async_pools()
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(executor.run())
+    finally:
+        loop.run_until_complete(close_exchanges())
+        close_pools()
@@ -1,12 +1,19 @@
+import asyncio
+import dataclasses
 import logging
+import os
+import socket
 import traceback
-import psycopg
+from decimal import Decimal
+from typing import Callable, Optional
 
 from dotenv import load_dotenv
 
 from clients.exchange import Exchange
 from config import Config
-from database.models import Order, Trade
+from database.models import AsyncOrder, AsyncTrade
+from database.records import OrderRecord, TradeRecord
+from database.pool import async_connection
 from enums import OrderSideValues, OrderTypeValues
 from error_message import (
     INSUFFICIENT_BALANCE_BUY_ERROR,
@@ -18,12 +25,19 @@ from error_message import (
     VALIDATION_ERROR,
 )
 from email_services import send_insufficient_funds_email
-from clients.exchange_utils import format_pair
+from clients.exchange_utils import format_pair, to_ccxt_number, to_decimal
 
 # Load environment variables from .env file
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+DEFAULT_ORDER_QUEUE_CONFIG = {
+    "batch_size": 20,
+    # an order claimed by a worker that died is picked up by another one after this
+    "lease_seconds": 60,
+}
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
 
 def validate_order(exchange: Exchange, pair: str, amount: float, price: float = None):
     market = exchange._api.market(pair)
@@ -87,17 +101,17 @@ def validate_order(exchange: Exchange, pair: str, amount: float, price: float =
 
 def process_order(
     exchange: Exchange,
-    order,
+    order: OrderRecord,
     free_balance: dict,
     base_currency: str,
     quote_currency: str,
     average_price: float = None,
 ):
-    side = order["side"]
-    order_type = order["type"]
-    amount = order["amount"]
-    price = order.get("price")
-    value = order.get("value")
+    side = order.side
+    order_type = order.type
+    amount = to_ccxt_number(order.amount)
+    price = to_ccxt_number(order.price)
+    value = to_ccxt_number(order.value)
 
     try:
         balance = None
@@ -105,13 +119,21 @@ def process_order(
         balance_coin = None
         if side == OrderSideValues.BUY:
             if order_type == OrderTypeValues.MARKET:
+                # walk the order book instead of assuming the whole amount fills at the average price
+                pair = format_pair(base_currency, quote_currency, exchange.divider)
                 balance = free_balance.get(quote_currency, -1)
-                total_order_value = value if value else amount * average_price
+                estimate = None if value else exchange.estimate_fill(pair, side, amount)
+                if value:
+                    total_order_value = value
+                elif estimate is not None and estimate.complete:
+                    total_order_value = estimate.cost
+                else:
+                    total_order_value = amount * average_price
                 balance_coin = quote_currency
                 if balance < total_order_value:
                     raise Exception(f"{INSUFFICIENT_BALANCE_BUY_ERROR}: {order}")
 
-                return exchange.create_order(
+                order_info = exchange.create_order(
                     symbol=base_currency,
                     type=order_type,
                     side=side,
@@ -126,7 +148,7 @@ def process_order(
 
                 if balance < total_order_value:
                     raise Exception(f"{INSUFFICIENT_BALANCE_BUY_ERROR}: {order}")
-                return exchange.create_order(
+                order_info = exchange.create_order(
                     symbol=base_currency,
                     type=order_type,
                     side=side,
@@ -141,7 +163,7 @@ def process_order(
             balance_coin = base_currency
             if balance < total_order_value:
                 raise Exception(f"{INSUFFICIENT_BALANCE_SELL_ERROR}: {order}")
-            return exchange.create_order(
+            order_info = exchange.create_order(
                 symbol=base_currency,
                 type=order_type,
                 side=side,
@@ -150,6 +172,10 @@ def process_order(
             )
         else:
             raise Exception(f"{UNKNOWN_ORDER_SIDE_ERROR}: {order}")
+
+        if order_info:
+            exchange.reserve_balance(balance_coin, total_order_value)
+        return order_info
     except Exception as e:
         if INSUFFICIENT_BALANCE_BUY_ERROR in str(e) or INSUFFICIENT_BALANCE_SELL_ERROR in str(e):
             send_insufficient_funds_email(order, exchange._api.name, balance, total_order_value, balance_coin)
@@ -157,106 +183,258 @@ def process_order(
         raise e
 
 
-async def create_order(config: Config, exchange: Exchange):
+def _report_order_result(on_result: Optional[Callable[[dict], None]], order: OrderRecord, order_info: Optional[dict]) -> None:
+    """Report the outcome of a single order to an optional result callback"""
+    if on_result is None:
+        return
+    if not order_info:
+        on_result({"order_id": order.id, "status": "failed"})
+        return
+    on_result(
+        {
+            "order_id": order.id,
+            "status": "success",
+            "external_order_id": order_info["id"],
+            "order_status": order_info["status"],
+            "filled": order_info["filled"],
+        }
+    )
+
+
+async def _claim_orders(config: Config, exchange: Exchange, queue_config: dict, exclude_ids: list[int]) -> list[OrderRecord]:
+    async with async_connection(config.conn_info) as conn:
+        async with conn.cursor() as cur:
+            return await AsyncOrder.claim_orders(
+                cur,
+                market_code=exchange.market_code,
+                worker_id=WORKER_ID,
+                limit=queue_config["batch_size"],
+                lease_seconds=queue_config["lease_seconds"],
+                exclude_ids=exclude_ids,
+            )
+
+
+async def create_order(config: Config, exchange: Exchange, on_result: Optional[Callable[[dict], None]] = None):
+    """
+    Create all open, not yet sent orders of the exchange's market on the exchange.
+
+    Orders are claimed in batches (see database.models.AsyncOrder.claim_orders), so any number of processes can run this
+    for the same market concurrently without submitting an order twice. Every placed order is
+    committed right away; claims of orders that weren't placed are released after their batch.
+
+    :param on_result: optional callback invoked with the result of every single order
+                      as soon as it has been processed
+    """
+    queue_config = {**DEFAULT_ORDER_QUEUE_CONFIG, **exchange.config.get("order_queue", {})}
+    attempted_ids: list[int] = []
     try:
-        with psycopg.connect(config.conn_info) as conn:
-            with conn.cursor() as cur:
-                orders = Order.get_all_orders(
-                    cur,
-                    has_external_id=False,
-                    status="open",
-                    market_code=exchange.market_code,
-                )
-                for order in orders:
-                    quote_currency = exchange.quote_currency
-                    base_currency = order["coin_code"]
-
-                    # total balance - used balance = free balance
-                    # used balance: money on hold, locked, frozen, or pending, by currency
-                    free_balance = exchange.fetch_free_balance()
-                    pair = format_pair(base_currency, quote_currency, exchange.divider)
-
-                    ticket = exchange.fetch_ticker(pair)
-                    if not ticket:
-                        raise Exception(f"{MISSING_TICKER_ERROR}: {order}")
-
-                    average_price = ticket["average"]
-                    # order, average_price, calculated_amount = prepare_order(order, pair, exchange)
-
-                    if not validate_order(exchange, pair, order["amount"], order["price"]):
-                        raise Exception(f"{VALIDATION_ERROR}: {order}")
-
-                    # process order
-                    order_info = process_order(exchange, order, free_balance, base_currency, quote_currency, average_price)
-                    if not order_info:
-                        continue
-
-                    Order.update_order_by_id(
-                        cur=cur,
-                        external_order_id=order_info["id"],
-                        id=order["id"],
-                        filled_amount=order_info["filled"],
-                        status=order_info["status"],
-                    )
-                    trades_for_order = order_info.get("trades")
-                    if trades_for_order:
-                        for trade in trades_for_order:
-                            Trade.insert_trade_if_not_exists(
-                                cur,
-                                trade_id=trade["id"],
-                                price=trade["price"],
-                                quantity=trade["amount"],
-                                timestamp=order_info["datetime"],
-                                market_id=1,  # hardcode market id
-                                order_id=order["id"],
-                            )
-        return True
+        while True:
+            orders = await _claim_orders(config, exchange, queue_config, attempted_ids)
+            if not orders:
+                return True
+            attempted_ids.extend(order.id for order in orders)
+            try:
+                await _place_orders(config, exchange, orders, on_result, queue_config["lease_seconds"])
+            finally:
+                async with async_connection(config.conn_info) as conn:
+                    async with conn.cursor() as cur:
+                        await AsyncOrder.release_claims(cur, [order.id for order in orders], WORKER_ID)
     except Exception as e:
         logger.error(f"Failed to create orders: {e}")
         traceback.print_exc()
         return False
 
 
-async def update_order(config: Config, exchange: Exchange):
+def place_order(exchange: Exchange, order: OrderRecord) -> Optional[dict]:
+    """
+    Check an order against the free balance, the price and the market limits and create it on the exchange.
+    Blocking (REST fallbacks of the streams, lazy market loading, rate limiter waits): runs in a worker thread.
+    """
+    quote_currency = exchange.quote_currency
+    base_currency = order.coin_code
+
+    # total balance - used balance = free balance
+    # used balance: money on hold, locked, frozen, or pending, by currency
+    # served from the live balance stream, REST only when the stream is stale
+    # the order is placed with the account that holds the most of the currency it spends
+    free_balances = exchange.get_free_balances()
+    spent_currency = quote_currency if order.side == OrderSideValues.BUY else base_currency
+    account = exchange.accounts.account_with_most(spent_currency, free_balances)
+    free_balance = free_balances[account]
+    pair = format_pair(base_currency, quote_currency, exchange.divider)
+
+    # served from the live ticker stream, REST only when the price is stale
+    ticket = exchange.get_ticker(pair)
+    if not ticket:
+        raise Exception(f"{MISSING_TICKER_ERROR}: {order}")
+
+    average_price = ticket["average"]
+    # order, average_price, calculated_amount = prepare_order(order, pair, exchange)
+
+    if not order.amount and order.value and order.side == OrderSideValues.BUY and order.type == OrderTypeValues.MARKET:
+        # a value-only market buy is sized by walking the asks, at the average price while there is no book
+        value = to_ccxt_number(order.value)
+        amount = exchange.estimate_amount(pair, order.side, value) or value / average_price
+        order = dataclasses.replace(order, amount=Decimal(str(amount)))
+
+    if not validate_order(exchange, pair, to_ccxt_number(order.amount), to_ccxt_number(order.price)):
+        raise Exception(f"{VALIDATION_ERROR}: {order}")
+
+    # process order
+    with exchange.accounts.use(account):
+        return process_order(exchange, order, free_balance, base_currency, quote_currency, average_price)
+
+
+async def _place_orders(
+    config: Config,
+    exchange: Exchange,
+    orders: list[OrderRecord],
+    on_result: Optional[Callable[[dict], None]],
+    lease_seconds: float,
+) -> None:
+    exchange.ticker_cache.track(format_pair(order.coin_code, exchange.quote_currency, exchange.divider) for order in orders)
+    for order in orders:
+        # the batch may have outlived its lease, another worker could be placing the order already
+        async with async_connection(config.conn_info) as conn:
+            async with conn.cursor() as cur:
+                leased = await AsyncOrder.extend_claim(cur, order.id, WORKER_ID, lease_seconds)
+        if not leased:
+            logger.warning(f"Lease on order {order.id} expired, skipping it")
+            continue
+
+        # placed from a worker thread: the event loop stays free for the exchange streams
+        # and can carry websocket order entry (see Exchange.create_order)
+        order_info = await asyncio.to_thread(place_order, exchange, order)
+        _report_order_result(on_result, order, order_info)
+        if not order_info:
+            continue
+
+        # the order update and its trades are sent to the database in one round trip
+        async with async_connection(config.conn_info) as conn:
+            async with conn.pipeline(), conn.cursor() as cur:
+                await AsyncOrder.update_order_by_id(
+                    cur=cur,
+                    external_order_id=order_info["id"],
+                    id=order.id,
+                    filled_amount=order_info["filled"],
+                    status=order_info["status"],
+                )
+                trades_for_order = order_info.get("trades")
+                if trades_for_order:
+                    await AsyncTrade.insert_trades(
+                        cur,
+                        [
+                            TradeRecord.from_ccxt(trade, order.id, timestamp=order_info["datetime"])
+                            for trade in trades_for_order
+                        ],
+                    )
+
+
+def _order_changed(order: OrderRecord, order_info: dict) -> bool:
+    filled = order_info.get("filled")
+    if order_info.get("status") != order.status:
+        return True
+    return filled is not None and to_decimal(filled) != to_decimal(order.filled_amount or 0)
+
+
+def reconcile_orders(exchange: Exchange, pair: str, orders: list[OrderRecord]) -> list[tuple[OrderRecord, dict]]:
+    """
+    Match the open database orders of one pair against one listing of the exchange's open orders
+    and one of its closed orders since the oldest of them. Only orders missing from both
+    listings (or all of them, if the exchange can't list closed orders) are fetched one by one.
+
+    :return: (order, order_info) for every order the exchange returned information for
+    """
+    exchange_orders: dict[str, dict] = {}
+    open_orders = exchange.fetch_open_orders(pair)
+    if open_orders is not None:
+        closed_orders = exchange.fetch_closed_orders(pair, since=min(order.created_on for order in orders))
+        for order_info in open_orders + (closed_orders or []):
+            exchange_orders[order_info["id"]] = order_info
+
+    results = []
+    for order in orders:
+        order_info = exchange_orders.get(order.external_order_id)
+        if order_info is None:
+            order_info = exchange.fetch_order(id=order.external_order_id, pair=pair)
+        if order_info is not None:
+            results.append((order, order_info))
+    return results
+
+
+async def update_order(config: Config, exchange: Exchange, on_result: Optional[Callable[[dict], None]] = None):
+    """
+    Sync status, filled amount and trades of all open, sent orders of the exchange's market.
+    Orders are reconciled per pair in bulk (see reconcile_orders), up to reconcile "concurrency" pairs
+    at a time; only orders whose status or filled amount changed are written and have their trades fetched.
+
+    :param on_result: optional callback invoked with the result of every single order
+                      as soon as it has been processed
+    """
     try:
-        with psycopg.connect(config.conn_info) as conn:
-            with conn.cursor() as cur:
-                orders = Order.get_all_orders(
+        async with async_connection(config.conn_info) as conn:
+            async with conn.cursor() as cur:
+                orders = await AsyncOrder.get_all_orders(
                     cur,
                     has_external_id=True,
                     status="open",
                     market_code=exchange.market_code,
                 )
-                if orders:
-                    for order in orders:
-                        order_info = exchange.fetch_order(
-                            id=order["external_order_id"],
-                            pair=order["coin_code"] + "USDT",
-                        )
-                        trades_for_order = exchange.get_trades_for_order(
-                            order_id=order["external_order_id"],
-                            pair=order["coin_code"] + "USDT",
-                            since=order["created_on"],
-                        )
-                        if trades_for_order:
-                            for trade in trades_for_order:
-                                Trade.insert_trade_if_not_exists(
-                                    cur,
-                                    trade_id=trade["id"],
-                                    price=trade["price"],
-                                    quantity=trade["amount"],
-                                    timestamp=trade["datetime"],
-                                    market_id=1,  # hardcode market id
-                                    order_id=order["id"],
+        orders_by_pair: dict[str, list[OrderRecord]] = {}
+        for order in orders:
+            pair = format_pair(order.coin_code, exchange.quote_currency, exchange.divider)
+            orders_by_pair.setdefault(pair, []).append(order)
+
+        # pairs are reconciled concurrently, bounded so that one exchange doesn't use up its rate limit at once
+        semaphore = asyncio.Semaphore(exchange.reconcile_config["concurrency"])
+
+        async def update_pair(pair: str, pair_orders: list[OrderRecord]) -> None:
+            async with semaphore:
+                # exchange requests block, they run in a worker thread so that the event loop stays responsive
+                results = await asyncio.to_thread(reconcile_orders, exchange, pair, pair_orders)
+                changed = [(order, order_info) for order, order_info in results if _order_changed(order, order_info)]
+                trades_by_order: dict[str, list[dict]] = {}
+                if changed:
+                    since = min(order.created_on for order, _ in changed)
+                    trades = await asyncio.to_thread(exchange.fetch_my_trades, pair, since)
+                    if trades is not None:
+                        for trade in trades:
+                            trades_by_order.setdefault(trade["order"], []).append(trade)
+                    else:
+                        # the listing couldn't be paged to its end: fetch the trades of each order, an order
+                        # whose trades can't all be fetched isn't written and is synced again next time
+                        complete = []
+                        for order, order_info in changed:
+                            order_trades = await asyncio.to_thread(
+                                exchange.get_trades_for_order, order_info["id"], pair, order.created_on
+                            )
+                            if order_trades is None:
+                                logger.warning(f"Trades of order {order.id} incomplete, not updating it")
+                                continue
+                            trades_by_order[order_info["id"]] = order_trades
+                            complete.append((order, order_info))
+                        changed = complete
+
+                    async with async_connection(config.conn_info) as conn:
+                        async with conn.pipeline(), conn.cursor() as cur:
+                            for order, order_info in changed:
+                                trades_for_order = trades_by_order.get(order_info["id"])
+                                if trades_for_order:
+                                    await AsyncTrade.insert_trades(
+                                        cur, [TradeRecord.from_ccxt(trade, order.id) for trade in trades_for_order]
+                                    )
+
+                                await AsyncOrder.update_order_by_id(
+                                    cur=cur,
+                                    external_order_id=order_info["id"],
+                                    id=order.id,
+                                    filled_amount=order_info["filled"],
+                                    status=order_info["status"],
                                 )
+                for order, order_info in results:
+                    _report_order_result(on_result, order, order_info)
 
-                        Order.update_order_by_id(
-                            cur=cur,
-                            external_order_id=order_info["id"],
-                            id=order["id"],
-                            filled_amount=order_info["filled"],
-                            status=order_info["status"],
-                        )
+        await asyncio.gather(*(update_pair(pair, pair_orders) for pair, pair_orders in orders_by_pair.items()))
         return True
     except Exception as e:
         logger.error(f"Failed to update orders: {e}")
@@ -1,6 +1,7 @@
+import os
 from argparse import ArgumentParser
 
 
 def add_common_args(parser: ArgumentParser):
-    parser.add_argument("--env_name", help="Environment to run the script in", default="dev")
+    parser.add_argument("--env_name", help="Environment to run the script in", default=os.getenv("ENV_NAME", "dev"))
     return parser
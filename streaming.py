@@ -0,0 +1,118 @@
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, Iterator
+
+from async_runtime import get_loop_thread
+from clients.exchange import Exchange
+
+NDJSON = "ndjson"
+SSE = "sse"
+
+STREAM_MIMETYPES = {
+    NDJSON: "application/x-ndjson",
+    SSE: "text/event-stream",
+}
+
+ExchangeRunner = Callable[[Exchange, Callable[[dict], None]], Awaitable[bool]]
+
+
+def format_event(event: dict[str, Any], stream_format: str) -> str:
+    """
+    Serialize a single result event for the given stream format.
+
+    :param event: event to serialize, the "event" key is used as the SSE event name
+    :param stream_format: one of NDJSON or SSE
+    """
+    data = json.dumps(event, default=str)
+    if stream_format == SSE:
+        return f"event: {event.get('event', 'message')}\ndata: {data}\n\n"
+    return f"{data}\n"
+
+
+def stream_exchange_results(
+    runner: ExchangeRunner,
+    exchanges: list[Exchange],
+    stream_format: str,
+    success_message: str,
+) -> Iterator[str]:
+    """
+    Run the runner for every exchange concurrently and yield each order and exchange result
+    as soon as it completes, followed by a final summary event.
+
+    :param runner: coroutine function called as runner(exchange, on_result)
+    :param exchanges: exchanges to run the runner for
+    :param stream_format: one of NDJSON or SSE
+    :param success_message: message of the summary event when all exchanges succeeded
+    """
+    # Use the worker's long-lived loop when serving in production, a loop per response otherwise
+    loop_thread = get_loop_thread()
+    if loop_thread.running:
+        loop = None
+        run = loop_thread.run
+    else:
+        loop = asyncio.new_event_loop()
+        run = loop.run_until_complete
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def run_exchange(exchange: Exchange):
+        exchange_name = exchange.exchange_name
+
+        def on_result(result: dict):
+            queue.put_nowait({"event": "order", "exchange": exchange_name, **result})
+
+        # degraded exchanges fail fast instead of holding back the stream
+        if getattr(exchange, "is_degraded", False):
+            queue.put_nowait({"event": "exchange", "exchange": exchange_name, "status": "degraded"})
+            return
+        try:
+            status = await runner(exchange, on_result)
+        except Exception:
+            status = False
+        queue.put_nowait({"event": "exchange", "exchange": exchange_name, "status": "success" if status else "failed"})
+
+    async def next_event(tasks: list[asyncio.Task]):
+        getter = asyncio.ensure_future(queue.get())
+        pending = [task for task in tasks if not task.done()]
+        await asyncio.wait([getter, *pending], return_when=asyncio.FIRST_COMPLETED)
+        if getter.done():
+            return getter.result()
+        getter.cancel()
+        return None
+
+    async def start():
+        return [asyncio.ensure_future(run_exchange(exchange)) for exchange in exchanges]
+
+    results = []
+    tasks: list[asyncio.Task] = []
+    try:
+        tasks = run(start())
+        while not (all(task.done() for task in tasks) and queue.empty()):
+            event = run(next_event(tasks))
+            if event is None:
+                continue
+            if event["event"] == "exchange":
+                results.append(event)
+            yield format_event(event, stream_format)
+
+        success = all(result["status"] == "success" for result in results)
+        yield format_event(
+            {
+                "event": "summary",
+                "status": "success" if success else "partial_success",
+                "message": success_message if success else "Some orders failed",
+                "results": [{"exchange": r["exchange"], "status": r["status"]} for r in results],
+            },
+            stream_format,
+        )
+    finally:
+        # the client may disconnect before all exchanges finished
+        if tasks:
+            run(_cancel(tasks))
+        if loop is not None:
+            loop.close()
+
+
+async def _cancel(tasks: list[asyncio.Task]) -> None:
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,97 @@
+import os
+import sys
+from unittest.mock import patch
+
+import ccxt
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from clients.binance import Binance
+from clients.rate_limit import MemoryRateLimitBackend
+from config import parse_api_keys
+
+EXTRA_KEYS = [("READ_KEY", "SECRET", "main"), ("SUB_KEY", "SECRET", "sub")]
+
+
+@pytest.fixture
+def binance():
+    return Binance(api_key="MAIN_KEY", secret="SECRET", extra_keys=EXTRA_KEYS)
+
+
+class TestAccounts:
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_reads_are_spread_over_the_keys_of_the_account(self, binance: Binance):
+        main, read = binance.accounts.accounts["main"].keys
+        assert binance._private_api(write=True) is main.api
+        main.pending = 1
+        assert binance._private_api() is read.api
+        assert binance._private_api(write=True) is main.api
+        with binance.accounts.use("sub"):
+            assert binance._private_api(write=True).apiKey == "SUB_KEY"
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_listings_are_collected_from_every_account(self, binance: Binance):
+        def fetch_open_orders(self, *args):
+            return [{"id": self.apiKey}]
+
+        with patch.object(ccxt.binance, "fetch_open_orders", autospec=True, side_effect=fetch_open_orders):
+            orders = binance.fetch_open_orders("UNI/USDT")
+            with binance.accounts.use("sub"):
+                sub_orders = binance.fetch_open_orders("UNI/USDT")
+
+        assert [order["id"] for order in orders] == ["MAIN_KEY", "SUB_KEY"]
+        assert sub_orders == [{"id": "SUB_KEY"}]
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_orders_are_looked_up_in_every_account(self, binance: Binance):
+        def fetch_order(self, id, *args):
+            if self.apiKey != "SUB_KEY":
+                raise ccxt.OrderNotFound(id)
+            return {"id": id, "status": "open"}
+
+        with patch.object(ccxt.binance, "fetch_order", autospec=True, side_effect=fetch_order):
+            assert binance.fetch_order("1", "UNI/USDT") == {"id": "1", "status": "open"}
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_orders_go_to_the_account_with_the_funds(self, binance: Binance):
+        free_balances = {"main": {"USDT": 10.0, "UNI": 5.0}, "sub": {"USDT": 500.0}}
+        assert binance.accounts.account_with_most("USDT", free_balances) == "sub"
+        assert binance.accounts.account_with_most("UNI", free_balances) == "main"
+        assert binance.accounts.account_with_most("XRP", free_balances) == "main"
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_request_weight_is_shared_by_the_keys_and_order_budgets_are_not(self, binance: Binance):
+        main, read = binance.accounts.accounts["main"].keys
+        sub = binance.accounts.accounts["sub"].keys[0]
+        assert read.rate_limiter.ip_limiter is main.rate_limiter
+        assert sub.rate_limiter.ip_throttle is main.rate_limiter.ip_throttle
+        assert [budget["name"] for budget in sub.rate_limiter.budgets] == ["orders"]
+
+        backend = MemoryRateLimitBackend()
+        sub.rate_limiter.acquire(backend, "order", "POST", 1)
+        read.rate_limiter.acquire(backend, "ticker/price", "GET", 1)
+        buckets = {bucket for bucket, _ in backend._used}
+        assert buckets == {"binance:ip:requests", f"binance:{sub.rate_limiter.account}:orders"}
+
+
+class TestParseApiKeys:
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_keys_without_an_account_belong_to_the_main_account(self):
+        assert parse_api_keys("READ_KEY:SECRET, SUB_KEY:SECRET:sub,") == EXTRA_KEYS
+        assert parse_api_keys(None) == []
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_malformed_entries_are_rejected_without_their_secret(self):
+        with pytest.raises(ValueError, match="Entry 2 of BINANCE_PROD_EXTRA_KEYS") as error:
+            parse_api_keys("READ_KEY:SECRET,SUB_KEY:TOP:SECRET:sub", "BINANCE_PROD_EXTRA_KEYS")
+        assert "TOP" not in str(error.value)
+        with pytest.raises(ValueError):
+            parse_api_keys("READ_KEY", "BINANCE_PROD_EXTRA_KEYS")
@@ -0,0 +1,61 @@
+import asyncio
+import contextvars
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from async_runtime import LoopThread
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+@pytest.fixture
+def loop_thread():
+    loop_thread = LoopThread(name="test-loop")
+    loop_thread.start()
+    yield loop_thread
+    loop_thread.stop()
+
+
+class TestLoopThread:
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_run_reuses_the_same_loop(self, loop_thread):
+        async def current_loop():
+            return asyncio.get_running_loop()
+
+        assert loop_thread.run(current_loop()) is loop_thread.run(current_loop()) is loop_thread.loop
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_run_carries_caller_context(self, loop_thread):
+        async def read_context():
+            return request_id.get(), threading.current_thread().name
+
+        request_id.set("abc")
+        assert loop_thread.run(read_context()) == ("abc", "test-loop")
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_run_raises_coroutine_exception(self, loop_thread):
+        async def fail():
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError):
+            loop_thread.run(fail())
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_stop_runs_shutdown_coroutine(self, loop_thread):
+        closed = []
+
+        async def shutdown():
+            closed.append(True)
+
+        loop_thread.stop(shutdown())
+        assert closed == [True]
+        assert not loop_thread.running
@@ -0,0 +1,159 @@
+import asyncio
+import os
+import sys
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backfill_trades import DEFAULT_BACKFILL_CONFIG, backfill, page_limit
+from clients.bybit import Bybit
+from clients.kraken import Kraken
+from clients.paper import PaperExchange
+
+CONFIG = SimpleNamespace(conn_info="")
+HOUR_MS = 3_600_000
+
+
+@asynccontextmanager
+async def fake_connection(conn_info):
+    yield MagicMock()
+
+
+@pytest.fixture
+def paper():
+    paper = PaperExchange({"prices": {"BTC": 50_000}, "fee_rate": 0, "seed": 1}, {"clock": {"since_margin_ms": 0}})
+    # five trades, one per hour over the last five hours
+    now = int(time.time() * 1000)
+    for hours_ago in range(5, 0, -1):
+        paper.create_order("BTC", "market", "buy", 0.1)
+        paper.trades[-1]["timestamp"] = now - hours_ago * HOUR_MS
+    return paper
+
+
+@pytest.fixture
+def database():
+    with (
+        patch("backfill_trades.async_connection", fake_connection),
+        patch("backfill_trades.AsyncOrder", new_callable=AsyncMock) as order_model,
+        patch("backfill_trades.AsyncTrade", new_callable=AsyncMock) as trade_model,
+        patch("backfill_trades.AsyncTradeBackfill", new_callable=AsyncMock) as checkpoints,
+    ):
+        order_model.get_traded_coins.return_value = [
+            ("BTC", datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=1))
+        ]
+        trade_model.copy_trades.side_effect = lambda cur, records: len(records)
+        checkpoints.get_watermark.return_value = None
+        yield SimpleNamespace(orders=order_model, trades=trade_model, checkpoints=checkpoints)
+
+
+class KrakenTradesHistory:
+    """ccxt's kraken fetch_my_trades without symbol: trades of every pair, newest first, 50 per request from an offset"""
+
+    def __init__(self, trades: list[dict]):
+        self.trades = trades
+        self.requests = []
+
+    def fetch_my_trades(self, symbol, since, limit, params):
+        self.requests.append(params)
+        matching = [trade for trade in self.trades if params["start"] < trade["timestamp"] / 1000 <= params["end"]]
+        matching.sort(key=lambda trade: trade["timestamp"], reverse=True)
+        return matching[params["ofs"] : params["ofs"] + 50]
+
+
+def copied_trade_ids(database) -> list[str]:
+    return [record.trade_id for call in database.trades.copy_trades.call_args_list for record in call.args[1]]
+
+
+class TestBackfill:
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_pages_are_loaded_once_and_checkpointed(self, paper: PaperExchange, database):
+        database.orders.get_order_ids_by_external_order_ids.side_effect = lambda cur, market_code, ids: {id: 1 for id in ids}
+
+        inserted = asyncio.run(backfill(CONFIG, [paper], backfill_config={"page_limit": 2}))
+
+        assert inserted == {"paper": 5}
+        assert sorted(copied_trade_ids(database)) == sorted(trade["id"] for trade in paper.trades)
+        watermarks = [call.args[4] for call in database.checkpoints.save_watermark.call_args_list]
+        assert watermarks == sorted(watermarks)
+        assert watermarks[-1] >= paper.trades[-1]["timestamp"]
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_resumes_from_the_watermark_in_windows(self, paper: PaperExchange, database):
+        database.checkpoints.get_watermark.return_value = paper.trades[2]["timestamp"] - 1
+        database.orders.get_order_ids_by_external_order_ids.side_effect = lambda cur, market_code, ids: {id: 1 for id in ids}
+
+        inserted = asyncio.run(backfill(CONFIG, [paper], backfill_config={"window_hours_by_exchange": {"paper": 1}}))
+
+        assert inserted == {"paper": 3}
+        assert copied_trade_ids(database) == [trade["id"] for trade in paper.trades[2:]]
+        # one request per hour between the watermark and now, three hours and a bit
+        assert database.checkpoints.save_watermark.await_count == 4
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_trades_of_unknown_orders_are_skipped(self, paper: PaperExchange, database):
+        known = paper.trades[0]["order"]
+        database.orders.get_order_ids_by_external_order_ids.side_effect = lambda cur, market_code, ids: {
+            id: 7 for id in ids if id == known
+        }
+
+        assert asyncio.run(backfill(CONFIG, [paper], symbols=["BTC"])) == {"paper": 1}
+        assert copied_trade_ids(database) == [paper.trades[0]["id"]]
+        assert asyncio.run(backfill(CONFIG, [paper], symbols=["ETH"])) == {"paper": 0}
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_page_size_is_capped_by_the_venue(self, paper: PaperExchange, database):
+        bybit = Bybit(api_key="APIKEY", secret="SECRET")
+        assert page_limit(DEFAULT_BACKFILL_CONFIG, bybit) == 100
+        assert page_limit({**DEFAULT_BACKFILL_CONFIG, "page_limit_by_exchange": {"bybit": 20}}, bybit) == 20
+        database.orders.get_order_ids_by_external_order_ids.side_effect = lambda cur, market_code, ids: {id: 1 for id in ids}
+
+        # a full page of the venue's size is not the last one
+        with patch.dict("clients.exchange.MAX_PAGE_LIMITS", {"paper": {"fetch_my_trades": 2}}):
+            inserted = asyncio.run(backfill(CONFIG, [paper]))
+
+        assert inserted == {"paper": 5}
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_newest_first_venue_is_paged_by_offset(self, database):
+        now = int(time.time() * 1000)
+        trades = [
+            {
+                "id": str(i),
+                "order": str(i),
+                "symbol": "BTC/USDT" if i % 2 else "ETH/USDT",
+                "timestamp": now - HOUR_MS + i * 1000,
+                "datetime": None,
+                "price": 50_000,
+                "amount": 0.1,
+            }
+            for i in range(120)
+        ]
+        kraken = Kraken(api_key="APIKEY", secret="SECRET", config={"clock": {"since_margin_ms": 0}})
+        history = KrakenTradesHistory(trades)
+        first_order_on = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=1)
+        database.orders.get_traded_coins.return_value = [("BTC", first_order_on), ("ETH", first_order_on)]
+        database.orders.get_order_ids_by_external_order_ids.side_effect = lambda cur, market_code, ids: {id: 1 for id in ids}
+
+        with patch.object(kraken, "_private_api", return_value=history):
+            inserted = asyncio.run(
+                backfill(CONFIG, [kraken], since=datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(hours=2))
+            )
+
+        assert inserted == {"kraken": 120}
+        assert sorted(copied_trade_ids(database), key=int) == [trade["id"] for trade in trades]
+        # one window for both pairs, the end stays put while the offset moves back through it
+        assert [request["ofs"] for request in history.requests] == [0, 50, 100]
+        assert len({request["end"] for request in history.requests}) == 1
+        saved = {call.args[3]: call.args[5] for call in database.checkpoints.save_watermark.call_args_list}
+        assert saved == {"BTC/USDT": 60, "ETH/USDT": 60}
@@ -0,0 +1,70 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from clients.balance_cache import BalanceCache
+
+
+class TestBalanceCache:
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_stale_until_seeded(self):
+        cache = BalanceCache("binance")
+        assert cache.stale
+        assert cache.get_free_balance() is None
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_stream_updates_are_merged_into_snapshot(self):
+        updates = asyncio.Queue()
+
+        async def run():
+            cache = BalanceCache("binance")
+            cache.start(updates.get, lambda: {"USDT": 100.0, "UNI": 5.0})
+            await updates.put({"free": {"USDT": 40.0}})
+            await updates.put({"free": {"XRP": 10.0}})
+            while cache.version < 3:
+                await asyncio.sleep(0.01)
+            free_balance = cache.get_free_balance()
+            await cache.stop()
+            return free_balance, cache.stale
+
+        free_balance, stale = asyncio.run(run())
+        assert free_balance == {"USDT": 40.0, "UNI": 5.0, "XRP": 10.0}
+        assert stale
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_resync_after_disconnect(self):
+        snapshots = iter([{"USDT": 100.0}, {"USDT": 70.0}])
+        calls = []
+
+        async def watch_balance():
+            calls.append(True)
+            if len(calls) == 1:
+                raise ConnectionError("disconnected")
+            await asyncio.sleep(10)
+
+        async def run():
+            cache = BalanceCache("binance", {"reconnect_delay_seconds": 0})
+            cache.start(watch_balance, lambda: next(snapshots))
+            while len(calls) < 2:
+                await asyncio.sleep(0.01)
+            free_balance = cache.get_free_balance()
+            await cache.stop()
+            return free_balance
+
+        assert asyncio.run(run()) == {"USDT": 70.0}
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_reserve_deducts_locally(self):
+        cache = BalanceCache("binance")
+        cache.apply_snapshot({"USDT": 100.0})
+        cache.reserve("USDT", 30)
+        assert cache.free["USDT"] == 70.0
+        assert cache.version == 2
@@ -12,6 +12,7 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")
 
 from clients.binance import Binance
 from clients.exchange_utils import amount_to_precision, format_pair, price_to_precision
+from database.records import OrderRecord
 from conftest import time_limit
 from order_services import process_order, validate_order
 from error_message import INSUFFICIENT_BALANCE_BUY_ERROR, INSUFFICIENT_BALANCE_SELL_ERROR
@@ -249,14 +250,14 @@ class TestBinanceSandbox:
     @pytest.mark.github
     @patch("order_services.send_insufficient_funds_email")
     def test_insufficient_balance_buy(self, mock_send_email, binance: Binance):
-        order_buy = {
-            "id": "1",
-            "side": "Buy",
-            "type": "limit",
-            "amount": 1.0,
-            "price": 6.0,
-            "coin_code": "UNI",
-        }  # this is a mock order, order USDT for UNI at 6.0
+        order_buy = OrderRecord(
+            id=1,
+            side="Buy",
+            type="limit",
+            amount=1.0,
+            price=6.0,
+            coin_code="UNI",
+        )  # this is a mock order, order USDT for UNI at 6.0
 
         # mock the fetch_free_balance method to return a balance of 5.0 USDT
         with patch.object(binance, "fetch_free_balance", return_value={"USDT": 5.0}):
@@ -269,14 +270,14 @@ class TestBinanceSandbox:
     @pytest.mark.github
     @patch("order_services.send_insufficient_funds_email")
     def test_insufficient_balance_sell(self, mock_send_email, binance: Binance):
-        order_sell = {
-            "id": "1",
-            "side": "Sell",
-            "type": "limit",
-            "amount": 1.0,
-            "price": 6.0,
-            "coin_code": "UNI",
-        }  # this is a mock order, sell 1.0 UNI
+        order_sell = OrderRecord(
+            id=1,
+            side="Sell",
+            type="limit",
+            amount=1.0,
+            price=6.0,
+            coin_code="UNI",
+        )  # this is a mock order, sell 1.0 UNI
         # mock the fetch_free_balance method to return a balance of 0.0 UNI
         with patch.object(binance, "fetch_free_balance", return_value={"UNI": 0.0}):
             with pytest.raises(Exception) as excinfo:
@@ -0,0 +1,56 @@
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import ccxt
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from clients.binance import Binance
+
+OFFSET_MS = 3_000
+
+
+@pytest.fixture
+def binance():
+    return Binance(api_key="APIKEY", secret="SECRET", config={"clock": {"since_margin_ms": 500}})
+
+
+def server_time():
+    return time.time() * 1000 + OFFSET_MS
+
+
+class TestClock:
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_signed_requests_use_the_server_clock(self, binance: Binance):
+        with patch.object(binance._api, "fetch_time", side_effect=server_time):
+            binance.clock.sample()
+
+        assert abs(binance.clock.offset_ms - OFFSET_MS) < 100
+        for api in (binance._api, binance._ws_async):
+            assert abs(api.nonce() - server_time()) < 100
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_since_is_converted_to_the_server_clock(self, binance: Binance):
+        binance.clock.offset_ms = OFFSET_MS
+        since = datetime(2024, 1, 1, 12, 0, 0)
+        expected = int(since.replace(tzinfo=timezone.utc).timestamp() * 1000) + OFFSET_MS - 500
+        assert binance.clock.server_milliseconds(since) == expected
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_rejected_timestamp_triggers_a_new_sample(self, binance: Binance):
+        def fetch(url, method="GET", headers=None, body=None):
+            if url.endswith("/time"):
+                return {"serverTime": int(server_time())}
+            raise ccxt.InvalidNonce("Timestamp for this request is outside of the recvWindow")
+
+        with patch.object(binance._api, "fetch", side_effect=fetch), pytest.raises(ccxt.InvalidNonce):
+            binance._api.fetch2("account", "private")
+
+        assert abs(binance.clock.offset_ms - OFFSET_MS) < 100
@@ -0,0 +1,61 @@
+import os
+import sys
+import time
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from clients.binance import Binance
+from clients.endpoints import EndpointSelector
+
+LATENCIES = {
+    "api.binance.com": 80.0,
+    "api1.binance.com": 40.0,
+    "api2.binance.com": None,
+    "api3.binance.com": 20.0,
+    "api4.binance.com": 60.0,
+}
+
+
+class TestEndpoints:
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_clients_are_routed_to_the_fastest_healthy_hosts(self):
+        binance = Binance(api_key="APIKEY", secret="SECRET", config={"endpoints": {"hedge": True}})
+        with patch.object(EndpointSelector, "_ping", side_effect=lambda host: LATENCIES[host]):
+            binance.endpoints.probe()
+
+        assert binance.endpoints.ranked_hosts()[:2] == ["api3.binance.com", "api1.binance.com"]
+        assert binance.endpoints.ranked_hosts()[-1] == "api2.binance.com"
+        assert binance._api.urls["api"]["public"] == "https://api3.binance.com/api/v3"
+        assert binance._api.urls["api"]["fapiPublic"] == "https://fapi.binance.com/fapi/v1"
+        assert binance._hedge_api.urls["api"]["private"] == "https://api1.binance.com/api/v3"
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_sandbox_clients_are_not_rerouted(self):
+        binance = Binance(api_key="APIKEY", secret="SECRET", ccxt_config={"set_sandbox_mode": True})
+        assert not binance.endpoints.enabled
+        assert "testnet" in binance._api.urls["api"]["public"]
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_slow_read_is_hedged(self):
+        binance = Binance(api_key="APIKEY", secret="SECRET", config={"endpoints": {"hedge": True, "hedge_min_samples": 1}})
+        binance.endpoints.read_latency["fetch_ticker"].add(10)
+
+        def slow_ticker(pair):
+            time.sleep(0.5)
+            return {"symbol": pair, "last": 1.0}
+
+        with (
+            patch.object(binance._api, "fetch_ticker", side_effect=slow_ticker),
+            patch.object(binance._hedge_api, "fetch_ticker", return_value={"symbol": "UNI/USDT", "last": 2.0}),
+        ):
+            ticker = binance.fetch_ticker("UNI/USDT")
+
+        assert ticker["last"] == 2.0
+        assert binance.endpoints.stats()["hedges"] == 1
+        assert binance.endpoints.stats()["hedge_wins"] == 1
@@ -1,5 +1,7 @@
 import os
 import sys
+import time
+from unittest.mock import patch
 
 import pytest
 
@@ -30,3 +32,18 @@ class TestExchange:
     def test_exchange_name(self, exch):
         assert exch is not None
         assert exch._api.name == EXCHANGE_LNAME
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_warm_up(self, exch):
+        server_time = time.time() * 1000 + 60_000
+        with (
+            patch.object(exch._api, "load_markets"),
+            patch.object(exch._ws_async, "set_markets"),
+            patch.object(exch._api, "fetch_time", return_value=server_time),
+        ):
+            timings = exch.warm_up()
+
+        assert set(timings) == {"markets_ms", "time_ms"}
+        assert 59_000 < exch.server_time_offset_ms < 61_000
+        assert exch.capabilities["fetchTime"] is True
@@ -0,0 +1,159 @@
+import asyncio
+import json
+import os
+import sys
+import time
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from clients.exchange import Exchange
+from exchange_registry import ExchangeRegistry
+
+CONFIG = SimpleNamespace(
+    binance_api_key="APIKEY",
+    binance_secret="SECRET",
+    bybit_api_key="APIKEY",
+    bybit_secret="SECRET",
+    extra_keys={},
+    conn_info="",
+)
+
+
+def write_config(path, log_responses: bool, bybit: bool = False) -> None:
+    exchanges_ccxt_config = {"config": {"log_responses": log_responses}, "binance": {"ccxt_config": {}}}
+    if bybit:
+        exchanges_ccxt_config["bybit"] = {"ccxt_config": {}}
+    path.write_text(json.dumps(exchanges_ccxt_config))
+
+
+@pytest.fixture(autouse=True)
+def no_network():
+    with (
+        patch.object(Exchange, "warm_up", return_value={"markets_ms": 1.0, "time_ms": 1.0}),
+        patch.object(Exchange, "close", new_callable=AsyncMock) as close,
+    ):
+        yield close
+
+
+class TestExchangeRegistry:
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_changed_clients_are_swapped_after_their_calls_drain(self, tmp_path, no_network):
+        path = tmp_path / "exchanges_ccxt_config.json"
+        write_config(path, log_responses=False)
+        swaps = []
+
+        async def on_swap(name, old, new):
+            swaps.append((name, old, new))
+
+        registry = ExchangeRegistry(CONFIG, names=("binance", "bybit"), path=str(path), on_swap=on_swap)
+        old = registry.get("binance")
+
+        async def run():
+            async with registry.lease(old):
+                write_config(path, log_responses=True, bybit=True)
+                await registry.reload()
+                await asyncio.sleep(0.1)
+                # still in use
+                assert not no_network.await_count
+            await asyncio.gather(*registry._retiring)
+
+        asyncio.run(run())
+
+        new = registry.get("binance")
+        assert new is not old and new.log_responses
+        assert registry.get("bybit") is not None
+        assert [(name, previous) for name, previous, _ in swaps] == [("binance", old), ("bybit", None)]
+        no_network.assert_awaited_once()
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_failed_rebuild_keeps_the_current_client(self, tmp_path):
+        path = tmp_path / "exchanges_ccxt_config.json"
+        write_config(path, log_responses=False)
+        registry = ExchangeRegistry(CONFIG, names=("binance",), path=str(path))
+        old = registry.get("binance")
+
+        write_config(path, log_responses=True)
+        with patch.object(Exchange, "warm_up", side_effect=Exception("markets unavailable")):
+            asyncio.run(registry.reload())
+
+        assert registry.get("binance") is old
+        assert registry.reload_failures["binance"] == {"error": "warm-up failed", "attempts": 1}
+
+        # the file hasn't changed since, the retry still rebuilds the client with it
+        asyncio.run(registry.reload())
+
+        assert registry.get("binance") is not old and registry.get("binance").log_responses
+        assert registry.reload_failures == {}
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_warm_up_reports_timings_and_timeouts(self, tmp_path):
+        path = tmp_path / "exchanges_ccxt_config.json"
+        path.write_text(
+            json.dumps(
+                {
+                    "config": {"warm_up": {"timeout_seconds": 5, "timeout_seconds_by_exchange": {"bybit": 0.05}}},
+                    "binance": {"ccxt_config": {}},
+                    "bybit": {"ccxt_config": {}},
+                }
+            )
+        )
+        registry = ExchangeRegistry(CONFIG, names=("binance", "bybit"), path=str(path))
+
+        def warm_up(exchange):
+            if exchange.exchange_name == "bybit":
+                time.sleep(0.5)
+            return {"markets_ms": 1.0, "time_ms": 1.0}
+
+        with patch.object(Exchange, "warm_up", new=warm_up):
+            report = asyncio.run(registry.warm_up())
+
+        assert report["binance"]["status"] == "ok" and report["binance"]["markets_ms"] == 1.0
+        assert report["bybit"]["status"] == "timeout"
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_timed_out_replacement_is_closed_after_its_warm_up(self, tmp_path, no_network):
+        path = tmp_path / "exchanges_ccxt_config.json"
+        write_config(path, log_responses=False)
+        registry = ExchangeRegistry(CONFIG, names=("binance",), path=str(path))
+        old = registry.get("binance")
+        warming = []
+
+        def warm_up(exchange):
+            warming.append(True)
+            time.sleep(0.3)
+            warming.pop()
+            return {"markets_ms": 1.0, "time_ms": 1.0}
+
+        closed = []
+
+        async def close(exchange):
+            # the warm-up thread is done with the client
+            assert not warming
+            closed.append(exchange)
+
+        async def run():
+            # the timeout of the new file applies to the rebuild
+            path.write_text(
+                json.dumps(
+                    {"config": {"log_responses": True, "warm_up": {"timeout_seconds": 0.05}}, "binance": {"ccxt_config": {}}}
+                )
+            )
+            await registry.reload()
+            assert registry.get("binance") is old
+            assert registry._warming
+            await asyncio.gather(*registry._retiring)
+
+        with patch.object(Exchange, "warm_up", new=warm_up), patch.object(Exchange, "close", new=close):
+            asyncio.run(run())
+
+        assert registry.reload_failures["binance"]["error"] == "warm-up timeout"
+        assert len(closed) == 1 and closed[0] is not old
+        assert not registry._warming
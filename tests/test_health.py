@@ -0,0 +1,102 @@
+import os
+import sys
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+import ccxt
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from clients.health import OPEN, READ, WRITE, CircuitOpenError, ExchangeHealth
+
+HEALTH_CONFIG = {"min_calls": 4, "error_rate_threshold": 0.5, "open_seconds": 30, "retry_backoff_ms": 0}
+
+
+@pytest.fixture
+def health():
+    return ExchangeHealth("binance", SimpleNamespace(timeout=10000), HEALTH_CONFIG)
+
+
+class TestExchangeHealth:
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_read_is_retried_on_network_error(self, health):
+        func = Mock(side_effect=[ccxt.RequestTimeout("timeout"), {"symbol": "UNI/USDT"}])
+        assert health.call("fetch_ticker", READ, func, "UNI/USDT") == {"symbol": "UNI/USDT"}
+        assert func.call_count == 2
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_write_is_not_retried_on_timeout(self, health):
+        func = Mock(side_effect=ccxt.RequestTimeout("timeout"))
+        with pytest.raises(ccxt.RequestTimeout):
+            health.call("create_order", WRITE, func)
+        assert func.call_count == 1
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_write_is_retried_when_rejected_by_rate_limit(self, health):
+        func = Mock(side_effect=[ccxt.RateLimitExceeded("429"), {"id": "1"}])
+        assert health.call("create_order", WRITE, func) == {"id": "1"}
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_exchange_errors_do_not_open_circuit(self, health):
+        func = Mock(side_effect=ccxt.InsufficientFunds("no funds"))
+        for _ in range(10):
+            with pytest.raises(ccxt.InsufficientFunds):
+                health.call("create_order", WRITE, func)
+        assert not health.degraded
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_circuit_opens_and_fails_fast(self, health):
+        func = Mock(side_effect=ccxt.ExchangeNotAvailable("down"))
+        for _ in range(4):
+            with pytest.raises(ccxt.NetworkError):
+                health.call("fetch_order", WRITE, func)
+        assert health.degraded
+        assert health.snapshot()["state"] == OPEN
+
+        func.reset_mock()
+        with pytest.raises(CircuitOpenError):
+            health.call("fetch_order", READ, func)
+        func.assert_not_called()
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_circuit_closes_after_successful_probe(self, health):
+        failing = Mock(side_effect=ccxt.ExchangeNotAvailable("down"))
+        for _ in range(4):
+            with pytest.raises(ccxt.NetworkError):
+                health.call("fetch_order", WRITE, failing)
+
+        with patch("clients.health.time.monotonic", return_value=health.breaker.opened_at + 31):
+            assert health.call("fetch_order", READ, Mock(return_value={})) == {}
+        assert not health.degraded
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_probe_is_released_on_other_errors(self, health):
+        failing = Mock(side_effect=ccxt.ExchangeNotAvailable("down"))
+        for _ in range(4):
+            with pytest.raises(ccxt.NetworkError):
+                health.call("fetch_order", WRITE, failing)
+
+        with patch("clients.health.time.monotonic", return_value=health.breaker.opened_at + 31):
+            with pytest.raises(ConnectionError):
+                health.call("fetch_order", READ, Mock(side_effect=ConnectionError("database is down")))
+            assert health.snapshot()["degraded"] == health.degraded
+            assert health.call("fetch_order", READ, Mock(return_value={})) == {}
+        assert not health.degraded
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_timeout_adapts_to_latency(self, health):
+        for _ in range(20):
+            health.latency.add(100.0)
+        assert health.timeout_ms() == 1000
+        for _ in range(20):
+            health.latency.add(900.0)
+        assert health.timeout_ms() == 2700
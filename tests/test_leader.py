@@ -0,0 +1,116 @@
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from database.leader import LeaderLock
+
+LEADER_CONFIG = {"retry_seconds": 0.01, "heartbeat_seconds": 0.01, "heartbeat_timeout_seconds": 0.01}
+
+
+class FakeConnection:
+    """Grants the advisory lock after a number of attempts, fails heartbeats once dropped and hangs once partitioned"""
+
+    def __init__(self, grant_after: int = 0):
+        self.attempts = 0
+        self.grant_after = grant_after
+        self.dropped = False
+        self.partitioned = False
+        self.info = SimpleNamespace(backend_pid=42)
+        self.lock_holder = 42
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    async def execute(self, query, params=None):
+        if self.dropped:
+            raise ConnectionError("server closed the connection")
+        if self.partitioned:
+            await asyncio.sleep(3600)
+        cursor = MagicMock()
+        if "pg_try_advisory_lock" in query:
+            self.attempts += 1
+            cursor.fetchone = AsyncMock(return_value=(self.attempts > self.grant_after,))
+        if "pg_locks" in query:
+            cursor.fetchone = AsyncMock(return_value=(1,) if params == (self.lock_holder,) else None)
+        return cursor
+
+
+async def run_leader(leader: LeaderLock, connection: FakeConnection, steps):
+    with patch.object(leader, "_connect", AsyncMock(return_value=connection)):
+        task = asyncio.create_task(leader.run())
+        try:
+            results = []
+            for step in steps:
+                await asyncio.sleep(0.05)
+                results.append(step())
+            return results
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+
+class TestLeaderLock:
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_standby_takes_over_once_lock_is_free(self):
+        on_acquired = AsyncMock()
+        leader = LeaderLock("", "watch_orders:binance:abc", LEADER_CONFIG, on_acquired=on_acquired)
+        connection = FakeConnection(grant_after=2)
+
+        assert asyncio.run(run_leader(leader, connection, [lambda: leader.is_leader])) == [True]
+        assert connection.attempts == 3
+        on_acquired.assert_awaited_once()
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_leader_steps_down_when_session_drops(self):
+        leader = LeaderLock("", "watch_orders:binance:abc", LEADER_CONFIG)
+        connection = FakeConnection()
+
+        def drop():
+            connection.dropped = True
+            return leader.is_leader
+
+        assert asyncio.run(run_leader(leader, connection, [drop, lambda: leader.is_leader])) == [True, False]
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_leader_steps_down_when_heartbeat_hangs(self):
+        leader = LeaderLock("", "watch_orders:binance:abc", LEADER_CONFIG)
+        connection = FakeConnection()
+
+        def partition():
+            connection.partitioned = True
+            return leader.is_leader
+
+        assert asyncio.run(run_leader(leader, connection, [partition, lambda: leader.is_leader])) == [True, False]
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_writes_check_the_lock_on_the_server(self):
+        leader = LeaderLock("", "watch_orders:binance:abc", LEADER_CONFIG)
+        connection = FakeConnection()
+
+        async def check():
+            results = [await leader.holds_lock(connection)]
+            with patch.object(leader, "_connect", AsyncMock(return_value=connection)):
+                task = asyncio.create_task(leader.run())
+                await asyncio.sleep(0.05)
+                results.append(await leader.holds_lock(connection))
+                # a standby took the lock over while this leader's session was cut off
+                connection.lock_holder = 7
+                results.append(await leader.holds_lock(connection))
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+            return results
+
+        assert asyncio.run(check()) == [False, True, False]
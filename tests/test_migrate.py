@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from database.migrate import MIGRATIONS_DIR, pending_migrations, split_statements
+
+
+class TestMigrate:
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_statements_run_one_by_one(self):
+        sql = (
+            "-- comment\nALTER TABLE t ADD COLUMN IF NOT EXISTS c TEXT;\nCREATE INDEX CONCURRENTLY IF NOT EXISTS i ON t (c);\n"
+        )
+        assert split_statements(sql) == [
+            "ALTER TABLE t ADD COLUMN IF NOT EXISTS c TEXT",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS i ON t (c)",
+        ]
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_function_bodies_are_not_split(self):
+        sql = "CREATE FUNCTION f() RETURNS trigger AS $$\nBEGIN\n    RETURN NEW;\nEND;\n$$ LANGUAGE plpgsql;\nSELECT 1;\n"
+        assert split_statements(sql) == [
+            "CREATE FUNCTION f() RETURNS trigger AS $$\nBEGIN\n    RETURN NEW;\nEND;\n$$ LANGUAGE plpgsql",
+            "SELECT 1",
+        ]
+        statements = split_statements((MIGRATIONS_DIR / "004_order_notify.sql").read_text())
+        assert [statement.split()[0] for statement in statements] == ["CREATE", "DO"]
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_pending_migrations_are_ordered(self):
+        names = [path.name for path in sorted(MIGRATIONS_DIR.glob("*.sql"))]
+        assert [path.name for path in pending_migrations(set())] == names
+        assert [path.name for path in pending_migrations({names[0]})] == names[1:]
@@ -0,0 +1,119 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from clients.kraken import Kraken
+from clients import nonce
+from clients.nonce import NonceCoordinator
+
+SECRET = "c2VjcmV0"
+
+
+class TestNonce:
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_nonces_strictly_increase_across_threads(self):
+        coordinator = NonceCoordinator("abc")
+        with ThreadPoolExecutor(8) as pool:
+            nonces = list(pool.map(lambda _: coordinator.next(), range(2000)))
+        assert len(set(nonces)) == len(nonces)
+        assert coordinator.next() > max(nonces)
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_private_requests_reach_the_exchange_in_nonce_order(self):
+        kraken = Kraken(api_key="NONCE_ORDER_KEY", secret=SECRET)
+        # the rate limiter's pacing would space the requests out anyway
+        kraken.rate_limiter.reserve = lambda cost: 0
+        sent = []
+        lock = threading.Lock()
+
+        def fetch(url, method="GET", headers=None, body=None):
+            with lock:
+                sent.append(int(body.split("nonce=")[1].split("&")[0]))
+            time.sleep(0.01)
+            return {"error": [], "result": {}}
+
+        with patch.object(kraken._api, "fetch", side_effect=fetch), ThreadPoolExecutor(4) as pool:
+            list(pool.map(lambda _: kraken._api.privatePostBalance(), range(8)))
+
+        assert sent == sorted(sent)
+        assert len(set(sent)) == 8
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_every_key_has_its_own_nonces(self):
+        kraken = Kraken(api_key="PRIMARY_KEY", secret=SECRET, extra_keys=[("EXTRA_KEY", SECRET, "main")])
+        primary, extra = kraken.accounts.accounts["main"].keys
+        assert primary.api.nonce.__self__ is not extra.api.nonce.__self__
+        assert kraken._ws_async.nonce.__self__ is primary.api.nonce.__self__
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_requests_hold_the_key_row_of_the_nonce_store(self):
+        kraken = Kraken(api_key="SHARED_NONCE_KEY", secret=SECRET)
+        # another process (on a host whose clock is ahead) has used a higher nonce
+        other_process_nonce = time.time_ns() // 1000 + 60_000_000
+        cur = MagicMock()
+        cur.fetchone.return_value = (other_process_nonce,)
+        conn = MagicMock()
+        conn.cursor.return_value.__enter__.return_value = cur
+        sent = []
+
+        @contextmanager
+        def fake_connection(conn_info, timeout=None):
+            yield conn
+
+        def fetch(url, method="GET", headers=None, body=None):
+            sent.append(int(body.split("nonce=")[1].split("&")[0]))
+            return {"error": [], "result": {}}
+
+        with (
+            patch.object(nonce, "_conn_info", "postgresql://"),
+            patch("clients.nonce.connection", fake_connection),
+            patch.object(kraken._api, "fetch", side_effect=fetch),
+        ):
+            kraken._api.privatePostBalance()
+
+        assert sent == [other_process_nonce + 1]
+        queries = [call.args for call in cur.execute.call_args_list]
+        assert "moolah.api_nonce" in queries[0][0] and "UPDATE" in queries[1][0]
+        assert queries[1][1] == (other_process_nonce + 1, queries[0][1][0])
+        conn.commit.assert_called_once()
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_sync_and_async_requests_share_the_dispatch_lock(self):
+        coordinator = NonceCoordinator("SHARED_LOCK_KEY")
+        order = []
+
+        async def fetch2(*args):
+            order.append("async start")
+            await asyncio.sleep(0.05)
+            order.append("async end")
+
+        def sync_fetch2(*args):
+            order.append("sync")
+
+        async_api = MagicMock(fetch2=fetch2)
+        sync_api = MagicMock(fetch2=sync_fetch2)
+        coordinator.install(async_api)
+        coordinator.install(sync_api)
+
+        async def run():
+            request = asyncio.create_task(async_api.fetch2("Balance", "private"))
+            await asyncio.sleep(0.01)
+            await asyncio.to_thread(sync_api.fetch2, "Balance", "private")
+            await request
+
+        asyncio.run(run())
+        assert order == ["async start", "async end", "sync"]
@@ -0,0 +1,86 @@
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from clients.binance import Binance
+from clients.order_book import BookSide, OrderBookCache
+from database.records import OrderRecord
+from error_message import INSUFFICIENT_BALANCE_BUY_ERROR
+from order_services import place_order, process_order
+
+ORDER_BOOK = {
+    "bids": [[5.9, 10.0], [5.8, 10.0]],
+    "asks": [[6.0, 10.0], [6.5, 10.0], [7.0, 10.0]],
+    "nonce": 100,
+}
+
+
+@pytest.fixture
+def binance():
+    return Binance(api_key="APIKEY", secret="SECRET")
+
+
+class TestOrderBook:
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_estimate_fill_walks_levels(self):
+        asks = BookSide(ORDER_BOOK["asks"])
+        estimate = asks.estimate_fill(15.0)
+        assert estimate.cost == pytest.approx(10 * 6.0 + 5 * 6.5)
+        assert estimate.average_price == pytest.approx(92.5 / 15)
+        assert estimate.complete
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_estimate_fill_beyond_depth(self):
+        estimate = BookSide(ORDER_BOOK["asks"]).estimate_fill(40.0)
+        assert estimate.filled == 30.0
+        assert not estimate.complete
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_amount_for_cost(self):
+        assert BookSide(ORDER_BOOK["asks"]).amount_for_cost(92.5) == pytest.approx(15.0)
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_sequence_gap_drops_book(self):
+        books = OrderBookCache("binance")
+        assert books.update("UNI/USDT", ORDER_BOOK)
+        assert not books.update("UNI/USDT", {**ORDER_BOOK, "nonce": 99})
+        assert books.get("UNI/USDT") is None
+
+    @pytest.mark.github
+    @pytest.mark.base
+    @patch("order_services.send_insufficient_funds_email")
+    def test_market_buy_balance_check_uses_book_depth(self, mock_send_email, binance: Binance):
+        order_buy = OrderRecord(id=1, side="Buy", type="market", amount=15.0, coin_code="UNI")
+        binance.order_books.update("UNI/USDT", ORDER_BOOK)
+
+        # 15 UNI at an average price of 6.0 would fit into 91 USDT, walking the asks costs 92.5
+        with pytest.raises(Exception) as excinfo:
+            process_order(binance, order_buy, {"USDT": 91.0}, "UNI", "USDT", average_price=6.0)
+        assert INSUFFICIENT_BALANCE_BUY_ERROR in str(excinfo.value)
+        mock_send_email.assert_called_once()
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_value_only_market_buy_is_sized_from_the_book(self, binance: Binance):
+        order_buy = OrderRecord(id=1, side="Buy", type="market", amount=None, value=92.5, coin_code="UNI")
+        binance.order_books.update("UNI/USDT", ORDER_BOOK)
+        market = {"limits": {"amount": {"min": 1.0, "max": None}, "price": {"min": None, "max": None}}}
+
+        with (
+            patch.object(binance, "get_free_balances", return_value={"main": {"USDT": 100.0}}),
+            patch.object(binance, "get_ticker", return_value={"average": 6.0}),
+            patch.object(binance._api, "market", return_value=market),
+            patch.object(binance, "create_order", return_value={"id": "x1"}) as create_order,
+        ):
+            assert place_order(binance, order_buy) == {"id": "x1"}
+
+        # 10 UNI at 6.0 and 5 at 6.5, not 92.5 / 6.0
+        assert create_order.call_args.kwargs["amount"] == pytest.approx(15.0)
@@ -0,0 +1,54 @@
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from order_executor import OrderExecutor
+
+BINANCE = SimpleNamespace(market_code="BIN-SPOT")
+KRAKEN = SimpleNamespace(market_code="KRA-SPOT")
+
+
+async def run_for(executor: OrderExecutor, seconds: float, notifications=()):
+    tasks = [asyncio.create_task(executor.run_exchange(exchange)) for exchange in executor.exchanges]
+    await asyncio.sleep(0)
+    for market_code in notifications:
+        executor.notify(market_code)
+    await asyncio.sleep(seconds)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class TestOrderExecutor:
+    @pytest.mark.github
+    @pytest.mark.base
+    @patch("order_services.create_order", new_callable=AsyncMock)
+    def test_burst_of_notifications_is_one_batch(self, create_order):
+        executor = OrderExecutor(None, [BINANCE, KRAKEN], {"debounce_ms": 20, "sweep_seconds": 10})
+        asyncio.run(run_for(executor, 0.1, ["BIN-SPOT", "BIN-SPOT", "BIN-SPOT", "UNKNOWN"]))
+
+        create_order.assert_awaited_once_with(None, BINANCE)
+
+    @pytest.mark.github
+    @pytest.mark.base
+    @patch("order_services.create_order", new_callable=AsyncMock)
+    def test_empty_payload_wakes_every_exchange(self, create_order):
+        executor = OrderExecutor(None, [BINANCE, KRAKEN], {"debounce_ms": 0, "sweep_seconds": 10})
+        asyncio.run(run_for(executor, 0.05, [""]))
+
+        assert {call.args[1].market_code for call in create_order.await_args_list} == {"BIN-SPOT", "KRA-SPOT"}
+
+    @pytest.mark.github
+    @pytest.mark.base
+    @patch("order_services.create_order", new_callable=AsyncMock)
+    def test_sweep_without_notifications(self, create_order):
+        executor = OrderExecutor(None, [BINANCE], {"sweep_seconds": 0.02})
+        asyncio.run(run_for(executor, 0.1))
+
+        assert create_order.await_count >= 2
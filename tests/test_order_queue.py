@@ -0,0 +1,77 @@
+import asyncio
+import os
+import sys
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from database.records import OrderRecord
+from order_services import WORKER_ID, _place_orders, create_order
+
+EXCHANGE = SimpleNamespace(market_code="BIN-SPOT", config={"order_queue": {"batch_size": 2}})
+CONFIG = SimpleNamespace(conn_info="")
+
+
+def record(id: int) -> OrderRecord:
+    return OrderRecord(id=id, side="Buy", type="limit", amount=1.0, coin_code="UNI")
+
+
+@asynccontextmanager
+async def fake_connection(conn_info):
+    yield MagicMock()
+
+
+@pytest.fixture(autouse=True)
+def database():
+    with (
+        patch("order_services.async_connection", fake_connection),
+        patch("order_services.AsyncOrder", new_callable=AsyncMock) as order_model,
+    ):
+        yield order_model
+
+
+class TestOrderQueue:
+    @pytest.mark.github
+    @pytest.mark.base
+    @patch("order_services._place_orders", new_callable=AsyncMock)
+    def test_claims_batches_until_queue_is_empty(self, place_orders, database):
+        database.claim_orders.side_effect = [[record(1), record(2)], [record(3)], []]
+
+        assert asyncio.run(create_order(CONFIG, EXCHANGE))
+
+        assert place_orders.await_count == 2
+        exclude_ids = [call.kwargs["exclude_ids"] for call in database.claim_orders.call_args_list]
+        assert exclude_ids[-1] == [1, 2, 3]
+        assert all(
+            call.kwargs["limit"] == 2 and call.kwargs["worker_id"] == WORKER_ID
+            for call in database.claim_orders.call_args_list
+        )
+        assert database.release_claims.call_args_list[0].args[1:] == ([1, 2], WORKER_ID)
+
+    @pytest.mark.github
+    @pytest.mark.base
+    @patch("order_services._place_orders", new_callable=AsyncMock, side_effect=Exception("ticker missing"))
+    def test_claims_are_released_when_a_batch_fails(self, place_orders, database):
+        database.claim_orders.side_effect = [[record(1)]]
+
+        assert not asyncio.run(create_order(CONFIG, EXCHANGE))
+
+        assert database.release_claims.call_args.args[1:] == ([1], WORKER_ID)
+
+    @pytest.mark.github
+    @pytest.mark.base
+    @patch("order_services.place_order", return_value={"id": "x1", "status": "open", "filled": 0, "datetime": None})
+    def test_orders_whose_lease_expired_are_skipped(self, place_order, database):
+        exchange = MagicMock(quote_currency="USDT", divider="/")
+        database.extend_claim.side_effect = [False, True]
+        results = []
+
+        asyncio.run(_place_orders(CONFIG, exchange, [record(1), record(2)], results.append, 60))
+
+        assert [call.args[1:] for call in database.extend_claim.call_args_list] == [(1, WORKER_ID, 60), (2, WORKER_ID, 60)]
+        assert [call.args[1].id for call in place_order.call_args_list] == [2]
+        assert [result["order_id"] for result in results] == [2]
@@ -0,0 +1,90 @@
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from clients.paper import PaperExchange
+from exchange_registry import build_exchange
+from order_services import validate_order
+
+PAPER_CONFIG = {"balances": {"USDT": 100_000}, "prices": {"BTC": 50_000}, "level_value": 50_000, "fee_rate": 0, "seed": 1}
+
+
+@pytest.fixture
+def paper():
+    return PaperExchange(PAPER_CONFIG)
+
+
+class TestPaperExchange:
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_market_order_walks_the_book(self, paper: PaperExchange):
+        # 1 BTC per level, so 1.5 BTC takes the best ask and half of the next level
+        order = paper.create_order("BTC", "market", "buy", 1.5)
+
+        asks = paper.feed.order_book("BTC/USDT")["asks"]
+        assert order["status"] == "closed"
+        assert order["filled"] == 1.5
+        assert order["cost"] == pytest.approx(asks[0][0] + 0.5 * asks[1][0])
+        assert paper.fetch_free_balance() == {"USDT": pytest.approx(100_000 - order["cost"]), "BTC": 1.5}
+        assert paper.get_trades_for_order(order["id"], "BTC/USDT", None) == order["trades"]
+        assert validate_order(paper, "BTC/USDT", 1.5)
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_order_beyond_the_balance_is_rejected(self, paper: PaperExchange):
+        assert paper.create_order("BTC", "market", "buy", 3) is None
+        assert paper.create_order("BTC", "market", "sell", 1) is None
+        assert paper.fetch_open_orders() == []
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_resting_limit_order_fills_when_crossed(self, paper: PaperExchange):
+        async def run():
+            updates = asyncio.ensure_future(paper.watch_orders())
+            await asyncio.sleep(0)
+            order = await asyncio.to_thread(paper.create_order, "BTC", "limit", "buy", 1, 49_000)
+            assert order["status"] == "open"
+            assert paper.fetch_balance()["used"]["USDT"] == 49_000
+            assert (await updates)[0]["status"] == "open"
+
+            paper.feed._set_mid("BTC/USDT", 48_000)
+            paper._match_resting()
+            return await paper.watch_orders(), order
+
+        (update,), order = asyncio.run(run())
+        assert update["id"] == order["id"]
+        assert update["status"] == "closed"
+        assert update["average"] == 49_000
+        assert paper.fetch_balance()["used"]["USDT"] == 0
+        assert paper.fetch_free_balance() == {"USDT": 51_000, "BTC": 1}
+        assert paper.fetch_closed_orders("BTC/USDT", None)[0]["id"] == order["id"]
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_recorded_feed_is_replayed(self, tmp_path):
+        recording = tmp_path / "feed.jsonl"
+        rows = [{"symbol": "BTC/USDT", "bid": 100, "ask": 101}, {"symbol": "BTC/USDT", "bids": [[90, 2]], "asks": [[91, 2]]}]
+        recording.write_text("\n".join(json.dumps(row) for row in rows))
+        paper = PaperExchange({**PAPER_CONFIG, "recording": str(recording)})
+
+        assert paper.get_ticker("BTC/USDT")["ask"] == 101
+        paper.tick()
+        assert paper.get_ticker("BTC/USDT")["ask"] == 101
+        paper.tick()
+        assert paper.get_ticker("BTC/USDT")["ask"] == 91
+        assert paper.create_order("BTC", "market", "buy", 3)["filled"] == 2
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_registry_builds_paper_without_keys(self):
+        exchanges_ccxt_config = {"config": {}, "paper": {"market_code": "PAP-TEST", **PAPER_CONFIG}}
+        paper = build_exchange(None, exchanges_ccxt_config, "paper")
+
+        assert isinstance(paper, PaperExchange)
+        assert paper.exchange_name == "paper"
+        assert paper.market_code == "PAP-TEST"
@@ -0,0 +1,187 @@
+import asyncio
+import os
+import sys
+from unittest.mock import Mock, patch
+
+import ccxt
+import psycopg
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from clients import rate_limit
+from clients.rate_limit import (
+    AdaptiveThrottle,
+    ExchangeRateLimiter,
+    MemoryRateLimitBackend,
+    PostgresRateLimitBackend,
+    RateLimitPaused,
+    USED_WEIGHT_HEADERS,
+    SharedRateLimiter,
+    install_rate_limiter,
+)
+
+
+@pytest.fixture
+def backend():
+    return MemoryRateLimitBackend()
+
+
+class TestSharedRateLimiter:
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_processes_share_one_budget(self, backend):
+        web = SharedRateLimiter(backend, "binance:abc:requests", limit=10, window_seconds=60, lease_fraction=0)
+        watcher = SharedRateLimiter(backend, "binance:abc:requests", limit=10, window_seconds=60, lease_fraction=0)
+        for _ in range(5):
+            web.acquire(1)
+            watcher.acquire(1)
+
+        with patch("clients.rate_limit.time.sleep", side_effect=InterruptedError) as sleep:
+            with pytest.raises(InterruptedError):
+                web.acquire(1)
+        sleep.assert_called_once()
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_lease_is_consumed_locally(self, backend):
+        limiter = SharedRateLimiter(backend, "bybit:abc:requests", limit=100, window_seconds=60, lease_fraction=0.1)
+        with patch.object(backend, "try_consume", wraps=backend.try_consume) as try_consume:
+            for _ in range(10):
+                limiter.acquire(1)
+        assert try_consume.call_count == 1
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_database_outage_falls_back_to_local_budget(self):
+        backend = PostgresRateLimitBackend("")
+        limiter = SharedRateLimiter(backend, "binance:abc:requests", limit=2, window_seconds=60, lease_fraction=0)
+        with patch("clients.rate_limit.connection", side_effect=psycopg.OperationalError("connection refused")) as connect:
+            limiter.acquire(1)
+            limiter.acquire(1)
+            with patch("clients.rate_limit.time.sleep", side_effect=InterruptedError), pytest.raises(InterruptedError):
+                limiter.acquire(1)
+        # the database isn't tried again until retry_seconds have passed
+        assert connect.call_count == 1
+
+
+class TestInstallRateLimiter:
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_requests_wait_on_order_budget(self, backend):
+        api = ccxt.binance({"apiKey": "key", "secret": "secret"})
+        limiter = ExchangeRateLimiter("binance", "abc", api)
+        install_rate_limiter(api, limiter)
+
+        with patch.object(rate_limit, "_backend", backend):
+            with patch.object(api, "fetch", return_value={"serverTime": 1}):
+                assert api.fetch_time() == 1
+                assert api.privatePostOrder({"symbol": "UNIUSDT"}) == {"serverTime": 1}
+
+        used = {bucket: weight for (bucket, _), weight in backend._used.items()}
+        assert used["binance:abc:orders"] >= 1
+        assert used["binance:ip:requests"] > 0
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_exhausted_budget_does_not_block_event_loop(self, backend):
+        api = ccxt.binance({"enableRateLimit": False})
+        # fetch_time costs 0.2: one request fits the budget
+        limiter = ExchangeRateLimiter("binance", "abc", api, {"limit": 0.2})
+        install_rate_limiter(api, limiter)
+
+        async def fetch_time():
+            return api.fetch_time()
+
+        with (
+            patch.object(rate_limit, "_backend", backend),
+            patch.object(api, "fetch", return_value={"serverTime": 1}) as fetch,
+            patch("clients.rate_limit.time.sleep", side_effect=InterruptedError),
+        ):
+            assert asyncio.run(fetch_time()) == 1
+            with pytest.raises(RateLimitPaused):
+                asyncio.run(fetch_time())
+        assert fetch.call_count == 1
+
+
+class TestAdaptiveThrottle:
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_slows_down_near_limit(self):
+        api = ccxt.binance()
+        usage_headers = {**USED_WEIGHT_HEADERS["binance"], "x-mbx-order-count-10s": (100, 10)}
+        throttle = AdaptiveThrottle("binance", api.rateLimit, None, usage_headers)
+
+        throttle.observe({"X-MBX-USED-WEIGHT-1M": "5000", "X-MBX-ORDER-COUNT-10S": "1"})
+        assert throttle.factor == 1.5
+        assert throttle.usage["x-mbx-order-count-10s"] == pytest.approx(1 / 100)
+        assert throttle.usage["x-mbx-used-weight-1m"] == pytest.approx(5000 / 6000, abs=1e-4)
+        assert throttle.pause_seconds() == 0
+        # requests are spaced at 1.5 times ccxt's interval
+        assert throttle.reserve() == 0
+        assert throttle.reserve() == pytest.approx(api.rateLimit * 1.5 / 1000, abs=0.01)
+        assert api.rateLimit == throttle.base_rate_limit
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_quiet_window_speeds_requests_up(self):
+        api = ccxt.binance()
+        limiter = ExchangeRateLimiter("binance", "abc", api)
+        install_rate_limiter(api, limiter)
+        # ccxt's throttle is replaced by the limiter's pacing
+        assert not api.enableRateLimit
+
+        for _ in range(10):
+            limiter.observe({"X-MBX-USED-WEIGHT-1M": "60"})
+        assert limiter.ip_throttle.factor == 0.5
+
+        # requests are spaced at half of ccxt's interval
+        sleeps = []
+        with (
+            patch.object(api, "fetch", return_value={"serverTime": 1}),
+            patch("clients.rate_limit.time.sleep", side_effect=sleeps.append),
+        ):
+            for _ in range(3):
+                api.fetch_time()
+        # fetch_time costs 0.2 of ccxt's interval, the sleeps don't advance the clock
+        slot = api.rateLimit * 0.5 * 0.2 / 1000
+        assert sleeps == pytest.approx([slot, 2 * slot], abs=0.002)
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_pauses_until_window_reset_near_limit(self):
+        throttle = AdaptiveThrottle("bybit", 20)
+        throttle.observe({"X-Bapi-Limit-Status": "0", "X-Bapi-Limit": "10", "X-Bapi-Limit-Reset-Timestamp": "0"})
+        throttle.observe({"Retry-After": "2"})
+        assert 1 < throttle.pause_seconds() <= 2
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_responses_feed_the_throttle(self):
+        api = ccxt.binance()
+        limiter = ExchangeRateLimiter("binance", "abc", api)
+        install_rate_limiter(api, limiter)
+
+        response = Mock(status_code=200, reason="OK", text='{"serverTime": 1}', headers={"X-MBX-USED-WEIGHT-1M": "5900"})
+
+        with patch.object(api.session, "request", return_value=response):
+            assert api.fetch_time() == 1
+        # binance reports the request weight of the IP
+        assert limiter.ip_throttle.factor == 1.5
+        assert limiter.ip_throttle.pause_seconds() > 0
+        assert limiter.throttle.factor == 1.0
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_paused_sync_client_does_not_sleep_on_event_loop(self):
+        api = ccxt.binance()
+        limiter = ExchangeRateLimiter("binance", "abc", api)
+        install_rate_limiter(api, limiter)
+        limiter.throttle.observe({"Retry-After": "5"})
+
+        async def fetch_time():
+            return api.fetch_time()
+
+        with patch.object(api, "fetch") as fetch, pytest.raises(RateLimitPaused):
+            asyncio.run(fetch_time())
+        fetch.assert_not_called()
@@ -0,0 +1,132 @@
+import asyncio
+import os
+import sys
+from contextlib import asynccontextmanager
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, Mock, patch
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from clients.binance import Binance
+from clients.bybit import Bybit
+from clients.kraken import Kraken
+from database.records import OrderRecord
+from order_services import _order_changed, reconcile_orders, update_order
+
+CREATED_ON = datetime(2024, 1, 1, 12, 0, 0)
+
+
+def db_order(id: int, external_order_id: str) -> OrderRecord:
+    return OrderRecord(
+        id=id,
+        side="Buy",
+        type="limit",
+        amount=1.0,
+        coin_code="UNI",
+        external_order_id=external_order_id,
+        status="open",
+        filled_amount=0.0,
+        created_on=CREATED_ON,
+    )
+
+
+@asynccontextmanager
+async def fake_connection(conn_info):
+    yield MagicMock()
+
+
+@pytest.fixture
+def binance():
+    return Binance(api_key="APIKEY", secret="SECRET", config={"reconcile": {"page_limit": 2}})
+
+
+class TestReconcile:
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_only_unlisted_orders_are_fetched_one_by_one(self, binance: Binance):
+        orders = [db_order(1, "a"), db_order(2, "b"), db_order(3, "c")]
+        open_orders = [{"id": "a", "status": "open", "filled": 0.0}]
+        closed_orders = [{"id": "b", "status": "closed", "filled": 1.0}]
+        missing_order = {"id": "c", "status": "canceled", "filled": 0.0}
+
+        with (
+            patch.object(binance, "fetch_open_orders", return_value=open_orders),
+            patch.object(binance, "fetch_closed_orders", return_value=closed_orders),
+            patch.object(binance, "fetch_order", return_value=missing_order) as fetch_order,
+        ):
+            results = reconcile_orders(binance, "UNI/USDT", orders)
+
+        fetch_order.assert_called_once_with(id="c", pair="UNI/USDT")
+        assert [order_info["id"] for _, order_info in results] == ["a", "b", "c"]
+        assert [_order_changed(order, order_info) for order, order_info in results] == [False, True, True]
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_closed_orders_are_paged_by_timestamp(self, binance: Binance):
+        pages = [
+            [{"id": "1", "timestamp": 100}, {"id": "2", "timestamp": 200}],
+            [{"id": "2", "timestamp": 200}, {"id": "3", "timestamp": 300}],
+            [{"id": "4", "timestamp": 400}],
+        ]
+        binance._api.has["fetchClosedOrders"] = True
+        with patch.object(binance._api, "fetch_closed_orders", side_effect=pages) as fetch_closed_orders:
+            orders = binance.fetch_closed_orders("UNI/USDT", since=CREATED_ON)
+
+        assert [order["id"] for order in orders] == ["1", "2", "3", "4"]
+        assert [call.args[1] for call in fetch_closed_orders.call_args_list][1:] == [200, 300]
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_page_size_is_capped_by_the_venue(self):
+        bybit = Bybit(api_key="APIKEY", secret="SECRET", config={"reconcile": {"page_limit": 1000}})
+        bybit._api.has["fetchClosedOrders"] = True
+        pages = [[{"id": str(i), "timestamp": i} for i in range(50)], [{"id": "50", "timestamp": 50}]]
+        with patch.object(bybit._api, "fetch_closed_orders", side_effect=pages) as fetch_closed_orders:
+            orders = bybit.fetch_closed_orders("UNI/USDT", since=CREATED_ON)
+
+        # a full page of 50 is not the last one
+        assert len(orders) == 51
+        assert [call.args[2] for call in fetch_closed_orders.call_args_list] == [50, 50]
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_kraken_trades_are_paged_back_by_offset(self):
+        kraken = Kraken(api_key="APIKEY", secret="SECRET")
+        pages = [
+            [{"id": f"{page}-{i}", "symbol": "UNI/USDT" if i % 2 else "BTC/USDT"} for i in range(size)]
+            for page, size in enumerate([50, 50, 3])
+        ]
+        api = Mock(fetch_my_trades=Mock(side_effect=pages))
+        with patch.object(kraken, "_private_api", return_value=api):
+            trades = kraken.fetch_my_trades("UNI/USDT", since=CREATED_ON)
+
+        assert len(trades) == 25 + 25 + 1
+        requests = [call.args[3] for call in api.fetch_my_trades.call_args_list]
+        assert [request["ofs"] for request in requests] == [0, 50, 100]
+        assert len({request["end"] for request in requests}) == 1
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_order_is_not_written_without_all_its_trades(self, binance: Binance):
+        orders = [db_order(1, "a"), db_order(2, "b")]
+        closed_orders = [{"id": "a", "status": "closed", "filled": 1.0}, {"id": "b", "status": "closed", "filled": 1.0}]
+        trade = {"id": "t", "order": "a", "price": 1.0, "amount": 1.0, "timestamp": 0, "datetime": None}
+
+        with (
+            patch("order_services.async_connection", fake_connection),
+            patch("order_services.AsyncOrder", new_callable=AsyncMock) as order_model,
+            patch("order_services.AsyncTrade", new_callable=AsyncMock) as trade_model,
+            patch.object(binance, "fetch_open_orders", return_value=[]),
+            patch.object(binance, "fetch_closed_orders", return_value=closed_orders),
+            # the listing stopped at max_pages, only the trades of "a" can be fetched in full
+            patch.object(binance, "fetch_my_trades", return_value=None),
+            patch.object(binance, "get_trades_for_order", side_effect=lambda id, pair, since: [trade] if id == "a" else None),
+        ):
+            order_model.get_all_orders.return_value = orders
+            assert asyncio.run(update_order(SimpleNamespace(conn_info=""), binance))
+
+        assert [call.kwargs["id"] for call in order_model.update_order_by_id.call_args_list] == [1]
+        assert trade_model.insert_trades.await_count == 1
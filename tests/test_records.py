@@ -0,0 +1,38 @@
+import os
+import sys
+from decimal import Decimal
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from clients.exchange_utils import to_ccxt_number
+from database.records import OrderRecord, TradeRecord
+from order_services import _order_changed
+
+
+class TestRecords:
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_numeric_columns_stay_decimal_until_handed_to_ccxt(self):
+        order = OrderRecord(id=1, side="Buy", type="limit", amount=Decimal("0.1"), price=Decimal("6.25"), value=None)
+        assert order.amount == Decimal("0.1") and order.value is None
+        assert to_ccxt_number(order.amount) == 0.1 and to_ccxt_number(order.value) is None
+
+        order.status, order.filled_amount = "open", Decimal("0.1")
+        assert not _order_changed(order, {"status": "open", "filled": 0.1})
+        assert _order_changed(order, {"status": "open", "filled": 0.2})
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_records_have_no_instance_dict(self):
+        order = OrderRecord(id=1, side="Buy", type="limit", amount=1.0)
+        assert not hasattr(order, "__dict__")
+        with pytest.raises(AttributeError):
+            order.unknown = 1
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_trade_from_ccxt(self):
+        trade = {"id": "t1", "price": 6.0, "amount": 2.0, "datetime": "2024-01-01T12:00:00.000Z"}
+        assert TradeRecord.from_ccxt(trade, order_id=7) == TradeRecord("t1", 6.0, 2.0, "2024-01-01T12:00:00.000Z", 1, 7)
@@ -0,0 +1,85 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from clients.binance import Binance
+from clients.request_cache import RequestCoalescer
+
+TICKER = {"symbol": "UNI/USDT", "average": 6.0}
+
+
+class TestRequestCoalescer:
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_concurrent_calls_share_one_request(self):
+        coalescer = RequestCoalescer("binance")
+        release = threading.Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            release.wait(1)
+            return TICKER
+
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            futures = [pool.submit(coalescer.call, "fetch_ticker", ("UNI/USDT",), fetch) for _ in range(5)]
+            time.sleep(0.05)
+            release.set()
+            assert [future.result() for future in futures] == [TICKER] * 5
+
+        assert len(calls) == 1
+        assert coalescer.stats()["methods"]["fetch_ticker"] == {"hits": 0, "misses": 1, "coalesced": 4}
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_ttl_cache_is_bounded_lru(self):
+        coalescer = RequestCoalescer("binance", {"max_entries": 2, "ttl_ms": {"fetch_ticker": 1000}})
+        for pair in ("A", "B", "A", "C"):
+            coalescer.call("fetch_ticker", (pair,), lambda pair=pair: {"symbol": pair})
+
+        assert coalescer.stats()["methods"]["fetch_ticker"]["hits"] == 1
+        assert coalescer.stats()["entries"] == 2
+        # "B" was least recently used and has been evicted
+        coalescer.call("fetch_ticker", ("B",), lambda: {"symbol": "B"})
+        assert coalescer.stats()["methods"]["fetch_ticker"]["misses"] == 4
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_failed_reads_are_not_cached(self):
+        binance = Binance(api_key="APIKEY", secret="SECRET", config={"request_cache": {"ttl_ms": {"fetch_ticker": 1000}}})
+        with patch.object(binance._api, "fetch_ticker", side_effect=[None, TICKER, Exception("not called")]):
+            assert binance.fetch_ticker("UNI/USDT") is None
+            assert binance.fetch_ticker("UNI/USDT") == TICKER
+            assert binance.fetch_ticker("UNI/USDT") == TICKER
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_event_loop_callers_do_not_wait_for_other_requests(self):
+        coalescer = RequestCoalescer("binance")
+        started, release = threading.Event(), threading.Event()
+
+        def slow_fetch():
+            started.set()
+            release.wait(1)
+            return TICKER
+
+        async def fetch_on_loop():
+            return coalescer.call("fetch_ticker", ("UNI/USDT",), lambda: {"symbol": "UNI/USDT", "average": 6.1})
+
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            in_flight = pool.submit(coalescer.call, "fetch_ticker", ("UNI/USDT",), slow_fetch)
+            started.wait(1)
+            assert asyncio.run(fetch_on_loop())["average"] == 6.1
+            release.set()
+            assert in_flight.result() == TICKER
+
+        assert coalescer.stats()["methods"]["fetch_ticker"] == {"hits": 0, "misses": 2, "coalesced": 0}
+        assert coalescer.stats()["in_flight"] == 0
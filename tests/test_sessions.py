@@ -0,0 +1,53 @@
+import asyncio
+import os
+import sys
+
+import ccxt.pro as ccxt_pro
+import pytest
+from aiohttp import web
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from clients.sessions import attach_shared_session, close_shared_sessions, get_session_manager
+
+
+async def handle(request):
+    return web.Response(text="ok")
+
+
+async def fetch_through_shared_session():
+    app = web.Application()
+    app.router.add_get("/", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+
+    try:
+        binance = attach_shared_session(ccxt_pro.binance())
+        bybit = attach_shared_session(ccxt_pro.bybit())
+        for api in (binance, bybit, binance, bybit):
+            api.open()
+            async with api.session.get(f"http://127.0.0.1:{port}/") as response:
+                await response.text()
+
+        shared = binance.session is bybit.session
+        stats = get_session_manager().pool_stats()
+        await binance.close()
+        await bybit.close()
+        return shared, stats
+    finally:
+        await close_shared_sessions()
+        await runner.cleanup()
+
+
+class TestSharedSession:
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_clients_share_one_pooled_connection(self):
+        shared, stats = asyncio.run(fetch_through_shared_session())
+        assert shared
+        assert stats["requests"] == 4
+        assert stats["connections_created"] == 1
+        assert stats["connections_reused"] == 3
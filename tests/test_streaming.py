@@ -0,0 +1,53 @@
+import asyncio
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from streaming import NDJSON, SSE, format_event, stream_exchange_results
+
+
+async def runner(exchange, on_result):
+    await asyncio.sleep(exchange.delay)
+    on_result({"order_id": 1, "status": "success"})
+    return exchange.exchange_name != "kraken"
+
+
+@pytest.fixture
+def exchanges():
+    return [
+        SimpleNamespace(exchange_name="binance", delay=0.05),
+        SimpleNamespace(exchange_name="kraken", delay=0.0),
+    ]
+
+
+class TestStreaming:
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_format_event_ndjson(self):
+        assert format_event({"event": "order", "status": "success"}, NDJSON) == '{"event": "order", "status": "success"}\n'
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_format_event_sse(self):
+        line = format_event({"event": "summary"}, SSE)
+        assert line == 'event: summary\ndata: {"event": "summary"}\n\n'
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_stream_emits_fastest_exchange_first(self, exchanges):
+        events = [json.loads(line) for line in stream_exchange_results(runner, exchanges, NDJSON, "ok")]
+
+        assert [(e["event"], e.get("exchange")) for e in events] == [
+            ("order", "kraken"),
+            ("exchange", "kraken"),
+            ("order", "binance"),
+            ("exchange", "binance"),
+            ("summary", None),
+        ]
+        assert events[1]["status"] == "failed"
+        assert events[-1]["status"] == "partial_success"
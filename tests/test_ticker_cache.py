@@ -0,0 +1,51 @@
+import asyncio
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from clients.ticker_cache import TickerCache
+
+
+class TestTickerCache:
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_get_ticker_and_staleness(self):
+        cache = TickerCache("binance", {"max_age_seconds": 5})
+        assert cache.get_ticker("UNI/USDT") is None
+
+        cache.update({"symbol": "UNI/USDT", "bid": 5.9, "ask": 6.1, "last": 6.0, "average": None})
+        assert cache.get_ticker("UNI/USDT")["average"] == pytest.approx(6.0)
+
+        received_at = cache.tickers["UNI/USDT"].received_at
+        with patch("clients.ticker_cache.time.monotonic", return_value=received_at + 6):
+            assert cache.is_stale("UNI/USDT")
+            assert cache.get_ticker("UNI/USDT") is None
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_resubscribes_when_symbols_are_tracked(self):
+        subscriptions = []
+
+        async def watch_tickers(symbols):
+            subscriptions.append(symbols)
+            await asyncio.sleep(0.01)
+            return {symbol: {"symbol": symbol, "bid": 1.0, "ask": 1.0, "last": 1.0, "average": 1.0} for symbol in symbols}
+
+        async def run():
+            cache = TickerCache("binance")
+            cache.start(watch_tickers, None)
+            cache.track(["UNI/USDT"])
+            while cache.get_ticker("UNI/USDT") is None:
+                await asyncio.sleep(0.01)
+            cache.track(["UNI/USDT", "XRP/USDT"])
+            while cache.get_ticker("XRP/USDT") is None:
+                await asyncio.sleep(0.01)
+            await cache.stop()
+
+        asyncio.run(run())
+        assert subscriptions[0] == ["UNI/USDT"]
+        assert subscriptions[-1] == ["UNI/USDT", "XRP/USDT"]
@@ -0,0 +1,106 @@
+import asyncio
+import os
+import sys
+from unittest.mock import patch
+
+import ccxt
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from async_runtime import LoopThread
+from clients.binance import Binance
+from clients.sessions import close_shared_sessions
+
+ORDER = {"id": "1", "status": "open", "filled": 0.0}
+
+
+@pytest.fixture
+def loop_thread():
+    loop_thread = LoopThread(name="test-ws-orders")
+    loop_thread.start()
+    yield loop_thread
+    loop_thread.stop()
+
+
+@pytest.fixture
+def binance(loop_thread):
+    binance = Binance(api_key="APIKEY", secret="SECRET", config={"websocket_orders": {"timeout_ms": 100}})
+    binance._ws_async.asyncio_loop = loop_thread.loop
+    yield binance
+
+    async def close():
+        await binance.close()
+        await close_shared_sessions()
+
+    loop_thread.run(close())
+
+
+class TestWebsocketOrders:
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_order_is_placed_over_websocket(self, binance: Binance):
+        async def create_order_ws(*args):
+            return ORDER
+
+        with patch.object(binance._ws_async, "create_order_ws", side_effect=create_order_ws) as create_order_ws:
+            with patch.object(binance._api, "create_order") as create_order_rest:
+                assert binance.create_order("UNI", "limit", "buy", 1.0, 6.0) == ORDER
+
+        create_order_ws.assert_called_once()
+        create_order_rest.assert_not_called()
+        assert binance.order_transport_stats()["websocket"]["orders"] == 1
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_timeout_falls_back_to_rest_with_same_client_order_id(self, binance: Binance):
+        async def create_order_ws(*args):
+            await asyncio.sleep(10)
+
+        with (
+            patch.object(binance._ws_async, "create_order_ws", side_effect=create_order_ws) as create_order_ws,
+            patch.object(binance._api, "fetch_order", side_effect=ccxt.OrderNotFound("unknown order")) as fetch_order,
+            patch.object(binance._api, "create_order", return_value=ORDER) as create_order_rest,
+        ):
+            assert binance.create_order("UNI", "limit", "buy", 1.0, 6.0) == ORDER
+
+        ws_params = create_order_ws.call_args.args[-1]
+        rest_params = create_order_rest.call_args.args[-1]
+        assert rest_params["clientOrderId"] == ws_params["clientOrderId"]
+        assert fetch_order.call_args.args == (None, "UNI/USDT", {"clientOrderId": ws_params["clientOrderId"]})
+        assert binance.order_transport_stats()["rest"]["orders"] == 1
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_timed_out_order_that_went_through_is_not_resubmitted(self, binance: Binance):
+        async def create_order_ws(*args):
+            await asyncio.sleep(10)
+
+        with (
+            patch.object(binance._ws_async, "create_order_ws", side_effect=create_order_ws),
+            patch.object(binance._api, "fetch_order", return_value=ORDER),
+            patch.object(binance._api, "create_order") as create_order_rest,
+        ):
+            assert binance.create_order("UNI", "limit", "buy", 1.0, 6.0) == ORDER
+        create_order_rest.assert_not_called()
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_duplicate_rejection_returns_the_placed_order(self, binance: Binance):
+        async def create_order_ws(*args):
+            await asyncio.sleep(10)
+
+        with (
+            patch.object(binance._ws_async, "create_order_ws", side_effect=create_order_ws),
+            patch.object(binance._api, "fetch_order", side_effect=[ccxt.OrderNotFound("unknown order"), ORDER]),
+            patch.object(binance._api, "create_order", side_effect=ccxt.InvalidOrder("Duplicate order sent.")),
+        ):
+            assert binance.create_order("UNI", "limit", "buy", 1.0, 6.0) == ORDER
+
+    @pytest.mark.github
+    @pytest.mark.base
+    def test_rest_is_used_without_running_loop(self):
+        binance = Binance(api_key="APIKEY", secret="SECRET")
+        with patch.object(binance._api, "create_order", return_value=ORDER) as create_order_rest:
+            assert binance.create_order("UNI", "limit", "buy", 1.0, 6.0) == ORDER
+        assert "clientOrderId" not in create_order_rest.call_args.args[-1]
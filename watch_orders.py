@@ -1,68 +1,87 @@
 import argparse
 import asyncio
-import json
 import logging
 import traceback
+from typing import Optional
 
-import psycopg
 from dotenv import load_dotenv
 
-from clients.binance import Binance
-from clients.bybit import Bybit
 from clients.exchange import Exchange
-from clients.kraken import Kraken
+from clients.nonce import configure_nonce_store
+from clients.rate_limit import configure_rate_limit_backend
+from clients.sessions import close_shared_sessions
 from config import Config
-from database.models import Order, Trade
+from database.leader import LeaderLock
+from database.models import AsyncOrder, AsyncTrade
+from database.records import TradeRecord
+from database.pool import async_connection, close_async_pools
+from exchange_registry import ExchangeRegistry
 from loggers import setup_logging
+from order_services import update_order
 from parameters import add_common_args
 
 logger = logging.getLogger(__name__)
 
 
-async def watch_orders(config: Config, exchange: Exchange):
+async def watch_orders(config: Config, exchange: Exchange, leader: Optional[LeaderLock] = None):
+    """
+    Apply order updates of the exchange's websocket to the database.
+    With a leader lock, updates are only written while this process is the leader; a standby keeps
+    its websocket subscription warm so that it can take over without reconnecting.
+    """
     logger.info(f"Starting to watch orders for {exchange.__class__.__name__}...")
     while True:
         try:
             logger.info(f"Waiting for orders for {exchange.__class__.__name__}...")
             orders = await exchange.watch_orders()
+            if leader is not None and not leader.is_leader:
+                logger.debug(f"Standby for {leader.name}, skipping {len(orders)} order updates")
+                continue
             logger.info(f"Received orders for {exchange.__class__.__name__}: {orders}")
-            with psycopg.connect(config.conn_info) as conn:
-                with conn.cursor() as cur:
-                    try:
+            try:
+                async with async_connection(config.conn_info) as conn:
+                    async with conn.cursor() as cur:
+                        known_orders = []
                         for order_info in orders:
-                            order = Order.get_order_by_external_order_id(
+                            order = await AsyncOrder.get_order_by_external_order_id(
                                 cur,
                                 str(order_info["id"]),  # External Order Id
                             )
-
                             if order:
-                                trades_for_order = exchange.get_trades_for_order(
-                                    order_id=order["external_order_id"],
-                                    pair=order_info["symbol"],  # Symbol
-                                    since=order["created_on"],
-                                )
+                                known_orders.append((order, order_info))
+
+                updates = []
+                for order, order_info in known_orders:
+                    # blocking REST request, off the event loop that serves all exchanges' websockets
+                    trades_for_order = await asyncio.to_thread(
+                        exchange.get_trades_for_order,
+                        order_id=order.external_order_id,
+                        pair=order_info["symbol"],  # Symbol
+                        since=order.created_on,
+                    )
+                    updates.append((order, order_info, trades_for_order))
 
-                                if trades_for_order:
-                                    for trade in trades_for_order:
-                                        Trade.insert_trade_if_not_exists(
-                                            cur,
-                                            trade_id=trade["id"],
-                                            price=trade["price"],
-                                            quantity=trade["amount"],
-                                            timestamp=trade["datetime"],
-                                            market_id=1,  # hardcode market id
-                                            order_id=order["id"],
-                                        )
-
-                                Order.update_order_by_external_order_id(
-                                    cur=cur,
-                                    external_order_id=order_info["id"],
-                                    filled_amount=order_info["filled"],
-                                    status=order_info["status"],
+                async with async_connection(config.conn_info) as conn:
+                    # leadership may have moved while the trades were fetched
+                    if leader is not None and not await leader.holds_lock(conn):
+                        logger.warning(f"No longer leader of {leader.name}, dropping {len(updates)} order updates")
+                        continue
+                    async with conn.pipeline(), conn.cursor() as cur:
+                        for order, order_info, trades_for_order in updates:
+                            if trades_for_order:
+                                await AsyncTrade.insert_trades(
+                                    cur, [TradeRecord.from_ccxt(trade, order.id) for trade in trades_for_order]
                                 )
-                    except Exception as e:
-                        logger.error(f"Failed to update orders: {e}")
-                        traceback.print_exc()
+
+                            await AsyncOrder.update_order_by_external_order_id(
+                                cur=cur,
+                                external_order_id=order_info["id"],
+                                filled_amount=order_info["filled"],
+                                status=order_info["status"],
+                            )
+            except Exception as e:
+                logger.error(f"Failed to update orders: {e}")
+                traceback.print_exc()
 
         except Exception as e:
             logger.error(f"Error in order listener: {e}")
@@ -82,38 +101,57 @@ if __name__ == "__main__":
     config = Config(env_name=env_name)
     logger.info(f"Running in {env_name} environment")
 
-    # Read ccxt config from JSON file
-    file_path = "./exchanges_ccxt_config.json"
-    with open(file_path, "r") as file:
-        exchanges_ccxt_config = json.load(file)
-
-    binance_ccxt_config = exchanges_ccxt_config["binance"]["ccxt_config"]
-    kraken_ccxt_config = exchanges_ccxt_config["kraken"]["ccxt_config"]
-    bybit_ccxt_config = exchanges_ccxt_config["bybit"]["ccxt_config"]
-
-    binance = Binance(
-        config.binance_api_key,
-        config.binance_secret,
-        binance_ccxt_config,
-        exchanges_ccxt_config["config"],
-    )
-    kraken = Kraken(
-        config.kraken_api_key,
-        config.kraken_secret,
-        kraken_ccxt_config,
-        exchanges_ccxt_config["config"],
-    )
-    bybit = Bybit(
-        config.bybit_api_key,
-        config.bybit_secret,
-        bybit_ccxt_config,
-        exchanges_ccxt_config["config"],
-    )
+    # Exchange clients from exchanges_ccxt_config.json, rebuilt when the file changes (see exchange_registry)
+    leaders: dict[str, LeaderLock] = {}
+    watchers: dict[str, asyncio.Task] = {}
+
+    async def start_watching(name: str, exchange: Exchange):
+        # one leader per exchange account; the new leader reconciles whatever it missed as a standby
+        if name not in leaders:
+            leaders[name] = LeaderLock(
+                config.conn_info,
+                f"watch_orders:{name}:{exchange.rate_limiter.account}",
+                registry.exchanges_ccxt_config["config"].get("leader"),
+                on_acquired=lambda: update_order(config, registry.get(name)),
+            )
+            leaders[name].start()
+        await exchange.start_clock_sync()
+        watchers[name] = asyncio.get_running_loop().create_task(watch_orders(config, exchange, leaders[name]))
+
+    async def on_exchange_swap(name: str, old: Optional[Exchange], new: Optional[Exchange]):
+        """Move the order subscription (and leadership) from the replaced client to its replacement"""
+        watcher = watchers.pop(name, None)
+        if watcher is not None:
+            watcher.cancel()
+            await asyncio.gather(watcher, return_exceptions=True)
+        if new is not None:
+            await start_watching(name, new)
+        elif name in leaders:
+            await leaders.pop(name).stop()
+
+    registry = ExchangeRegistry(config, names=("binance", "kraken", "bybit", "paper"), on_swap=on_exchange_swap)
+    configure_rate_limit_backend(config.conn_info, registry.exchanges_ccxt_config["config"].get("rate_limit"))
+    configure_nonce_store(config.conn_info)
+
+    async def run():
+        await registry.warm_up()
+        for exchange in registry.exchanges():
+            await start_watching(exchange.exchange_name, exchange)
+        registry.start()
+        # watch_orders never returns, the tasks are replaced on config changes
+        await asyncio.Event().wait()
+
+    async def close_exchanges():
+        for watcher in watchers.values():
+            watcher.cancel()
+        await asyncio.gather(*watchers.values(), return_exceptions=True)
+        await asyncio.gather(*(leader.stop() for leader in leaders.values()), return_exceptions=True)
+        await registry.close()
+        await close_shared_sessions()
+        await close_async_pools()
+
     loop = asyncio.get_event_loop()
-    loop.run_until_complete(
-        asyncio.gather(
-            watch_orders(config, binance),
-            watch_orders(config, kraken),
-            watch_orders(config, bybit),
-        )
-    )
+    try:
+        loop.run_until_complete(run())
+    finally:
+        loop.run_until_complete(close_exchanges())